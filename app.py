@@ -2,20 +2,36 @@
 Flask web app for RateMyProfessors review analysis
 """
 import os
+import gzip
 import json
 import logging
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
+import threading
+import time
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, g, stream_with_context
 from flask_login import LoginManager
-from io import StringIO
-import csv
-from src.review_analyzer import ReviewScraper
+from src.review_analyzer import ReviewScraper, review_window_start, analysis_fingerprint
 from src.professor_finder import RMPScraper
-from src.auth import login_required, is_nyu_account, get_current_user, get_oauth_flow
+from src.teacher_search import TeacherSearch
+from src.roster_index import RosterIndex
+from src.course_index import get_course_index, merge_professors
+from src.auth import login_required, is_nyu_account, get_current_user, get_oauth_flow, verify_id_token, GOOGLE_CERTS
+from src.metrics import HTTP_REQUESTS, HTTP_REQUEST_SECONDS, render_metrics
+from src.result_store import EXPORT_FORMATS, save_results, load_metadata, iter_results, stream_export, parquet_available
+from src.tracing import Trace, span, should_trace, load_trace, PROFILING_ENABLED
+from src.deadline import Deadline, DeadlineExceeded, ANALYZE_DEADLINE_SECONDS
+from src.rmp_client import encode_node_id, legacy_teacher_id
+from src.cache_warmer import record_analyze_request
+from src.quick_insights import quick_insights
+from src.model_router import ROUTES, routing_signature, ledger_summary
+from src.review_archive import archive_available, query_reviews
 from dotenv import load_dotenv
-from google.auth.transport.requests import Request
-from google.oauth2.id_token import verify_oauth2_token
 import secrets
 
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses fall back to gzip
+    brotli = None
+
 # Load environment variables
 load_dotenv()
 
@@ -33,34 +49,121 @@ GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
 SCOPES = ['openid', 'email', 'profile']
 
-# Global instances
+# Have Google's signing certs cached before the first login arrives
+if GOOGLE_CLIENT_ID:
+    GOOGLE_CERTS.warm()
+
+ANALYZE_MODES = ('llm', 'quick', 'both')
+
+# Global instances, shared by every request thread in a worker. Creation is
+# guarded by a lock so concurrent first requests don't build duplicates.
 scraper = None
+review_fetcher = None
 finder = None
+teacher_search = None
+roster_index = None
+_instances_lock = threading.Lock()
 
 def get_scraper():
     """Get or create a scraper instance"""
     global scraper
     if scraper is None:
-        try:
-            scraper = ReviewScraper()
-        except Exception as e:
-            logger.error(f"Failed to initialize scraper: {e}")
-            raise
+        with _instances_lock:
+            if scraper is None:
+                try:
+                    scraper = ReviewScraper()
+                except Exception as e:
+                    logger.error(f"Failed to initialize scraper: {e}")
+                    raise
     return scraper
 
+def get_review_fetcher():
+    """Scraper for work that needs no LLM (quick insights); reuses the full scraper once it exists"""
+    global review_fetcher
+    if scraper is not None:
+        return scraper
+    if review_fetcher is None:
+        with _instances_lock:
+            if review_fetcher is None:
+                review_fetcher = ReviewScraper(use_llm=False)
+    return review_fetcher
+
+def get_teacher_search():
+    """Get or create the RMP teacher search resolver"""
+    global teacher_search
+    if teacher_search is None:
+        with _instances_lock:
+            if teacher_search is None:
+                teacher_search = TeacherSearch()
+    return teacher_search
+
+def get_roster_index():
+    """Get the in-memory roster index; it re-crawls in the background whenever it is missing or stale"""
+    global roster_index
+    if roster_index is None:
+        with _instances_lock:
+            if roster_index is None:
+                index = RosterIndex(auto_refresh=True)
+                index.load()
+                index.refresh_in_background()
+                roster_index = index
+    return roster_index
+
 def get_finder():
     """Get or create a professor finder instance"""
     global finder
     if finder is None:
-        try:
-            finder = RMPScraper()
-        except Exception as e:
-            logger.error(f"Failed to initialize professor finder: {e}")
-            # Finder is optional (requires Google Search API keys)
-            return None
+        with _instances_lock:
+            if finder is None:
+                try:
+                    finder = RMPScraper()
+                except Exception as e:
+                    logger.error(f"Failed to initialize professor finder: {e}")
+                    # Finder is optional (requires Google Search API keys)
+                    return None
     return finder
 
 
+@app.before_request
+def start_request_timer():
+    """Remember when the request started for the latency histogram"""
+    g.request_started = time.monotonic()
+
+
+@app.before_request
+def start_request_trace():
+    """Trace the request when a signed-in user asks via X-Trace, or when picked by TRACE_SAMPLE_RATE"""
+    # Headers from anonymous clients are ignored so they can't make the server write files
+    signed_in = get_current_user() is not None
+    if not should_trace(request.headers.get('X-Trace') if signed_in else None):
+        return
+    g.trace = Trace(f"{request.method} {request.path}")
+    if PROFILING_ENABLED and signed_in and request.headers.get('X-Profile', '').lower() in ('1', 'true', 'yes'):
+        g.trace.start_profiler()
+
+
+@app.after_request
+def finish_request_trace(response):
+    """Persist the request's span tree and point the client at it"""
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.finish(status=response.status_code)
+        response.headers['X-Trace-Id'] = trace.trace_id
+    return response
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request and observe its latency, labelled by route"""
+    started = g.pop('request_started', None)
+    # Label by route rule rather than raw path to keep label cardinality bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.labels(endpoint=endpoint, method=request.method, status=str(response.status_code)).inc()
+    if started is not None:
+        HTTP_REQUEST_SECONDS.labels(endpoint=endpoint, method=request.method).observe(time.monotonic() - started)
+    return response
+
+
 @app.route('/', methods=['GET'])
 def index():
     """Home page - redirect to login if not authenticated"""
@@ -134,7 +237,7 @@ def oauth_callback():
         # Try to verify token - if scope mismatch occurs, still use the token
         # (Google converts scopes to full URLs during flow, causing validation issues)
         try:
-            id_info = verify_oauth2_token(credentials.id_token, Request(), GOOGLE_CLIENT_ID)
+            id_info = verify_id_token(credentials.id_token, GOOGLE_CLIENT_ID)
         except Exception as ve:
             msg = str(ve) or ''
             # Detect the known scope-change message (case-insensitive)
@@ -201,27 +304,47 @@ def search_professors():
         if not isinstance(course_codes, list) or len(course_codes) == 0:
             return jsonify({'error': 'course_codes must be a non-empty list'}), 400
 
-        finder = get_finder()
-        if finder is None:
-            return jsonify({
-                'error': 'Professor finder not available. Set GOOGLE_CLOUD_API_KEY and GOOGLE_SEARCH_ENGINE_ID environment variables.',
-                'professors': []
-            }), 503
-
         results = []
+        unsearched = []
+        course_index = get_course_index()
         for course_code in course_codes:
             logger.info(f"Searching for professors teaching {course_code}")
             try:
-                professors = finder.scrape_course(course_code, f"Course {course_code}")
+                # The local course index is enough once course search has covered the course
+                with span('search_course_index', course_code=course_code):
+                    indexed = course_index.lookup(course_code)
+                if indexed and course_index.covers(course_code):
+                    results.extend(indexed)
+                    logger.info(f"Found {len(indexed)} professors for {course_code} in the course index")
+                    continue
+
+                finder = get_finder()
+                if finder is None:
+                    if indexed:
+                        results.extend(indexed)
+                    else:
+                        unsearched.append(course_code)
+                    continue
+                with span('search_course', course_code=course_code):
+                    professors = finder.scrape_course(course_code, f"Course {course_code}")
+                course_index.mark_searched(course_code)
+                professors = merge_professors(indexed, professors)
                 results.extend(professors)
-                logger.info(f"Found {len(professors)} professors for {course_code}")
+                logger.info(f"Found {len(professors)} professors for {course_code} ({len(indexed)} from the course index)")
             except Exception as e:
                 logger.error(f"Error searching for {course_code}: {e}")
 
+        if unsearched and not results:
+            return jsonify({
+                'error': 'Professor finder not available. Set GOOGLE_CLOUD_API_KEY and GOOGLE_SEARCH_ENGINE_ID environment variables.',
+                'professors': []
+            }), 503
+
         return jsonify({
             'success': True,
             'professors': results,
-            'total_professors': len(results)
+            'total_professors': len(results),
+            'unsearched_course_codes': unsearched
         })
 
     except Exception as e:
@@ -229,6 +352,23 @@ def search_professors():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/professors/autocomplete', methods=['GET'])
+@login_required
+def autocomplete_professors():
+    """Prefix/fuzzy professor name suggestions served from the prefetched roster"""
+    query = request.args.get('q', '').strip()
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    index = get_roster_index()
+    return jsonify({
+        'suggestions': index.search(query, limit=limit) if query else [],
+        'index_ready': index.ready
+    })
+
+
 @app.route('/api/analyze', methods=['POST'])
 @login_required
 def analyze():
@@ -240,40 +380,110 @@ def analyze():
         professor_urls = data.get('professor_urls', [])
         professor_names = data.get('professor_names', [])
         
+        # Optional course scoping: one code for every professor, or a per-URL mapping
+        course_code = data.get('course_code')
+        course_codes = data.get('course_codes') or {}
+        if not isinstance(course_codes, dict):
+            return jsonify({'error': 'course_codes must map professor URLs to course codes'}), 400
+        
+        # Optional bounds on how much history is fetched and summarized
+        max_reviews = data.get('max_reviews')
+        since_years = data.get('since_years')
+        if max_reviews is not None and (not isinstance(max_reviews, int) or isinstance(max_reviews, bool) or max_reviews <= 0):
+            return jsonify({'error': 'max_reviews must be a positive integer'}), 400
+        if since_years is not None and (not isinstance(since_years, (int, float)) or isinstance(since_years, bool) or since_years <= 0):
+            return jsonify({'error': 'since_years must be a positive number'}), 400
+        since = review_window_start(since_years)
+
+        # Everything below must finish within the deadline; clients may ask for less
+        deadline_seconds = data.get('deadline_seconds', ANALYZE_DEADLINE_SECONDS)
+        if not isinstance(deadline_seconds, (int, float)) or isinstance(deadline_seconds, bool) or deadline_seconds <= 0:
+            return jsonify({'error': 'deadline_seconds must be a positive number'}), 400
+        deadline = Deadline(min(deadline_seconds, ANALYZE_DEADLINE_SECONDS))
+        
+        # "quick" skips the LLM for local quick insights, "both" returns the two together
+        mode = data.get('mode', 'llm')
+        if mode not in ANALYZE_MODES:
+            return jsonify({'error': f"mode must be one of {', '.join(ANALYZE_MODES)}"}), 400
+        
         if not professor_urls and not professor_names:
             return jsonify({'error': 'Missing professor_urls or professor_names in request'}), 400
 
-        # If professor names provided, convert to URLs via search
-        if professor_names and not professor_urls:
-            finder = get_finder()
-            if finder is None:
-                # Try to search using the RateMyProfessors URL pattern directly
-                logger.info("Attempting to search for professors by name")
-                professor_urls = []
-                for name in professor_names:
-                    # This is a fallback - in production you'd want proper name-to-URL mapping
-                    logger.warning(f"Cannot convert professor name to URL without Google Search API: {name}")
-            else:
-                professor_urls = []
-                for name in professor_names:
-                    # Search for this professor name
-                    try:
-                        # We'd need to implement a name-based search in RMPScraper
-                        logger.info(f"Searching for professor: {name}")
-                    except Exception as e:
-                        logger.error(f"Error searching for professor {name}: {e}")
+        # Resolve professor names to profile URLs via RMP's own teacher search
+        unresolved_names = []
+        if professor_names:
+            professor_urls = list(professor_urls)
+            resolved = get_teacher_search().resolve(professor_names)
+            for name in professor_names:
+                teacher = resolved.get(name)
+                if teacher:
+                    logger.info(f"Resolved professor {name} to {teacher['url']}")
+                    if teacher['url'] not in professor_urls:
+                        professor_urls.append(teacher['url'])
+                else:
+                    logger.warning(f"Could not find professor on RateMyProfessors: {name}")
+                    unresolved_names.append(name)
 
         if not professor_urls:
-            return jsonify({'error': 'No professor URLs found'}), 400
+            return jsonify({'error': 'No professor URLs found', 'unresolved_names': unresolved_names}), 400
 
-        scraper = get_scraper()
-        results = []
+        llm_available = mode != 'quick'
+        if not llm_available:
+            scraper = get_review_fetcher()
+        else:
+            try:
+                scraper = get_scraper()
+            except Exception as e:
+                if mode == 'llm':
+                    raise
+                # Quick insights don't need OpenAI, so "both" degrades to them
+                logger.warning(f"LLM unavailable, returning quick insights only: {e}")
+                scraper = get_review_fetcher()
+                llm_available = False
+        if mode != 'quick':
+            # The UI follows every quick request with a "both" one; count and store that one only
+            record_analyze_request(legacy_teacher_id(url) for url in professor_urls)
+        results = [
+            {'professor_name': name, 'status': 'error', 'message': 'Professor not found on RateMyProfessors'}
+            for name in unresolved_names
+        ]
 
         for url in professor_urls:
+            professor_course = course_codes.get(url) or course_code
+            if deadline.expired:
+                # Don't start work nobody will wait for
+                results.append({
+                    'url': url,
+                    'course_code': professor_course,
+                    'status': 'timed_out',
+                    'message': 'Not started before the request deadline'
+                })
+                continue
             logger.info(f"Processing professor URL: {url}")
             try:
+                legacy_id = legacy_teacher_id(url)
+                if llm_available and legacy_id and not professor_course and not max_reviews and not since:
+                    # Full-history analyses are shared through the analysis store (and pre-warmed)
+                    analyzed = scraper.analyze_professor(legacy_id, deadline=deadline)
+                    if analyzed is not None:
+                        result = {**analyzed['result'], 'url': url, 'course_code': None}
+                        if mode == 'llm':
+                            result.pop('quick_insights', None)
+                            result.pop('analysis_mode', None)
+                        elif result.get('status') == 'success':
+                            # Analyses stored before analysis_mode was recorded came from the LLM
+                            result.setdefault('analysis_mode', 'llm')
+                            # Unstored results also come from partial fetches, so check for the LLM failure itself
+                            llm_failed = result['analysis'].startswith("Analysis unavailable") or result['analysis'].startswith("Error")
+                            if llm_failed and result.get('quick_insights'):
+                                result['analysis'] = result['quick_insights']['summary']
+                                result['analysis_mode'] = 'quick'
+                        results.append(result)
+                        logger.info(f"Analyzed {url} ({'cached' if analyzed['cached'] else 'fresh'})")
+                        continue
+
                 # Scrape reviews
-                review_data = scraper.scrape_reviews(url)
+                review_data = scraper.scrape_reviews(url, course_code=professor_course, max_reviews=max_reviews, since=since, deadline=deadline)
 
                 if review_data and review_data['reviews']:
                     # Calculate averages
@@ -283,27 +493,53 @@ def analyze():
                     avg_quality = sum(quality_ratings) / len(quality_ratings) if quality_ratings else None
                     avg_difficulty = sum(difficulty_ratings) / len(difficulty_ratings) if difficulty_ratings else None
 
-                    # Get analysis
-                    analysis = scraper.analyze_reviews(review_data['reviews'])
-
-                    results.append({
+                    result = {
                         'url': url,
+                        'course_code': professor_course,
                         'professor_name': review_data.get('professor_name') or 'Professor',
                         'number_of_reviews': len(review_data['reviews']),
                         'average_quality': avg_quality,
                         'average_difficulty': avg_difficulty,
-                        'analysis': analysis,
+                        'analysis': None,
                         'status': 'success'
-                    })
+                    }
+                    if mode != 'llm':
+                        with span('quick_insights', reviews=len(review_data['reviews'])):
+                            result['quick_insights'] = quick_insights(review_data['reviews'])
+                        result['analysis'] = result['quick_insights']['summary']
+                        result['analysis_mode'] = 'quick'
+
+                    # Get analysis
+                    if llm_available:
+                        with span('analyze_reviews', reviews=len(review_data['reviews'])):
+                            analysis, route = scraper.analyze_reviews_routed(review_data['reviews'], deadline=deadline)
+                        # A skipped route or no usable comment means no model call; "both" keeps the quick summary
+                        llm_used = route is not None and route['model'] is not None
+                        llm_failed = analysis.startswith("Analysis unavailable") or analysis.startswith("Error")
+                        if mode == 'llm' or (llm_used and not llm_failed):
+                            result['analysis'] = analysis
+                            if mode == 'both':
+                                result['analysis_mode'] = 'llm'
+
+                    results.append(result)
                     logger.info(f"Successfully analyzed {len(review_data['reviews'])} reviews for {url}")
                 else:
                     results.append({
                         'url': url,
+                        'course_code': professor_course,
                         'status': 'error',
-                        'message': 'No reviews found for this professor'
+                        'message': f'No reviews found for this professor in {professor_course}' if professor_course else 'No reviews found for this professor'
                     })
                     logger.warning(f"No reviews found for {url}")
 
+            except DeadlineExceeded as e:
+                logger.warning(f"Deadline reached while processing {url}: {e}")
+                results.append({
+                    'url': url,
+                    'course_code': professor_course,
+                    'status': 'timed_out',
+                    'message': 'Analysis did not finish before the request deadline'
+                })
             except Exception as e:
                 logger.error(f"Error processing {url}: {e}")
                 results.append({
@@ -312,11 +548,16 @@ def analyze():
                     'message': str(e)
                 })
 
+        result_id = save_results(results, owner=get_current_user()) if mode != 'quick' else None
+
         return jsonify({
             'success': True,
+            'result_id': result_id,
             'results': results,
-            'total_professors': len(professor_urls),
-            'successful_analyses': len([r for r in results if r.get('status') == 'success'])
+            'total_professors': len(professor_urls) + len(unresolved_names),
+            'successful_analyses': len([r for r in results if r.get('status') == 'success']),
+            'timed_out': len([r for r in results if r.get('status') == 'timed_out']),
+            'mode': mode
         })
 
     except Exception as e:
@@ -324,10 +565,85 @@ def analyze():
         return jsonify({'error': str(e)}), 500
 
 
+def compressed_json(payload, status=200, headers=None):
+    """JSON response compressed with brotli or gzip when the client accepts it"""
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    response = Response(body, status=status, mimetype='application/json', headers=headers or {})
+    response.headers['Vary'] = 'Accept-Encoding'
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+    if encoding and len(body) > 512:
+        response.set_data(brotli.compress(body, quality=5) if encoding == 'br' else gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@app.route('/api/professors/<legacy_id>/analysis', methods=['GET'])
+@login_required
+def professor_analysis(legacy_id):
+    """Analysis of one professor's full review history, revalidated with an ETag
+
+    The (weak) ETag is the review-set fingerprint from src.analysis_store. A matching
+    If-None-Match gets a 304 after one small GraphQL call; an unchanged review
+    set is served from the analysis store; only a changed one is re-analyzed.
+    """
+    if not legacy_id.isdigit():
+        return jsonify({'error': 'Invalid professor ID'}), 400
+    scraper = get_scraper()
+    deadline = Deadline(ANALYZE_DEADLINE_SECONDS)
+    try:
+        # Cheap head check first so a matching If-None-Match skips all other work
+        head = scraper.fetch_review_head(encode_node_id("Teacher", legacy_id), deadline=deadline)
+        if head is None:
+            return jsonify({'error': 'Professor not found'}), 404
+        fingerprint = analysis_fingerprint(head)
+        # Logged-in, per-user content: caches may store it but must revalidate every time.
+        # Weak, because the br, gzip and identity encodings of the body share the tag
+        headers = {'ETag': f'W/"{fingerprint}"', 'Cache-Control': 'private, no-cache'}
+        if request.if_none_match.contains_weak(fingerprint):
+            return Response(status=304, headers=headers)
+
+        analyzed = scraper.analyze_professor(legacy_id, deadline=deadline, head=head)
+        if analyzed['fingerprint'] is None:
+            # Don't pin a transient failure behind an ETag
+            return compressed_json(analyzed['result'], headers={'Cache-Control': 'no-store'})
+        headers['ETag'] = f'W/"{analyzed["fingerprint"]}"'
+        return compressed_json(analyzed['result'], headers=headers)
+    except DeadlineExceeded:
+        return jsonify({'error': 'Analysis did not finish before the request deadline'}), 504
+    except Exception as e:
+        logger.error(f"Error in /api/professors/{legacy_id}/analysis: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def export_response(results, export_format):
+    """Stream results to the client in one of EXPORT_FORMATS"""
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if export_format == 'parquet' and not parquet_available():
+        return jsonify({'error': 'Parquet export requires pyarrow to be installed'}), 501
+
+    mimetype, filename = EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(stream_export(results, export_format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@app.route('/api/export/<result_id>', methods=['GET'])
+@login_required
+def export_stored_results(result_id):
+    """Stream a stored analysis result set as CSV, NDJSON or Parquet"""
+    metadata = load_metadata(result_id)
+    if metadata is None or metadata.get('owner') not in (None, get_current_user()):
+        return jsonify({'error': 'Result not found'}), 404
+    return export_response(iter_results(result_id), request.args.get('format', 'csv').lower())
+
+
 @app.route('/api/export', methods=['POST'])
 @login_required
 def export_results():
-    """Export results as CSV"""
+    """Export results posted by the client (kept for older clients; prefer /api/export/<result_id>)"""
     try:
         data = request.get_json()
         results = data.get('results', [])
@@ -335,30 +651,7 @@ def export_results():
         if not results:
             return jsonify({'error': 'No results to export'}), 400
 
-        # Create CSV
-        output = StringIO()
-        writer = csv.DictWriter(output, fieldnames=['url', 'professor_name', 'number_of_reviews', 'average_quality', 'average_difficulty', 'analysis'])
-        writer.writeheader()
-
-        for result in results:
-            if result.get('status') == 'success':
-                writer.writerow({
-                    'url': result.get('url', ''),
-                    'professor_name': result.get('professor_name', ''),
-                    'number_of_reviews': result.get('number_of_reviews', ''),
-                    'average_quality': result.get('average_quality', ''),
-                    'average_difficulty': result.get('average_difficulty', ''),
-                    'analysis': result.get('analysis', '')
-                })
-
-        # Return CSV file
-        output.seek(0)
-        return send_file(
-            StringIO(output.getvalue()),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name='professor_analyses.csv'
-        )
+        return export_response(results, data.get('format', 'csv').lower())
 
     except Exception as e:
         logger.error(f"Error in /api/export: {e}")
@@ -376,6 +669,61 @@ def health():
         return jsonify({'status': 'unhealthy', 'message': str(e)}), 503
 
 
+@app.route('/api/traces/<trace_id>', methods=['GET'])
+@login_required
+def get_trace(trace_id):
+    """Return the timing tree recorded for a traced request"""
+    trace = load_trace(trace_id)
+    if trace is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    return jsonify(trace)
+
+
+@app.route('/api/archive/reviews', methods=['GET'])
+@login_required
+def archive_reviews_query():
+    """Filtered, grouped review aggregates from the local review archive (no upstream calls)"""
+    if not archive_available():
+        return jsonify({'error': 'The review archive requires pyarrow to be installed'}), 501
+    try:
+        rows = query_reviews(
+            course=request.args.get('course'),
+            department=request.args.get('department'),
+            teacher=request.args.getlist('teacher') or None,
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            group_by=request.args.get('group_by'),
+            min_reviews=request.args.get('min_reviews', 1, type=int),
+            order_by=request.args.get('order_by', 'reviews'),
+            descending=request.args.get('order', 'desc') != 'asc',
+            limit=request.args.get('limit', type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return compressed_json({'rows': rows})
+
+
+@app.route('/api/llm/usage', methods=['GET'])
+@login_required
+def llm_usage():
+    """Model routing table and per-route call, token, cost and latency aggregates"""
+    hours = request.args.get('hours', type=float)
+    if hours is not None and hours <= 0:
+        return jsonify({'error': 'hours must be a positive number'}), 400
+    return jsonify({
+        'routing_signature': routing_signature(),
+        'routes': ROUTES,
+        'usage': ledger_summary(hours)
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint, aggregated across gunicorn workers"""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Not found'}), 404
@@ -0,0 +1,35 @@
+"""
+Gunicorn configuration
+
+Picked up automatically when gunicorn is started from the project root.
+
+Requests spend almost all their time waiting on RateMyProfessors, OpenAI and
+Google, so each worker process serves many requests concurrently instead of
+one at a time. The default gthread worker runs GUNICORN_THREADS request
+threads per process; set GUNICORN_WORKER_CLASS=gevent (after installing
+gevent) to use green threads and GUNICORN_WORKER_CONNECTIONS instead.
+"""
+import os
+import shutil
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '100'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '500'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+
+def on_starting(server):
+    """Start every deploy with an empty Prometheus multiprocess directory"""
+    multiproc_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop the live-gauge files of a worker that has exited"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,11 +1,18 @@
 import os
 import sys
+import argparse
 from src.professor_finder import RMPScraper
-from src.review_analyzer import ReviewScraper
+from src.review_analyzer import ReviewScraper, review_window_start, professor_key
+from src.scheduler import set_default_priority, BATCH
+from src.adaptive import RMP_CONTROLLER
+from src.quick_insights import quick_columns
+from src import cassette
 import pandas as pd
 import logging
 import json
 import time
+import queue
+import threading
 
 # Get the project root directory
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -30,11 +37,34 @@ def setup_logging():
         ]
     )
 
-def get_course_codes():
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Find professors for courses and summarize their RateMyProfessors reviews")
+    parser.add_argument('course_codes', nargs='*', help="Course codes to analyze (defaults to data/input/courses.txt)")
+    parser.add_argument('--batch', action='store_true', help="Summarize through one OpenAI Batch API job instead of per-professor calls")
+    parser.add_argument('--course-scoped', action='store_true', help="Only fetch and summarize each professor's reviews for the course being analyzed")
+    parser.add_argument('--max-reviews', type=int, help="Only fetch and summarize each professor's most recent N reviews")
+    parser.add_argument('--since-years', type=float, help="Only fetch and summarize reviews from the last N years")
+    parser.add_argument('--quick', action='store_true', help="Skip the LLM and summarize reviews with local quick insights (keywords, themes, trend)")
+    parser.add_argument('--fetch-workers', type=int, default=8, help="Professors whose reviews are fetched concurrently (default 8); RMP traffic is paced adaptively")
+    parser.add_argument('--analyze-workers', type=int, default=4, help="Concurrent LLM summaries (default 4)")
+    parser.add_argument('--record', metavar='CASSETTE', help="Record all upstream HTTP traffic to a cassette file (.jsonl.gz)")
+    parser.add_argument('--replay', metavar='CASSETTE', help="Answer upstream HTTP requests from a recorded cassette instead of the network")
+    parser.add_argument('--replay-latency', type=float, help="Scale applied to recorded response times during replay (0 = instant, 1 = as recorded)")
+    args = parser.parse_args()
+    if args.fetch_workers < 1 or args.analyze_workers < 1:
+        parser.error("--fetch-workers and --analyze-workers must be at least 1")
+    if args.quick and args.batch:
+        parser.error("--quick and --batch are mutually exclusive")
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+    return args
+
+def get_course_codes(args):
     """Get course codes from user input or file"""
-    if len(sys.argv) > 1:
+    if args.course_codes:
         # Get course codes from command line arguments
-        return sys.argv[1:]
+        return args.course_codes
     else:
         # Try to read from courses.txt
         courses_file = os.path.join(INPUT_DIR, 'courses.txt')
@@ -46,81 +76,174 @@ def get_course_codes():
             print("Example usage: python main.py CS101 MATH201")
             sys.exit(1)
 
+# Sentinel that tells a stage's workers there is no more input
+STAGE_DONE = object()
+
+def search_stage(finder, course_codes, course_scoped, fetch_queue, occurrences):
+    """Stage 1: search courses one by one, handing professors on as soon as each course is found
+
+    A professor found under several courses is only queued the first time;
+    every (course, professor) occurrence is recorded so results can be fanned
+    out to each course afterwards.
+    """
+    all_professors = []
+    for position, course_code in enumerate(course_codes):
+        logging.info(f"Searching for professors teaching {course_code}")
+        try:
+            professors = finder.find_professors(course_code, f"Course {course_code}")
+        except Exception as e:
+            logging.error(f"Error searching for course {course_code}: {e}")
+            continue
+        if not professors:
+            logging.warning(f"No professors found for course {course_code}")
+        for index, professor in enumerate(professors):
+            key = professor_key(professor['url'], course_code if course_scoped else None)
+            if key not in occurrences:
+                fetch_queue.put((key, course_code, professor))
+            occurrences.setdefault(key, []).append(((position, index), course_code, professor))
+        all_professors.extend(professors)
+
+        # Save after each course in case of interruption
+        pd.DataFrame(all_professors).to_csv(os.path.join(OUTPUT_DIR, 'professors.csv'), index=False)
+        if position < len(course_codes) - 1:
+            time.sleep(3)  # Delay between Custom Search queries
+    logging.info(f"Found {len(all_professors)} professors ({len(occurrences)} distinct); saved to professors.csv")
+
+def fetch_stage(analyzer, args, since, fetch_queue, analyze_queue, collected):
+    """Stage 2: fetch each professor's reviews"""
+    while True:
+        item = fetch_queue.get()
+        if item is STAGE_DONE:
+            return
+        key, course_code, professor = item
+        try:
+            review_data = analyzer.scrape_reviews(
+                professor['url'],
+                course_code=course_code if args.course_scoped else None,
+                max_reviews=args.max_reviews,
+                since=since
+            )
+            if not review_data or not review_data['reviews']:
+                logging.warning(f"No reviews found for {professor['professor_name']}")
+                continue
+
+            avg_quality, avg_difficulty = analyzer.compute_averages(review_data['reviews'])
+            result = {
+                'professor_name': professor['professor_name'],
+                'number_of_reviews': len(review_data['reviews']),
+                'average_quality': avg_quality,
+                'average_difficulty': avg_difficulty,
+                'analysis': None
+            }
+            if args.quick:
+                result.update(quick_columns(review_data['reviews']))
+                collected.add(key, result)
+            elif args.batch:
+                # Summarized together once every course has been fetched
+                collected.add(key, result, review_data['reviews'])
+            else:
+                analyze_queue.put((key, result, review_data['reviews']))
+        except Exception as e:
+            logging.error(f"Error processing {professor['professor_name']}: {e}")
+
+def analyze_stage(analyzer, analyze_queue, collected):
+    """Stage 3: summarize each professor's reviews with the LLM, always from scratch"""
+    while True:
+        item = analyze_queue.get()
+        if item is STAGE_DONE:
+            return
+        key, result, reviews = item
+        try:
+            analysis = analyzer.analyze_reviews(reviews)
+            if analysis.startswith("Analysis unavailable") or analysis.startswith("Error"):
+                logging.warning(f"Analysis failed for {result['professor_name']}")
+                analysis = "Analysis unavailable"
+            result['analysis'] = analysis
+            logging.info(f"Successfully processed {result['professor_name']}")
+        except Exception as e:
+            logging.error(f"Error analyzing {result['professor_name']}: {e}")
+            result['analysis'] = "Analysis unavailable"
+        collected.add(key, result)
+
+class Collected:
+    """Thread-safe sink for finished results, keyed by professor_key"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    def add(self, key, result, reviews=None):
+        with self._lock:
+            self._items[key] = (result, reviews)
+
+    def items(self):
+        with self._lock:
+            return dict(self._items)
+
+def start_workers(count, target, args, name):
+    threads = [threading.Thread(target=target, args=args, name=f"{name}-{i}", daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def stop_workers(threads, stage_queue):
+    for _ in threads:
+        stage_queue.put(STAGE_DONE)
+    for thread in threads:
+        thread.join()
+
 def main():
+    args = parse_args()
     setup_logging()
     logging.info("Starting professor review analysis")
+    if args.record or args.replay:
+        cassette.configure('record' if args.record else 'replay', args.record or args.replay, args.replay_latency)
+    # Leave RMP and OpenAI capacity to the web app while it is serving users
+    set_default_priority(BATCH)
     
     # Get course codes
-    course_codes = get_course_codes()
+    course_codes = get_course_codes(args)
     logging.info(f"Analyzing professors for courses: {', '.join(course_codes)}")
     
     analyzer = None
     try:
-        # Step 1: Find professors using professor_finder
-        logging.info("Step 1: Finding professors for courses...")
         finder = RMPScraper()
-        finder.courses = {code: f"Course {code}" for code in course_codes}  # Update courses to search
-        finder.scrape_all_courses()
-        logging.info("Successfully found professors and saved to professors.csv")
-        
-        # Step 2: Analyze reviews using review_analyzer
-        logging.info("Step 2: Analyzing professor reviews...")
-        analyzer = ReviewScraper()
-        
-        # Process each course
-        all_results = []
-        for course_code in course_codes:
-            logging.info(f"Processing course: {course_code}")
-            try:
-                # Get professors for this course
-                professors_df = pd.read_csv(os.path.join(OUTPUT_DIR, 'professors.csv'))
-                course_professors = professors_df[professors_df['course_code'] == course_code]
-                
-                if course_professors.empty:
-                    logging.warning(f"No professors found for course {course_code}")
-                    continue
-                
-                # Process each professor
-                for _, professor in course_professors.iterrows():
-                    try:
-                        review_data = analyzer.scrape_reviews(professor['url'])
-                        
-                        if review_data and review_data['reviews']:
-                            # Calculate averages
-                            quality_ratings = [r['quality_rating'] for r in review_data['reviews'] if r['quality_rating'] is not None]
-                            difficulty_ratings = [r['difficulty_rating'] for r in review_data['reviews'] if r['difficulty_rating'] is not None]
-                            
-                            avg_quality = sum(quality_ratings) / len(quality_ratings) if quality_ratings else None
-                            avg_difficulty = sum(difficulty_ratings) / len(difficulty_ratings) if difficulty_ratings else None
-                            
-                            # Get analysis
-                            analysis = analyzer.analyze_reviews(review_data['reviews'])
-                            
-                            if analysis.startswith("Analysis unavailable") or analysis.startswith("Error"):
-                                logging.warning(f"Analysis failed for {professor['professor_name']}")
-                                analysis = "Analysis unavailable"
-                            
-                            all_results.append({
-                                'course_code': course_code,
-                                'professor_name': professor['professor_name'],
-                                'number_of_reviews': len(review_data['reviews']),
-                                'average_quality': avg_quality,
-                                'average_difficulty': avg_difficulty,
-                                'analysis': analysis
-                            })
-                            logging.info(f"Successfully processed {professor['professor_name']} for {course_code}")
-                        else:
-                            logging.warning(f"No reviews found for {professor['professor_name']}")
-                    except Exception as e:
-                        logging.error(f"Error processing {professor['professor_name']}: {e}")
-                        continue
-                    
-                    # Add delay between requests
-                    time.sleep(2)
-                
-            except Exception as e:
-                logging.error(f"Error processing course {course_code}: {e}")
-                continue
+        analyzer = ReviewScraper(use_llm=not args.quick)
+        since = review_window_start(args.since_years)
+
+        # Search -> fetch -> analyze run concurrently, connected by bounded
+        # queues so a fast stage can't run arbitrarily far ahead of a slow one
+        fetch_queue = queue.Queue(maxsize=args.fetch_workers * 4)
+        analyze_queue = queue.Queue(maxsize=args.analyze_workers * 4)
+        collected = Collected()
+        occurrences = {}
+
+        analyze_threads = start_workers(args.analyze_workers, analyze_stage, (analyzer, analyze_queue, collected), 'analyze')
+        fetch_threads = start_workers(args.fetch_workers, fetch_stage, (analyzer, args, since, fetch_queue, analyze_queue, collected), 'fetch')
+        try:
+            search_stage(finder, course_codes, args.course_scoped, fetch_queue, occurrences)
+        finally:
+            stop_workers(fetch_threads, fetch_queue)
+            logging.info(f"RMP pacing at end of fetch: {RMP_CONTROLLER.stats_line()} ({RMP_CONTROLLER.decreases} cuts)")
+            stop_workers(analyze_threads, analyze_queue)
+
+        finished = collected.items()
+        pending_reviews = {key: reviews for key, (_, reviews) in finished.items() if reviews is not None}
+        if pending_reviews:
+            logging.info(f"Submitting {len(pending_reviews)} professors as one OpenAI batch...")
+            for key, analysis in analyzer.analyze_in_batch(pending_reviews, name='course_professor_analyses').items():
+                finished[key][0]['analysis'] = analysis
+
+        # Fan each professor's result out to every course they were found under, in search order
+        rows = [
+            (order, course_code, professor, key)
+            for key, found in occurrences.items() if key in finished
+            for order, course_code, professor in found
+        ]
+        rows.sort(key=lambda row: row[0])
+        all_results = [
+            {'course_code': course_code, **finished[key][0], 'professor_name': professor['professor_name']}
+            for _, course_code, professor, key in rows
+        ]
         
         # Save results
         if all_results:
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the parts of the OpenAI API this project uses
+
+Implements chat completions, file upload/download and the Batch API with
+canned summaries so batch runs can be exercised end to end without an API key
+or spend. Batches complete after FAKE_BATCH_DELAY seconds (default 2).
+
+Usage:
+  python scripts/fake_openai_server.py            # listens on 127.0.0.1:8001
+  OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=test python main.py --batch
+"""
+
+import os
+import json
+import time
+import uuid
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+
+BATCH_DELAY = float(os.getenv('FAKE_BATCH_DELAY', '2'))
+
+files = {}
+batches = {}
+
+
+def fake_completion(body):
+    """Build a chat completion response for a request body"""
+    prompt = ' '.join(m.get('content', '') for m in body.get('messages', []))
+    prompt_tokens = max(1, len(prompt) // 4)
+    content = f"[stub summary] {prompt_tokens} prompt tokens received."
+    return {
+        'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'gpt-3.5-turbo'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'finish_reason': 'stop'
+        }],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': 12,
+            'total_tokens': prompt_tokens + 12
+        }
+    }
+
+
+def store_file(content, filename, purpose):
+    file_id = f"file-{uuid.uuid4().hex[:12]}"
+    files[file_id] = {
+        'id': file_id,
+        'object': 'file',
+        'bytes': len(content),
+        'created_at': int(time.time()),
+        'filename': filename,
+        'purpose': purpose,
+        'status': 'processed',
+        'content': content
+    }
+    return files[file_id]
+
+
+def public(record):
+    return {k: v for k, v in record.items() if k != 'content'}
+
+
+def finish_batch(batch):
+    """Run every request in the batch's input file and attach the output file"""
+    lines = files[batch['input_file_id']]['content'].decode('utf-8').splitlines()
+    output = []
+    for line in lines:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        output.append(json.dumps({
+            'id': f"batch_req_{uuid.uuid4().hex[:12]}",
+            'custom_id': item['custom_id'],
+            'response': {'status_code': 200, 'request_id': uuid.uuid4().hex, 'body': fake_completion(item['body'])},
+            'error': None
+        }))
+    output_file = store_file(('\n'.join(output) + '\n').encode('utf-8'), 'batch_output.jsonl', 'batch_output')
+    batch.update({
+        'status': 'completed',
+        'output_file_id': output_file['id'],
+        'completed_at': int(time.time()),
+        'request_counts': {'total': len(output), 'completed': len(output), 'failed': 0}
+    })
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    return jsonify(fake_completion(request.get_json() or {}))
+
+
+@app.route('/v1/files', methods=['POST'])
+def upload_file():
+    upload = request.files['file']
+    return jsonify(public(store_file(upload.read(), upload.filename, request.form.get('purpose', 'batch'))))
+
+
+@app.route('/v1/files/<file_id>/content', methods=['GET'])
+def file_content(file_id):
+    if file_id not in files:
+        return jsonify({'error': {'message': 'No such file'}}), 404
+    return Response(files[file_id]['content'], mimetype='application/octet-stream')
+
+
+@app.route('/v1/batches', methods=['POST'])
+def create_batch():
+    body = request.get_json() or {}
+    if body.get('input_file_id') not in files:
+        return jsonify({'error': {'message': 'No such input file'}}), 400
+    batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+    batches[batch_id] = {
+        'id': batch_id,
+        'object': 'batch',
+        'endpoint': body.get('endpoint'),
+        'input_file_id': body['input_file_id'],
+        'completion_window': body.get('completion_window', '24h'),
+        'status': 'in_progress',
+        'created_at': int(time.time()),
+        'request_counts': {'total': 0, 'completed': 0, 'failed': 0}
+    }
+    return jsonify(batches[batch_id])
+
+
+@app.route('/v1/batches/<batch_id>', methods=['GET'])
+def retrieve_batch(batch_id):
+    batch = batches.get(batch_id)
+    if batch is None:
+        return jsonify({'error': {'message': 'No such batch'}}), 404
+    if batch['status'] == 'in_progress' and time.time() - batch['created_at'] >= BATCH_DELAY:
+        finish_batch(batch)
+    return jsonify(batch)
+
+
+if __name__ == '__main__':
+    app.run(host='127.0.0.1', port=int(os.getenv('FAKE_OPENAI_PORT', '8001')), debug=False)
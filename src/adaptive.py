@@ -0,0 +1,195 @@
+"""
+AIMD (additive increase, multiplicative decrease) pacing for upstream calls
+
+Replaces fixed sleeps between RMP requests. The controller keeps two limits:
+how many requests may be in flight and how many may start per second. Every
+healthy response nudges both up a little; a 403/429, a network error or
+latency climbing well above its usual level halves them. Crawls therefore run
+as fast as RateMyProfessors tolerates at the moment and back off as soon as it
+pushes back.
+
+Responses to requests that were already in flight when the limits were cut
+don't cut them again, so one burst of 429s counts as a single signal.
+Failures that say nothing about RMP's health (a request deadline running out
+on our side, a missing cassette recording) are marked ignored and leave the
+limits alone.
+
+Interactive and batch traffic get separate controllers: a batch crawl starts
+slow and probes its way up, while web requests start at the ceilings and are
+only slowed once RMP actually pushes back.
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from src.deadline import DeadlineExceeded
+from src.metrics import ADAPTIVE_CONCURRENCY, ADAPTIVE_RATE, ADAPTIVE_DECREASES
+from src.scheduler import current_priority, slot_limit, BATCH, INTERACTIVE
+
+# The scheduler's RMP slots are the real ceiling on concurrent requests: a
+# controller probing above them would report concurrency that never happens.
+# Batch callers get the slots minus SCHEDULER_RESERVED_SLOTS, so the batch
+# controller is capped lower (6 of 8 by default); size SCHEDULER_RMP_SLOTS to
+# change either.
+MAX_CONCURRENCY = slot_limit('rmp', INTERACTIVE)
+BATCH_MAX_CONCURRENCY = slot_limit('rmp', BATCH)
+MAX_RATE = float(os.getenv('ADAPTIVE_MAX_RATE', '20'))
+# Latency (seconds, smoothed) above which RMP is treated as overloaded
+LATENCY_TARGET = float(os.getenv('ADAPTIVE_LATENCY_TARGET', '2.0'))
+
+THROTTLE_STATUSES = (403, 429)
+
+
+class AIMDController:
+    def __init__(self, name, initial_concurrency=2, initial_rate=2.0,
+                 max_concurrency=MAX_CONCURRENCY, max_rate=MAX_RATE, min_rate=0.1,
+                 rate_step=0.05, latency_target=LATENCY_TARGET):
+        self.name = name
+        self.concurrency = float(initial_concurrency)
+        self.rate = float(initial_rate)
+        self.max_concurrency = max_concurrency
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.rate_step = rate_step
+        self.latency_target = latency_target
+        self.decreases = 0
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._next_start = 0.0
+        self._last_decrease = 0.0
+        self._fast_latency = None
+        self._baseline_latency = None
+        self._samples = 0
+        self._publish()
+
+    def _publish(self):
+        ADAPTIVE_CONCURRENCY.labels(upstream=self.name).set(self.concurrency)
+        ADAPTIVE_RATE.labels(upstream=self.name).set(self.rate)
+
+    def acquire(self, deadline=None):
+        """Block until a request may start; returns the start time to pass to release()
+
+        Raises DeadlineExceeded if the deadline runs out while waiting.
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = None
+                if self._in_flight < max(1, int(self.concurrency)):
+                    wait = self._next_start - now
+                    if wait <= 0:
+                        self._in_flight += 1
+                        self._next_start = now + 1.0 / self.rate
+                        return now
+                if deadline is not None:
+                    if deadline.expired:
+                        raise DeadlineExceeded(f"Deadline of {deadline.seconds:g}s exceeded waiting for {self.name} pacing")
+                    wait = deadline.remaining() if wait is None else min(wait, deadline.remaining())
+                self._cond.wait(wait)
+
+    def release(self, started, latency, outcome):
+        """Record one finished request: outcome is 'ok', 'throttled', 'error' or 'ignored'"""
+        with self._cond:
+            self._in_flight -= 1
+            if outcome == 'ignored':
+                self._cond.notify_all()
+                return
+            if outcome == 'ok' and self._latency_rising(latency):
+                outcome = 'latency'
+            if outcome == 'ok':
+                self._increase()
+            elif started >= self._last_decrease:
+                self._decrease(outcome)
+            self._publish()
+            self._cond.notify_all()
+
+    def _latency_rising(self, latency):
+        if self._fast_latency is None:
+            self._fast_latency = latency
+        else:
+            self._fast_latency = 0.7 * self._fast_latency + 0.3 * latency
+        self._samples += 1
+        rising = self._fast_latency > self.latency_target or (
+            self._samples >= 20 and self._baseline_latency is not None
+            and self._fast_latency > 2.5 * self._baseline_latency
+        )
+        if not rising:
+            # The baseline follows healthy latency slowly so gradual drift isn't mistaken for overload
+            if self._baseline_latency is None:
+                self._baseline_latency = latency
+            else:
+                self._baseline_latency = 0.95 * self._baseline_latency + 0.05 * latency
+        return rising
+
+    def _increase(self):
+        # Roughly +1 concurrent request per window of successes at the current limit
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+        self.rate = min(self.max_rate, self.rate + self.rate_step)
+
+    def _decrease(self, reason):
+        self.concurrency = max(1.0, self.concurrency / 2)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._last_decrease = time.monotonic()
+        # Let the smoothed latency start fresh at the new, lower load
+        self._fast_latency = None
+        self.decreases += 1
+        ADAPTIVE_DECREASES.labels(upstream=self.name, reason=reason).inc()
+        logging.warning(f"{self.name} limits cut ({reason}): {self.stats_line()}")
+
+    def stats(self):
+        with self._cond:
+            return {
+                'concurrency_limit': int(self.concurrency),
+                'rate_limit': round(self.rate, 2),
+                'in_flight': self._in_flight,
+                'latency_seconds': round(self._fast_latency, 3) if self._fast_latency is not None else None,
+                'decreases': self.decreases,
+            }
+
+    def stats_line(self):
+        return f"concurrency {int(self.concurrency)}, {self.rate:.2f} req/s"
+
+    @contextmanager
+    def slot(self, deadline=None):
+        """Pace the enclosed request; pass the response status to the yielded object's .status()"""
+        result = _Outcome()
+        started = self.acquire(deadline)
+        try:
+            yield result
+        except DeadlineExceeded:
+            result.value = 'ignored'
+            raise
+        except Exception:
+            if result.value == 'ok':
+                result.value = 'error'
+            raise
+        finally:
+            self.release(started, time.monotonic() - started, result.value)
+
+
+class _Outcome:
+    def __init__(self):
+        self.value = 'ok'
+
+    def status(self, status_code):
+        if status_code in THROTTLE_STATUSES:
+            self.value = 'throttled'
+        elif status_code >= 500:
+            self.value = 'error'
+
+    def ignore(self):
+        """The request failed for a reason unrelated to upstream health"""
+        self.value = 'ignored'
+
+
+# Batch RMP GraphQL calls of the process (crawls, main.py, the cache warmer)
+RMP_CONTROLLER = AIMDController('rmp', initial_concurrency=min(2, BATCH_MAX_CONCURRENCY), max_concurrency=BATCH_MAX_CONCURRENCY)
+# Interactive RMP GraphQL calls
+RMP_INTERACTIVE_CONTROLLER = AIMDController('rmp_interactive', initial_concurrency=MAX_CONCURRENCY, initial_rate=MAX_RATE)
+
+
+def rmp_controller():
+    """The RMP controller for the current call's priority"""
+    return RMP_CONTROLLER if current_priority() == BATCH else RMP_INTERACTIVE_CONTROLLER
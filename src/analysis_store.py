@@ -0,0 +1,68 @@
+"""
+Per-professor store of finished analyses, keyed by a review-set fingerprint
+
+Each professor's latest analysis is kept in its own JSON file together with
+the fingerprint it was produced from. The fingerprint combines RMP's rating
+count and newest rating ID (one small GraphQL call to obtain) with the prompt
+version and model routing table, so it changes exactly when a new analysis
+would differ. It doubles as the ETag of
+GET /api/professors/<legacy_id>/analysis.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANALYSIS_DIR = os.getenv('ANALYSIS_STORE_DIR') or os.path.join(PROJECT_ROOT, 'data', 'cache', 'analyses')
+
+
+def review_fingerprint(num_ratings, latest_review_id, prompt_version, models):
+    """Short stable hash identifying a review set and the prompt and models that summarize it"""
+    text = f"{num_ratings}:{latest_review_id}:{prompt_version}:{models}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:20]
+
+
+def _analysis_path(legacy_id):
+    legacy_id = str(legacy_id)
+    if not legacy_id.isdigit():
+        return None
+    return os.path.join(ANALYSIS_DIR, f"{legacy_id}.json")
+
+
+def load_analysis(legacy_id):
+    """Return the stored record for a professor, or None"""
+    path = _analysis_path(legacy_id)
+    if path is None:
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_analysis(legacy_id, fingerprint, result, extra=None):
+    """Store a professor's analysis result under the fingerprint it was made from"""
+    path = _analysis_path(legacy_id)
+    if path is None:
+        raise ValueError(f"Invalid RMP teacher ID: {legacy_id!r}")
+    record = {
+        'legacy_id': str(legacy_id),
+        'fingerprint': fingerprint,
+        'saved_at': time.time(),
+        'result': result
+    }
+    if extra:
+        record.update(extra)
+    try:
+        os.makedirs(ANALYSIS_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Could not save analysis for teacher {legacy_id}: {e}")
+    return record
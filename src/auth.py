@@ -1,16 +1,25 @@
 """
 Google OAuth authentication module for NYU workspace accounts
+
+The OAuth client config is read once at import and Google's ID-token signing
+certs are cached for as long as Google's Cache-Control header allows, so a
+login costs only the token exchange itself.
 """
 import os
+import re
+import time
+import base64
 import logging
+import threading
 from functools import wraps
 from flask import session, redirect, url_for, request
-from google.auth.transport.requests import Request
-from google.oauth2.id_token import verify_oauth2_token
+from google.auth import jwt
 from google_auth_oauthlib.flow import Flow
 from dotenv import load_dotenv
 import json
 
+from src.http_client import get_session
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
@@ -22,6 +31,41 @@ GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
 OAUTH_REDIRECT_URI = os.getenv('OAUTH_REDIRECT_URI')  # e.g., https://profs.louai.dev/oauth/callback
 ALLOWED_DOMAIN = 'nyu.edu'  # Only allow NYU workspace accounts
 
+OAUTH_SCOPES = [
+    'openid',
+    'https://www.googleapis.com/auth/userinfo.email',
+    'https://www.googleapis.com/auth/userinfo.profile'
+]
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+# Used when Google's response carries no max-age
+DEFAULT_CERTS_MAX_AGE = 3600
+# Refresh this long before expiry, in the background, so no login waits on it
+CERTS_REFRESH_AHEAD = 300
+# An unknown key ID forces a refetch at most this often
+CERTS_FORCED_REFRESH_INTERVAL = 60
+
+
+def load_client_config():
+    """OAuth client config from client_secret.json if present, otherwise from the environment"""
+    client_secrets_file = 'client_secret.json'
+    if os.path.exists(client_secrets_file):
+        with open(client_secrets_file, 'r') as f:
+            return json.load(f)
+    if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
+        return None
+    return {
+        "installed": {
+            "client_id": GOOGLE_CLIENT_ID,
+            "client_secret": GOOGLE_CLIENT_SECRET,
+            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+            "token_uri": "https://oauth2.googleapis.com/token"
+        }
+    }
+
+CLIENT_CONFIG = load_client_config()
+
 def get_oauth_flow(redirect_uri=None):
     """Create and return Google OAuth flow"""
     if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
@@ -32,38 +76,84 @@ def get_oauth_flow(redirect_uri=None):
     if not final_redirect_uri:
         raise ValueError("redirect_uri must be provided or OAUTH_REDIRECT_URI environment variable must be set")
     
-    # Try to load from client_secret.json if it exists
-    client_secrets_file = 'client_secret.json'
-    if os.path.exists(client_secrets_file):
-        return Flow.from_client_secrets_file(
-            client_secrets_file,
-            scopes=[
-                'openid',
-                'https://www.googleapis.com/auth/userinfo.email',
-                'https://www.googleapis.com/auth/userinfo.profile'
-            ],
-            redirect_uri=final_redirect_uri
-        )
-    else:
-        # Fall back to environment variables
-        client_config = {
-            "installed": {
-                "client_id": GOOGLE_CLIENT_ID,
-                "client_secret": GOOGLE_CLIENT_SECRET,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-                "redirect_uris": [final_redirect_uri]
-            }
-        }
-        return Flow.from_client_config(
-            client_config,
-            scopes=[
-                'openid',
-                'https://www.googleapis.com/auth/userinfo.email',
-                'https://www.googleapis.com/auth/userinfo.profile'
-            ],
-            redirect_uri=final_redirect_uri
-        )
+    # A Flow carries per-login state, so it is built per request from the preloaded config
+    return Flow.from_client_config(CLIENT_CONFIG, scopes=OAUTH_SCOPES, redirect_uri=final_redirect_uri)
+
+class GoogleCertCache:
+    """Google's ID-token signing certs, cached for their Cache-Control max-age"""
+
+    def __init__(self, url=GOOGLE_CERTS_URL):
+        self.url = url
+        self._lock = threading.Lock()
+        self._certs = None
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._refreshing = False
+
+    def _fetch(self):
+        response = get_session().get(self.url, timeout=10)
+        response.raise_for_status()
+        match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+        certs = response.json()
+        with self._lock:
+            self._certs = certs
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + max_age
+        logger.info(f"Fetched {len(certs)} Google signing certs, cached for {max_age}s")
+        return certs
+
+    def _refresh_in_background(self):
+        def run():
+            try:
+                self._fetch()
+            except Exception as e:
+                logger.warning(f"Background refresh of Google signing certs failed: {e}")
+            finally:
+                self._refreshing = False
+
+        self._refreshing = True
+        threading.Thread(target=run, name='google-certs-refresh', daemon=True).start()
+
+    def get(self, force=False):
+        """Return {key id: certificate}, fetching only when missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            certs, expires_at, fetched_at = self._certs, self._expires_at, self._fetched_at
+        if certs is None or now >= expires_at:
+            return self._fetch()
+        if force and now - fetched_at >= CERTS_FORCED_REFRESH_INTERVAL:
+            return self._fetch()
+        if expires_at - now < CERTS_REFRESH_AHEAD and not self._refreshing:
+            self._refresh_in_background()
+        return certs
+
+    def warm(self):
+        """Fetch the certs ahead of the first login without blocking the caller"""
+        if self._certs is None and not self._refreshing:
+            self._refresh_in_background()
+
+GOOGLE_CERTS = GoogleCertCache()
+
+def _token_key_id(token):
+    header = token.split('.')[0]
+    header += '=' * (-len(header) % 4)
+    return json.loads(base64.urlsafe_b64decode(header.encode('utf-8'))).get('kid')
+
+def verify_id_token(token, audience):
+    """Verify a Google ID token against the cached signing certs and return its claims
+
+    Equivalent to google.oauth2.id_token.verify_oauth2_token, minus the cert
+    download on every call.
+    """
+    certs = GOOGLE_CERTS.get()
+    if _token_key_id(token) not in certs:
+        # Google rotated its keys since the certs were cached
+        certs = GOOGLE_CERTS.get(force=True)
+    claims = jwt.decode(token, certs=certs, audience=audience)
+    if claims.get('iss') not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer. 'iss' should be one of {GOOGLE_ISSUERS} but got {claims.get('iss')}")
+    return claims
 
 def login_required(f):
     """Decorator to require login for routes"""
@@ -0,0 +1,132 @@
+"""
+OpenAI Batch API support for offline bulk analysis
+
+Instead of one synchronous chat completion per professor, every prompt is
+written to a JSONL file, uploaded once and submitted as a single batch job.
+The job is polled until it finishes and the outputs are mapped back to the
+caller's IDs. Local copies of the input files are kept for
+BATCH_FILE_RETENTION_DAYS. Point OPENAI_BASE_URL at
+scripts/fake_openai_server.py to run the whole flow locally without paying
+for it.
+"""
+import os
+import json
+import time
+import logging
+
+from src.metrics import OPENAI_REQUESTS, record_openai_usage
+from src.retention import prune_directory
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_DIR = os.path.join(PROJECT_ROOT, 'data', 'output', 'batches')
+BATCH_FILE_RETENTION_DAYS = float(os.getenv('BATCH_FILE_RETENTION_DAYS', '7'))
+
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchAnalyzer:
+    def __init__(self, openai_client, model, max_tokens, poll_interval=None, timeout=None):
+        self.openai_client = openai_client
+        self.model = model
+        self.max_tokens = max_tokens
+        self.poll_interval = poll_interval or float(os.getenv('OPENAI_BATCH_POLL_SECONDS', '30'))
+        # The Batch API promises completion within 24h; don't wait longer than that
+        self.timeout = timeout or float(os.getenv('OPENAI_BATCH_TIMEOUT_SECONDS', str(24 * 3600)))
+
+    def write_batch_file(self, jobs, path):
+        """Write one chat completion request per job to a JSONL batch input file
+
+        jobs maps a caller-chosen custom_id to the list of chat messages.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for custom_id, messages in jobs.items():
+                f.write(json.dumps({
+                    'custom_id': str(custom_id),
+                    'method': 'POST',
+                    'url': '/v1/chat/completions',
+                    'body': {
+                        'model': self.model,
+                        'messages': messages,
+                        'max_tokens': self.max_tokens
+                    }
+                }, ensure_ascii=False) + '\n')
+        logging.info(f"Wrote {len(jobs)} requests to batch file {path}")
+        return path
+
+    def submit(self, path):
+        """Upload a batch input file and start the batch job, returning its ID"""
+        with open(path, 'rb') as f:
+            input_file = self.openai_client.files.create(file=f, purpose='batch')
+        batch = self.openai_client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        logging.info(f"Submitted batch {batch.id} (input file {input_file.id})")
+        return batch.id
+
+    def wait(self, batch_id):
+        """Poll a batch until it reaches a terminal status and return it"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            batch = self.openai_client.batches.retrieve(batch_id)
+            counts = getattr(batch, 'request_counts', None)
+            if counts is not None:
+                logging.info(f"Batch {batch_id} is {batch.status}: {counts.completed}/{counts.total} done, {counts.failed} failed")
+            else:
+                logging.info(f"Batch {batch_id} is {batch.status}")
+            if batch.status in TERMINAL_STATUSES:
+                return batch
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Batch {batch_id} did not finish within {self.timeout} seconds")
+            time.sleep(self.poll_interval)
+
+    def fetch_results(self, batch):
+        """Download a finished batch's output and map custom_id to summary text
+
+        Requests that failed inside the batch map to None.
+        """
+        results = {}
+        if getattr(batch, 'output_file_id', None):
+            content = self.openai_client.files.content(batch.output_file_id)
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                custom_id = record.get('custom_id')
+                response = record.get('response') or {}
+                body = response.get('body') or {}
+                choices = body.get('choices') or []
+                if response.get('status_code') == 200 and choices:
+                    results[custom_id] = choices[0].get('message', {}).get('content')
+                    OPENAI_REQUESTS.labels(model=self.model, outcome='success').inc()
+                    record_openai_usage(self.model, body.get('usage'))
+                else:
+                    results[custom_id] = None
+                    OPENAI_REQUESTS.labels(model=self.model, outcome='error').inc()
+        if getattr(batch, 'error_file_id', None):
+            content = self.openai_client.files.content(batch.error_file_id)
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                results.setdefault(record.get('custom_id'), None)
+                logging.warning(f"Batch request {record.get('custom_id')} failed: {record.get('error') or record.get('response')}")
+        return results
+
+    def run(self, jobs, name='analysis'):
+        """Write, submit and wait for a batch, returning custom_id -> summary text"""
+        if not jobs:
+            return {}
+        path = os.path.join(BATCH_DIR, f"{name}-{int(time.time())}.jsonl")
+        self.write_batch_file(jobs, path)
+        prune_directory(BATCH_DIR, BATCH_FILE_RETENTION_DAYS)
+        batch_id = self.submit(path)
+        batch = self.wait(batch_id)
+        if batch.status != 'completed':
+            logging.error(f"Batch {batch_id} ended with status {batch.status}")
+        results = self.fetch_results(batch)
+        logging.info(f"Batch {batch_id} returned {sum(1 for r in results.values() if r)} of {len(jobs)} summaries")
+        return results
+
@@ -0,0 +1,255 @@
+"""
+Background warmer for the per-professor analysis store
+
+Run off-peak (e.g. hourly from cron; it exits immediately outside the
+window) to precompute full-history analyses so interactive /api/analyze
+requests find them in src.analysis_store:
+
+  python -m src.cache_warmer --off-peak 2-6
+
+Professors are taken first from recent /api/analyze traffic (the most
+requested ones), then from the courses in data/input/courses.txt via the
+course index or, on a miss, RMPScraper's course search. Professors whose
+review set hasn't changed cost one small GraphQL call. The run stops once its
+budget of upstream calls or OpenAI tokens is spent. Before analyzing a
+professor it estimates the cost from their rating count and skips anyone who
+would not fit in what is left; the estimate is approximate, so the budget is
+a soft limit that a run may overshoot slightly.
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+from src.paths import PROJECT_ROOT, CACHE_DIR
+from src.usage import metered
+
+POPULARITY_LOG = os.getenv('POPULARITY_LOG_PATH') or os.path.join(CACHE_DIR, 'analyze_requests.log')
+
+POPULARITY_DAYS = float(os.getenv('WARMER_POPULARITY_DAYS', '14'))
+POPULAR_LIMIT = int(os.getenv('WARMER_POPULAR_LIMIT', '200'))
+WARMER_MAX_CALLS = int(os.getenv('WARMER_MAX_CALLS', '500'))
+WARMER_MAX_TOKENS = int(os.getenv('WARMER_MAX_TOKENS', '200000'))
+WARMER_OFF_PEAK_HOURS = os.getenv('WARMER_OFF_PEAK_HOURS', '2-6')
+
+_log_lock = threading.Lock()
+
+
+def record_analyze_request(legacy_ids):
+    """Append the teachers of one /api/analyze request to the popularity log"""
+    ids = [str(legacy_id) for legacy_id in legacy_ids if legacy_id]
+    if not ids:
+        return
+    line = json.dumps({'t': int(time.time()), 'ids': ids}) + '\n'
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(POPULARITY_LOG), exist_ok=True)
+            # Single short appends, so lines from several workers don't interleave
+            with open(POPULARITY_LOG, 'a', encoding='utf-8') as f:
+                f.write(line)
+    except OSError as e:
+        logging.warning(f"Could not record analyze request: {e}")
+
+
+def _read_popularity(cutoff):
+    entries = []
+    try:
+        with open(POPULARITY_LOG, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('t', 0) >= cutoff:
+                    entries.append(entry)
+    except OSError:
+        pass
+    return entries
+
+
+def popular_professors(days=POPULARITY_DAYS, limit=POPULAR_LIMIT):
+    """Most requested teacher IDs over the last days, most requested first"""
+    counts = Counter()
+    for entry in _read_popularity(time.time() - days * 86400):
+        counts.update(entry.get('ids') or [])
+    return [legacy_id for legacy_id, _ in counts.most_common(limit)]
+
+
+def compact_popularity_log(days=POPULARITY_DAYS):
+    """Drop entries older than the popularity window
+
+    A request logged by the web app between the read and the replace is lost;
+    that costs one data point, not correctness.
+    """
+    entries = _read_popularity(time.time() - days * 86400)
+    tmp_path = f"{POPULARITY_LOG}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, POPULARITY_LOG)
+    except OSError as e:
+        logging.warning(f"Could not compact popularity log: {e}")
+
+
+def parse_hours(text):
+    """Parse an "H-H" local-time window such as "2-6" or "22-5" into (start, end)"""
+    start, end = (int(part) for part in text.split('-', 1))
+    if not (0 <= start <= 23 and 0 <= end <= 24) or start == end:
+        raise ValueError(f"Off-peak window must look like 2-6, got {text!r}")
+    return start, end
+
+
+def in_window(window, now=None):
+    if window is None:
+        return True
+    start, end = window
+    hour = (now or datetime.now()).hour
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class CacheWarmer:
+    def __init__(self, scraper, finder=None, max_calls=WARMER_MAX_CALLS, max_tokens=WARMER_MAX_TOKENS, window=None):
+        self.scraper = scraper
+        self.finder = finder
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.window = window
+
+    def course_professors(self):
+        """Teacher IDs for every course in courses.txt, from the course index or course search"""
+        from src.course_index import get_course_index, merge_professors
+        from src.rmp_client import legacy_teacher_id
+
+        courses_file = os.path.join(PROJECT_ROOT, 'data', 'input', 'courses.txt')
+        try:
+            with open(courses_file, 'r') as f:
+                course_codes = [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            logging.warning("No data/input/courses.txt; warming popular professors only")
+            return
+
+        index = get_course_index()
+        for course_code in course_codes:
+            if self.budget_spent():
+                return
+            professors = index.lookup(course_code)
+            if not index.covers(course_code) and self.finder is not None:
+                try:
+                    found = self.finder.find_professors(course_code, f"Course {course_code}")
+                    index.mark_searched(course_code)
+                    professors = merge_professors(professors, found)
+                except Exception as e:
+                    logging.error(f"Error searching for course {course_code}: {e}")
+            for professor in professors:
+                legacy_id = legacy_teacher_id(professor.get('url'))
+                if legacy_id:
+                    yield legacy_id
+
+    def candidates(self):
+        seen = set()
+        for source in (popular_professors(), self.course_professors()):
+            for legacy_id in source:
+                if legacy_id not in seen:
+                    seen.add(legacy_id)
+                    yield legacy_id
+
+    def budget_spent(self):
+        return self.meter.upstream_calls >= self.max_calls or self.meter.tokens >= self.max_tokens
+
+    def estimated_cost(self, head):
+        """(upstream calls, OpenAI tokens) a fresh analysis of a professor is expected to take"""
+        from src.review_analyzer import REVIEW_PAGE_SIZE
+        from src.review_selector import PROMPT_TOKEN_BUDGET
+        from src.model_router import ROUTES
+
+        reviews = head.get('num_ratings') or 0
+        # Every review page plus the OpenAI call
+        calls = math.ceil(reviews / REVIEW_PAGE_SIZE) + 1
+        prompt_tokens = PROMPT_TOKEN_BUDGET or reviews * 100
+        completion_tokens = max(route.get('max_tokens') or 0 for route in ROUTES)
+        return calls, prompt_tokens + completion_tokens
+
+    def fits_budget(self, head):
+        calls, tokens = self.estimated_cost(head)
+        return (self.meter.upstream_calls + calls <= self.max_calls
+                and self.meter.tokens + tokens <= self.max_tokens)
+
+    def run(self):
+        """Warm analyses until the candidates, the budget or the off-peak window run out"""
+        from src.analysis_store import load_analysis
+        from src.review_analyzer import analysis_fingerprint
+        from src.rmp_client import encode_node_id
+
+        summary = {'fresh': 0, 'cached': 0, 'failed': 0, 'skipped': 0, 'stopped': 'done'}
+        with metered() as self.meter:
+            for legacy_id in self.candidates():
+                if self.budget_spent():
+                    summary['stopped'] = 'budget'
+                    break
+                if not in_window(self.window):
+                    summary['stopped'] = 'window'
+                    break
+                try:
+                    head = self.scraper.fetch_review_head(encode_node_id("Teacher", legacy_id))
+                    if head is None:
+                        summary['failed'] += 1
+                        continue
+                    stored = load_analysis(legacy_id)
+                    current = stored is not None and stored.get('fingerprint') == analysis_fingerprint(head)
+                    if not current and not self.fits_budget(head):
+                        logging.info(f"Skipping teacher {legacy_id}: {head['num_ratings']} reviews would overrun the budget")
+                        summary['skipped'] += 1
+                        continue
+                    analyzed = self.scraper.analyze_professor(legacy_id, head=head)
+                except Exception as e:
+                    logging.error(f"Error warming teacher {legacy_id}: {e}")
+                    summary['failed'] += 1
+                    continue
+                if analyzed['fingerprint'] is None:
+                    summary['failed'] += 1
+                else:
+                    summary['cached' if analyzed['cached'] else 'fresh'] += 1
+            summary.update(self.meter.as_dict())
+        logging.info(f"Cache warmer finished ({summary['stopped']}): {summary}")
+        return summary
+
+
+if __name__ == "__main__":
+    import argparse
+    from src.review_analyzer import ReviewScraper
+    from src.professor_finder import RMPScraper
+    from src.scheduler import set_default_priority, BATCH
+
+    parser = argparse.ArgumentParser(description="Precompute professor analyses during off-peak hours")
+    parser.add_argument('--max-calls', type=int, default=WARMER_MAX_CALLS, help=f"Upstream call budget (default {WARMER_MAX_CALLS})")
+    parser.add_argument('--max-tokens', type=int, default=WARMER_MAX_TOKENS, help=f"OpenAI token budget (default {WARMER_MAX_TOKENS})")
+    parser.add_argument('--off-peak', default=WARMER_OFF_PEAK_HOURS, help=f"Local hours to run in, e.g. 2-6 (default {WARMER_OFF_PEAK_HOURS})")
+    parser.add_argument('--any-time', action='store_true', help="Ignore the off-peak window")
+    args = parser.parse_args()
+
+    try:
+        window = None if args.any_time else parse_hours(args.off_peak)
+    except ValueError as e:
+        parser.error(str(e))
+    if not in_window(window):
+        logging.info(f"Outside the off-peak window {args.off_peak}; nothing to do")
+        raise SystemExit(0)
+
+    set_default_priority(BATCH)
+    compact_popularity_log()
+    finder = RMPScraper()
+    warmer = CacheWarmer(
+        ReviewScraper(),
+        finder=finder if finder.api_key and finder.search_engine_id else None,
+        max_calls=args.max_calls,
+        max_tokens=args.max_tokens,
+        window=window
+    )
+    warmer.run()
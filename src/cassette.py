@@ -0,0 +1,225 @@
+"""
+Record/replay of upstream HTTP traffic ("cassettes")
+
+With HTTP_CASSETTE_MODE=record every RMP GraphQL, Google Custom Search and
+OpenAI exchange is appended to a gzip-compressed JSON-lines cassette. With
+HTTP_CASSETTE_MODE=replay the same requests are answered from the cassette and
+never leave the process, so fetch/analyze performance can be studied offline
+on production-shaped data. HTTP_CASSETTE_LATENCY scales the recorded response
+times that replay waits before answering (0, the default, answers instantly; 1
+reproduces them as recorded).
+
+Requests are matched on method, URL and JSON body. API keys in query strings
+are dropped before matching and request headers are never stored. A request
+recorded several times is replayed in recorded order, repeating the last
+answer once they run out.
+
+requests-based calls are intercepted by CassetteAdapter (mounted by
+src.http_client.get_session); the OpenAI client gets CassetteTransport via
+openai_http_client().
+"""
+import os
+import io
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASSETTE_DIR = os.path.join(PROJECT_ROOT, 'data', 'cassettes')
+
+CASSETTE_MODES = ('off', 'record', 'replay')
+# Query parameters that carry credentials and are left out of cassettes
+SECRET_PARAMS = {'key', 'api_key', 'access_token'}
+# Headers that no longer describe the stored (already decoded) body
+DROPPED_RESPONSE_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'set-cookie'}
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """A replayed request has no recording"""
+
+
+def _redact_url(url):
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
+
+def _canonical_body(body, content_type):
+    if not body:
+        return ''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if 'multipart/' in (content_type or ''):
+        # Multipart boundaries are random, so uploads are matched on URL alone
+        return ''
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(',', ':'))
+    except ValueError:
+        return hashlib.sha1(body).hexdigest()
+
+
+def request_key(method, url, body=None, content_type=None):
+    text = f"{method.upper()} {_redact_url(url)}\n{_canonical_body(body, content_type)}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path, mode, latency_scale=0.0):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"HTTP cassette mode must be one of {', '.join(CASSETTE_MODES)}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._played = {}
+        if mode == 'replay':
+            self._load()
+        elif mode == 'record':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _load(self):
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry['key'], []).append(entry)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"HTTP cassette not found: {self.path}")
+        logging.info(f"Replaying {sum(len(e) for e in self._entries.values())} HTTP exchanges from {self.path}")
+
+    def record(self, method, url, body, content_type, status, headers, content, elapsed):
+        entry = {
+            'key': request_key(method, url, body, content_type),
+            'method': method.upper(),
+            'url': _redact_url(url),
+            'status': status,
+            'headers': {k: v for k, v in headers.items() if k.lower() not in DROPPED_RESPONSE_HEADERS},
+            'body': content.decode('utf-8', errors='replace'),
+            'elapsed': round(elapsed, 4)
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            # Each append is its own gzip member; gzip readers treat them as one stream
+            with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                f.write(line)
+
+    def play(self, method, url, body, content_type):
+        """Return the recorded (status, headers, body bytes) for a request, honoring latency"""
+        key = request_key(method, url, body, content_type)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"No cassette recording for {method.upper()} {_redact_url(url)}")
+            index = self._played.get(key, 0)
+            self._played[key] = index + 1
+            entry = entries[min(index, len(entries) - 1)]
+        if self.latency_scale > 0:
+            time.sleep(entry['elapsed'] * self.latency_scale)
+        return entry['status'], entry['headers'], entry['body'].encode('utf-8')
+
+
+class CassetteAdapter(HTTPAdapter):
+    """requests transport adapter that records to or replays from a cassette"""
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        content_type = request.headers.get('Content-Type')
+        if self.cassette.mode == 'replay':
+            status, headers, content = self.cassette.play(request.method, request.url, request.body, content_type)
+            response = requests.Response()
+            response.status_code = status
+            response.headers = CaseInsensitiveDict(headers)
+            response.raw = io.BytesIO(content)
+            response._content = content
+            response.url = request.url
+            response.request = request
+            response.encoding = requests.utils.get_encoding_from_headers(response.headers) or 'utf-8'
+            response.reason = 'OK' if status < 400 else 'Replayed'
+            return response
+
+        started = time.monotonic()
+        response = super().send(request, **kwargs)
+        self.cassette.record(request.method, request.url, request.body, content_type,
+                             response.status_code, response.headers, response.content,
+                             time.monotonic() - started)
+        return response
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport (used by the OpenAI client) that records to or replays from a cassette"""
+
+    def __init__(self, cassette, wrapped=None):
+        self.cassette = cassette
+        self.wrapped = wrapped or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        body = request.read()
+        content_type = request.headers.get('content-type')
+        if self.cassette.mode == 'replay':
+            status, headers, content = self.cassette.play(request.method, str(request.url), body, content_type)
+            return httpx.Response(status, headers=headers, content=content, request=request)
+
+        started = time.monotonic()
+        response = self.wrapped.handle_request(request)
+        response.read()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_RESPONSE_HEADERS}
+        self.cassette.record(request.method, str(request.url), body, content_type,
+                             response.status_code, headers, response.content,
+                             time.monotonic() - started)
+        return httpx.Response(response.status_code, headers=headers, content=response.content, request=request)
+
+    def close(self):
+        self.wrapped.close()
+
+
+_cassette = None
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure(mode=None, path=None, latency_scale=None):
+    """Set up the process-wide cassette; arguments default to the HTTP_CASSETTE_* variables
+
+    Must run before the first upstream call (main.py does it while parsing
+    options; the Flask app relies on the environment).
+    """
+    global _cassette, _configured
+    mode = (mode or os.getenv('HTTP_CASSETTE_MODE') or 'off').lower()
+    path = path or os.getenv('HTTP_CASSETTE_PATH') or os.path.join(CASSETTE_DIR, 'default.jsonl.gz')
+    if latency_scale is None:
+        latency_scale = float(os.getenv('HTTP_CASSETTE_LATENCY', '0'))
+    with _configure_lock:
+        _cassette = None if mode == 'off' else Cassette(path, mode, latency_scale)
+        _configured = True
+        if _cassette is not None:
+            logging.info(f"HTTP cassette {mode} mode: {path}")
+    return _cassette
+
+
+def get_cassette():
+    """The active cassette, or None when recording and replay are off"""
+    if not _configured:
+        configure()
+    return _cassette
+
+
+def openai_http_client():
+    """httpx client for the OpenAI SDK, or None to use the SDK's default"""
+    cassette = get_cassette()
+    if cassette is None:
+        return None
+    return httpx.Client(transport=CassetteTransport(cassette), timeout=httpx.Timeout(600.0, connect=5.0))
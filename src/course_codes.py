@@ -0,0 +1,38 @@
+"""
+Course code normalization shared by course search and course-scoped review fetching
+
+NYU course codes look like "CS-UY 1114" while RateMyProfessors class names are
+whatever students typed, most often "CS1114" or "CSUY1114". Codes are compared
+in a normalized form: uppercase letters and digits only.
+"""
+import re
+
+
+def normalize_course_code(code):
+    """Uppercase and drop everything but letters and digits: "CS-UY 1114" -> "CSUY1114" """
+    return re.sub(r'[^A-Z0-9]', '', (code or '').upper())
+
+
+def course_code_variants(code):
+    """Normalized spellings a course is likely to appear under on RateMyProfessors
+
+    "CS-UY 1114" yields {"CSUY1114", "CS1114"}: the full code and the department
+    plus number without the school suffix.
+    """
+    code = code or ''
+    variants = set()
+    full = normalize_course_code(code)
+    if full:
+        variants.add(full)
+    parts = code.split()
+    if '-' in code and len(parts) > 1:
+        department = normalize_course_code(code.split('-')[0])
+        number = normalize_course_code(parts[-1])
+        if department and number:
+            variants.add(department + number)
+    return variants
+
+
+def matches_course(class_name, code):
+    """Whether an RMP class name refers to the given course code"""
+    return normalize_course_code(class_name) in course_code_variants(code)
@@ -0,0 +1,199 @@
+"""
+Inverted index from course code to the professors reviewed for it
+
+Every full review fetch records which RMP classes a teacher's reviews were
+for, with per-course review counts and rating sums. Reviews only reveal the
+professors someone happened to fetch, so the index answers a course search on
+its own only once Google Custom Search (10 hits per query, paid quota) has
+also been asked about that course within COURSE_SEARCH_TTL_DAYS; until then
+/api/search-professors merges both.
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+from src.course_codes import normalize_course_code, course_code_variants
+from src.paths import CACHE_DIR
+from src.rmp_client import professor_url, legacy_teacher_id
+
+COURSE_INDEX_PATH = os.getenv('COURSE_INDEX_PATH') or os.path.join(CACHE_DIR, 'course_index.json')
+COURSE_SEARCH_TTL_DAYS = float(os.getenv('COURSE_SEARCH_TTL_DAYS', '30'))
+
+RATING_FIELDS = ('review_count', 'quality_sum', 'quality_n', 'difficulty_sum', 'difficulty_n')
+
+
+class CourseIndex:
+    def __init__(self, path=None):
+        self.path = path or COURSE_INDEX_PATH
+        self._lock = threading.Lock()
+        self._index = {}
+        # Normalized course code -> when course search last covered it
+        self._searched = {}
+        self._loaded_mtime = None
+
+    def _read(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}, {}, None
+        if 'courses' not in data:
+            # Files written before search markers were kept hold only the courses
+            return data, {}, mtime
+        return data['courses'], data.get('searched', {}), mtime
+
+    def _write(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'courses': self._index, 'searched': self._searched}, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            self._loaded_mtime = os.path.getmtime(self.path)
+        except OSError as e:
+            logging.warning(f"Could not save course index: {e}")
+
+    def _refresh(self):
+        """Reload the file if another process has rewritten it"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self._index, self._searched, self._loaded_mtime = self._read()
+
+    def record(self, legacy_id, professor_name, reviews, course_code=None):
+        """Replace a teacher's entries with counts from a complete review fetch
+
+        With course_code set the fetch only covered that course, so only the
+        entries for that course's spellings are replaced.
+        """
+        legacy_id = str(legacy_id)
+        counts = {}
+        for review in reviews:
+            key = normalize_course_code(review.get('class_name'))
+            if not key:
+                continue
+            entry = counts.setdefault(key, {
+                'professor_name': professor_name,
+                'url': professor_url(legacy_id),
+                'review_count': 0,
+                'quality_sum': 0.0,
+                'quality_n': 0,
+                'difficulty_sum': 0.0,
+                'difficulty_n': 0,
+                'updated_at': time.time()
+            })
+            entry['review_count'] += 1
+            if review.get('quality_rating') is not None:
+                entry['quality_sum'] += review['quality_rating']
+                entry['quality_n'] += 1
+            if review.get('difficulty_rating') is not None:
+                entry['difficulty_sum'] += review['difficulty_rating']
+                entry['difficulty_n'] += 1
+
+        scope = course_code_variants(course_code) if course_code else None
+        with self._lock:
+            # Merge into the latest file so entries from other workers survive
+            self._index, self._searched, self._loaded_mtime = self._read()
+            current = {
+                key: teachers[legacy_id]
+                for key, teachers in self._index.items()
+                if legacy_id in teachers and (scope is None or key in scope)
+            }
+            wanted = {key: entry for key, entry in counts.items() if scope is None or key in scope}
+            if _same_counts(current, wanted):
+                # Refetching an unchanged teacher doesn't rewrite the whole file
+                return
+            for key in current:
+                del self._index[key][legacy_id]
+                if not self._index[key]:
+                    del self._index[key]
+            for key, entry in wanted.items():
+                self._index.setdefault(key, {})[legacy_id] = entry
+            self._write()
+
+    def mark_searched(self, course_code):
+        """Remember that course search has been asked about a course"""
+        key = normalize_course_code(course_code)
+        if not key:
+            return
+        with self._lock:
+            self._index, self._searched, self._loaded_mtime = self._read()
+            self._searched[key] = time.time()
+            self._write()
+
+    def covers(self, course_code):
+        """Whether course search covered the course recently enough to trust the index alone"""
+        cutoff = time.time() - COURSE_SEARCH_TTL_DAYS * 86400
+        with self._lock:
+            self._refresh()
+            return any(self._searched.get(key, 0) >= cutoff for key in course_code_variants(course_code))
+
+    def lookup(self, course_code):
+        """Professors with reviews for a course, most-reviewed first"""
+        with self._lock:
+            self._refresh()
+            teachers = {}
+            for key in course_code_variants(course_code):
+                for legacy_id, entry in self._index.get(key, {}).items():
+                    merged = teachers.get(legacy_id)
+                    if merged is None:
+                        teachers[legacy_id] = dict(entry)
+                    else:
+                        for field in RATING_FIELDS:
+                            merged[field] += entry[field]
+
+        professors = []
+        for entry in teachers.values():
+            professors.append({
+                'course_code': course_code,
+                'course_name': f"Course {course_code}",
+                'professor_name': entry['professor_name'],
+                'url': entry['url'],
+                'review_count': entry['review_count'],
+                'average_quality': entry['quality_sum'] / entry['quality_n'] if entry['quality_n'] else None,
+                'average_difficulty': entry['difficulty_sum'] / entry['difficulty_n'] if entry['difficulty_n'] else None,
+                'source': 'index'
+            })
+        professors.sort(key=lambda p: -p['review_count'])
+        return professors
+
+
+def _same_counts(current, wanted):
+    if current.keys() != wanted.keys():
+        return False
+    return all(
+        current[key].get(field) == wanted[key][field] and current[key].get('professor_name') == wanted[key]['professor_name']
+        for key in wanted
+        for field in RATING_FIELDS
+    )
+
+
+def merge_professors(indexed, searched):
+    """Index hits followed by course search hits for teachers the index doesn't have"""
+    known = {legacy_teacher_id(p.get('url')) for p in indexed}
+    merged = list(indexed)
+    for professor in searched:
+        legacy_id = legacy_teacher_id(professor.get('url'))
+        if legacy_id is None or legacy_id not in known:
+            merged.append(professor)
+            known.add(legacy_id)
+    return merged
+
+
+_course_index = None
+_course_index_lock = threading.Lock()
+
+
+def get_course_index():
+    """Process-wide CourseIndex instance"""
+    global _course_index
+    if _course_index is None:
+        with _course_index_lock:
+            if _course_index is None:
+                _course_index = CourseIndex()
+    return _course_index
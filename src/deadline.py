@@ -0,0 +1,47 @@
+"""
+Per-request deadlines for work bound by upstream calls
+
+A Deadline is created once per /api/analyze request and handed down through
+review pagination, GraphQL timeouts, retry sleeps and the OpenAI call. Work
+that would run past it raises DeadlineExceeded instead of starting, so the
+request can return what finished rather than being killed by gunicorn's
+worker timeout.
+"""
+import os
+import time
+
+# Default budget for /api/analyze; keep it below gunicorn's worker timeout
+ANALYZE_DEADLINE_SECONDS = float(os.getenv('ANALYZE_DEADLINE_SECONDS', '100'))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when work would run past its request's deadline"""
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, what='request'):
+        """Raise DeadlineExceeded if the deadline has passed"""
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g}s exceeded before {what}")
+
+    def timeout(self, cap):
+        """A network timeout that ends no later than the deadline"""
+        self.check('network call')
+        return min(cap, self.remaining())
+
+    def sleep(self, seconds, what='retry'):
+        """Sleep, unless the sleep itself would outlast the deadline"""
+        if seconds >= self.remaining():
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g}s leaves no time for {what}")
+        time.sleep(seconds)
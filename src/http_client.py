@@ -0,0 +1,32 @@
+"""
+Shared HTTP sessions for upstream calls
+
+requests.Session is not documented as thread-safe, so each thread gets its
+own session. That keeps the app safe under gunicorn's threaded (gthread) or
+green-thread (gevent) workers while still reusing pooled keep-alive
+connections to RateMyProfessors and Google instead of reconnecting on every
+call.
+
+When an HTTP cassette is active (src.cassette) every session routes through
+it, so recorded or replayed traffic covers all requests-based upstream calls.
+"""
+import threading
+import requests
+
+from src.cassette import CassetteAdapter, get_cassette
+
+_local = threading.local()
+
+
+def get_session():
+    """Return this thread's requests.Session, creating it on first use"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        cassette = get_cassette()
+        if cassette is not None:
+            adapter = CassetteAdapter(cassette)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        _local.session = session
+    return session
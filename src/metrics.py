@@ -0,0 +1,155 @@
+"""
+Prometheus metrics for the scraper, the LLM calls and the Flask routes
+
+When PROMETHEUS_MULTIPROC_DIR is set (as it is under gunicorn, see
+gunicorn.conf.py) every worker writes its samples to that directory and the
+/metrics endpoint aggregates them, so the numbers cover all workers rather than
+whichever one happened to serve the scrape.
+"""
+import os
+
+# The multiprocess value files are created on first use, so the directory must
+# exist before any metric below is touched (gunicorn.conf.py also resets it).
+if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+
+# Buckets tuned for upstream calls: RMP pages are usually sub-second, OpenAI
+# completions take several seconds and the analyze route can take minutes.
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+ROUTE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+# RateMyProfessors GraphQL
+GRAPHQL_REQUESTS = Counter(
+    'rmp_graphql_requests_total',
+    'RateMyProfessors GraphQL page requests',
+    ['outcome']
+)
+GRAPHQL_PAGE_SECONDS = Histogram(
+    'rmp_graphql_page_seconds',
+    'Latency of a single RateMyProfessors GraphQL page request',
+    buckets=UPSTREAM_BUCKETS
+)
+GRAPHQL_REVIEWS = Counter(
+    'rmp_graphql_reviews_fetched_total',
+    'Reviews returned by the RateMyProfessors GraphQL API'
+)
+
+# OpenAI
+OPENAI_REQUESTS = Counter(
+    'openai_requests_total',
+    'OpenAI chat completion requests',
+    ['model', 'outcome']
+)
+OPENAI_SECONDS = Histogram(
+    'openai_request_seconds',
+    'Latency of a single OpenAI chat completion request',
+    ['model'],
+    buckets=UPSTREAM_BUCKETS
+)
+OPENAI_TOKENS = Counter(
+    'openai_tokens_total',
+    'Tokens consumed by OpenAI chat completions',
+    ['model', 'kind']
+)
+OPENAI_RETRIES = Counter(
+    'openai_retries_total',
+    'OpenAI requests retried after a rate limit',
+    ['model']
+)
+LLM_ROUTE_DECISIONS = Counter(
+    'llm_route_decisions_total',
+    'Review summaries assigned to each model route (src/model_router.py)',
+    ['route']
+)
+LLM_COST_DOLLARS = Counter(
+    'llm_estimated_cost_dollars_total',
+    'Estimated OpenAI spend from token counts and MODEL_PRICES',
+    ['model', 'route']
+)
+
+# Google Custom Search
+CSE_REQUESTS = Counter(
+    'google_cse_requests_total',
+    'Google Custom Search API requests',
+    ['outcome']
+)
+CSE_SECONDS = Histogram(
+    'google_cse_request_seconds',
+    'Latency of a Google Custom Search API request',
+    buckets=UPSTREAM_BUCKETS
+)
+
+# Upstream scheduler
+SCHEDULER_WAIT_SECONDS = Histogram(
+    'scheduler_wait_seconds',
+    'Time an upstream call waited for a scheduler slot',
+    ['upstream', 'priority'],
+    buckets=UPSTREAM_BUCKETS
+)
+
+# Adaptive upstream pacing (src/adaptive.py)
+ADAPTIVE_CONCURRENCY = Gauge(
+    'adaptive_concurrency_limit',
+    'Current concurrent request limit of the adaptive upstream controller',
+    ['upstream'],
+    multiprocess_mode='liveall'
+)
+ADAPTIVE_RATE = Gauge(
+    'adaptive_rate_limit',
+    'Current requests-per-second limit of the adaptive upstream controller',
+    ['upstream'],
+    multiprocess_mode='liveall'
+)
+ADAPTIVE_DECREASES = Counter(
+    'adaptive_limit_decreases_total',
+    'Times the adaptive upstream controller cut its limits',
+    ['upstream', 'reason']
+)
+
+# Flask routes
+HTTP_REQUESTS = Counter(
+    'http_requests_total',
+    'HTTP requests served by the Flask app',
+    ['endpoint', 'method', 'status']
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_seconds',
+    'Latency of HTTP requests served by the Flask app',
+    ['endpoint', 'method'],
+    buckets=ROUTE_BUCKETS
+)
+
+
+def record_openai_usage(model, usage):
+    """Add the prompt and completion token counts from an OpenAI usage object or dict"""
+    if usage is None:
+        return
+    if isinstance(usage, dict):
+        prompt_tokens = usage.get('prompt_tokens') or 0
+        completion_tokens = usage.get('completion_tokens') or 0
+    else:
+        prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+    OPENAI_TOKENS.labels(model=model, kind='prompt').inc(prompt_tokens)
+    OPENAI_TOKENS.labels(model=model, kind='completion').inc(completion_tokens)
+
+
+def render_metrics():
+    """Return (body, content_type) for the /metrics endpoint"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
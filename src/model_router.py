@@ -0,0 +1,245 @@
+"""
+Routing of review summaries to a model tier, and a ledger of what each call cost
+
+choose_route() picks the first route in the routing table whose limits fit a
+professor's review count and prompt size. A route names the model and output
+token budget, or has no model, in which case the LLM is skipped and the local
+quick-insights summary is used instead. The table comes from MODEL_ROUTES (a
+JSON list, or a path to a JSON file) and defaults to DEFAULT_ROUTES.
+
+Every OpenAI call made through a route is recorded with its latency, token
+counts and estimated cost (MODEL_PRICES, USD per million tokens): in
+Prometheus, and as one JSON line in a per-day file under LLM_LEDGER_DIR so
+/api/llm/usage and `python -m src.model_router` can aggregate across processes
+and restarts when tuning the table. Day files older than
+LLM_LEDGER_RETENTION_DAYS are pruned, and past days are parsed only once per
+process, so a summary costs about one day of ledger however long the app runs.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from src.metrics import LLM_ROUTE_DECISIONS, LLM_COST_DOLLARS
+from src.retention import prune_directory
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LLM_LEDGER_DIR = os.getenv('LLM_LEDGER_DIR') or os.path.join(PROJECT_ROOT, 'data', 'cache', 'llm_ledger')
+LLM_LEDGER_RETENTION_DAYS = float(os.getenv('LLM_LEDGER_RETENTION_DAYS', '30'))
+
+# Checked in order; a limit left out is unbounded
+DEFAULT_ROUTES = [
+    {'name': 'skip', 'max_reviews': 2, 'model': None},
+    {'name': 'small', 'max_prompt_tokens': 800, 'model': 'gpt-3.5-turbo', 'max_tokens': 200},
+    {'name': 'standard', 'model': 'gpt-3.5-turbo', 'max_tokens': 300},
+]
+
+# USD per million (prompt, completion) tokens
+DEFAULT_PRICES = {
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+}
+
+
+def _load_json_setting(name):
+    value = os.getenv(name)
+    if not value:
+        return None
+    if not value.lstrip().startswith(('[', '{')):
+        with open(value, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def load_routes():
+    """The routing table from MODEL_ROUTES, validated, or DEFAULT_ROUTES"""
+    routes = _load_json_setting('MODEL_ROUTES') or DEFAULT_ROUTES
+    for route in routes:
+        if 'name' not in route or 'model' not in route:
+            raise ValueError(f"Every model route needs a name and a model (null to skip the LLM): {route}")
+        if route['model'] and not route.get('max_tokens'):
+            raise ValueError(f"Model route {route['name']!r} needs max_tokens")
+    last = routes[-1]
+    if last.get('max_reviews') is not None or last.get('max_prompt_tokens') is not None:
+        raise ValueError("The last model route must have no limits so every request is routed")
+    return routes
+
+
+def load_prices():
+    prices = dict(DEFAULT_PRICES)
+    for model, pair in (_load_json_setting('MODEL_PRICES') or {}).items():
+        prices[model] = tuple(pair)
+    return prices
+
+
+ROUTES = load_routes()
+PRICES = load_prices()
+
+
+def routing_signature(routes=None):
+    """Short hash of the routing table; part of stored analysis fingerprints"""
+    text = json.dumps(routes or ROUTES, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:10]
+
+
+def choose_route(review_count, prompt_tokens, routes=None):
+    """First route whose review-count and prompt-token limits fit"""
+    for route in routes or ROUTES:
+        if route.get('max_reviews') is not None and review_count > route['max_reviews']:
+            continue
+        if route.get('max_prompt_tokens') is not None and prompt_tokens > route['max_prompt_tokens']:
+            continue
+        LLM_ROUTE_DECISIONS.labels(route=route['name']).inc()
+        return route
+    raise ValueError("No model route matched; the last route must have no limits")
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD cost of a call, or None for a model without a known price"""
+    price = PRICES.get(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+_ledger_lock = threading.Lock()
+# Parsed day files: path -> ((size, mtime), DataFrame); only today's file keeps changing
+_ledger_frames = {}
+
+
+def _ledger_day(t):
+    return datetime.fromtimestamp(t, timezone.utc).strftime('%Y-%m-%d')
+
+
+def _ledger_file(t):
+    """Ledger file for the UTC day of timestamp t"""
+    return os.path.join(LLM_LEDGER_DIR, f"{_ledger_day(t)}.jsonl")
+
+
+def record_llm_call(route, model, seconds, usage=None, outcome='success'):
+    """Add one OpenAI call to the ledger"""
+    if isinstance(usage, dict):
+        prompt_tokens = usage.get('prompt_tokens') or 0
+        completion_tokens = usage.get('completion_tokens') or 0
+    else:
+        prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    if cost:
+        LLM_COST_DOLLARS.labels(model=model, route=route).inc(cost)
+
+    entry = {
+        't': round(time.time(), 3),
+        'route': route,
+        'model': model,
+        'outcome': outcome,
+        'seconds': round(seconds, 3),
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'cost': round(cost, 6) if cost is not None else None
+    }
+    try:
+        with _ledger_lock:
+            os.makedirs(LLM_LEDGER_DIR, exist_ok=True)
+            with open(_ledger_file(entry['t']), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+    except OSError as e:
+        logging.warning(f"Could not write LLM ledger entry: {e}")
+    prune_directory(LLM_LEDGER_DIR, max_age_days=LLM_LEDGER_RETENTION_DAYS)
+    return entry
+
+
+def _read_ledger_file(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    version = (stat.st_size, stat.st_mtime_ns)
+    with _ledger_lock:
+        cached = _ledger_frames.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    try:
+        frame = pd.read_json(path, lines=True)
+    except (ValueError, OSError) as e:
+        logging.warning(f"Could not read LLM ledger {path}: {e}")
+        return None
+    with _ledger_lock:
+        _ledger_frames[path] = (version, frame)
+    return frame
+
+
+def load_ledger(hours=None):
+    """Ledger entries as a DataFrame, optionally only those of the last hours"""
+    cutoff = time.time() - hours * 3600 if hours is not None else None
+    try:
+        names = sorted(name for name in os.listdir(LLM_LEDGER_DIR) if name.endswith('.jsonl'))
+    except FileNotFoundError:
+        names = []
+    with _ledger_lock:
+        for path in set(_ledger_frames) - {os.path.join(LLM_LEDGER_DIR, name) for name in names}:
+            del _ledger_frames[path]  # pruned
+    if cutoff is not None:
+        # Names are UTC dates, so whole days before the cutoff's are skipped unread
+        names = [name for name in names if name[:-len('.jsonl')] >= _ledger_day(cutoff)]
+    paths = [os.path.join(LLM_LEDGER_DIR, name) for name in names]
+    frames = [frame for frame in map(_read_ledger_file, paths) if frame is not None and not frame.empty]
+    ledger = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if cutoff is not None and not ledger.empty:
+        ledger = ledger[ledger['t'] >= cutoff]
+    return ledger
+
+
+def ledger_summary(hours=None):
+    """Per-route and per-model aggregates of the ledger, optionally over the last hours"""
+    ledger = load_ledger(hours)
+    if ledger.empty:
+        return {'calls': 0, 'cost': 0.0, 'routes': []}
+
+    ledger = ledger.assign(success=ledger['outcome'] == 'success')
+    grouped = ledger.groupby(['route', 'model'], sort=True)
+    routes = []
+    for (route, model), calls in grouped:
+        seconds = calls.loc[calls['success'], 'seconds']
+        routes.append({
+            'route': route,
+            'model': model,
+            'calls': int(len(calls)),
+            'errors': int((~calls['success']).sum()),
+            'prompt_tokens': int(calls['prompt_tokens'].sum()),
+            'completion_tokens': int(calls['completion_tokens'].sum()),
+            'cost': round(float(calls['cost'].fillna(0).sum()), 6),
+            'latency_mean': round(float(seconds.mean()), 3) if len(seconds) else None,
+            'latency_p50': round(float(seconds.quantile(0.5)), 3) if len(seconds) else None,
+            'latency_p95': round(float(seconds.quantile(0.95)), 3) if len(seconds) else None,
+        })
+    return {
+        'calls': int(len(ledger)),
+        'cost': round(float(ledger['cost'].fillna(0).sum()), 6),
+        'routes': routes
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize the LLM call ledger per route and model")
+    parser.add_argument('--hours', type=float, help="Only include calls from the last N hours")
+    args = parser.parse_args()
+
+    print(f"Routing table ({routing_signature()}):")
+    for route in ROUTES:
+        limits = ', '.join(f"{key}={route[key]}" for key in ('max_reviews', 'max_prompt_tokens') if route.get(key) is not None)
+        target = f"{route['model']} (max_tokens={route['max_tokens']})" if route['model'] else "no LLM (quick insights)"
+        print(f"  {route['name']}: {limits or 'everything else'} -> {target}")
+    summary = ledger_summary(args.hours)
+    print(f"\n{summary['calls']} calls, estimated cost ${summary['cost']:.4f}")
+    if summary['routes']:
+        print(pd.DataFrame(summary['routes']).to_string(index=False))
@@ -0,0 +1,7 @@
+"""
+Shared locations under the project's data directory
+"""
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', 'cache')
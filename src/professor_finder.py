@@ -4,6 +4,10 @@ import requests
 import time
 import pandas as pd
 import json
+from src.metrics import CSE_REQUESTS, CSE_SECONDS
+from src.tracing import span
+from src.http_client import get_session
+from src.usage import count_call
 
 # Get the project root directory (two levels up from this file)
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -16,6 +20,8 @@ class RMPScraper:
         load_dotenv()
         self.api_key = os.getenv('GOOGLE_CLOUD_API_KEY')
         self.search_engine_id = os.getenv('GOOGLE_SEARCH_ENGINE_ID')
+        # {course_code: course_name} to search; read from courses.txt when not set
+        self.courses = None
 
     def format_course_code(self, code):
         # Convert "ANTH-UA 326" to "ANTH326"
@@ -38,11 +44,16 @@ class RMPScraper:
             'num': 10
         }
         
+        count_call('cse')
         try:
-            response = requests.get(url, params=params)
+            with span('google_search', course_code=course_code), CSE_SECONDS.time():
+                response = get_session().get(url, params=params)
+            CSE_REQUESTS.labels(outcome=str(response.status_code)).inc()
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
+            if getattr(e, 'response', None) is None:
+                CSE_REQUESTS.labels(outcome='error').inc()
             print(f"Error making Google search request: {e}")
             if hasattr(e, 'response') and hasattr(e.response, 'text'):
                 print(f"Response text: {e.response.text}")
@@ -80,22 +91,29 @@ class RMPScraper:
         
         return nyu_professors
 
-    def scrape_all_courses(self):
-        all_results = []
-        
-        # Read courses from input file
+    def find_professors(self, course_code, course_name):
+        """Search one course and return its NYU professors with cleaned-up names"""
+        results = self.scrape_course(course_code, course_name)
+        nyu_results = self.filter_nyu_professors(results)
+        for prof in nyu_results:
+            # Search result titles look like "John Smith at New York University | Rate My Professors"
+            name_parts = prof['professor_name'].split()
+            prof['professor_name'] = f"{name_parts[0]} {name_parts[1]}"
+        return nyu_results
+
+    def load_courses(self):
+        """Courses to search: self.courses if set, otherwise data/input/courses.txt"""
+        if self.courses:
+            return self.courses
         courses_file = os.path.join(INPUT_DIR, 'courses.txt')
         with open(courses_file, 'r') as f:
-            courses = {line.strip(): f"Course {line.strip()}" for line in f if line.strip()}
+            return {line.strip(): f"Course {line.strip()}" for line in f if line.strip()}
+
+    def scrape_all_courses(self):
+        all_results = []
         
-        for code, name in courses.items():
-            results = self.scrape_course(code, name)
-            # Filter for NYU professors only and clean up professor names
-            nyu_results = self.filter_nyu_professors(results)
-            for prof in nyu_results:
-                name_parts = prof['professor_name'].split()
-                prof['professor_name'] = f"{name_parts[0]} {name_parts[1]}"
-            all_results.extend(nyu_results)
+        for code, name in self.load_courses().items():
+            all_results.extend(self.find_professors(code, name))
             
             # Save after each course in case of interruption
             df = pd.DataFrame(all_results)
@@ -0,0 +1,261 @@
+"""
+Local "quick insights" analysis of professor reviews
+
+An LLM-free alternative to ReviewScraper.analyze_reviews that runs in
+milliseconds on the fetched reviews: keywords ranked by TF-IDF over words and
+two-word phrases, how often common course themes come up, rating
+distributions, a per-year trend and a few representative quotes, plus a short
+templated summary. /api/analyze serves it with mode "quick" (or alongside the
+LLM summary with mode "both"), and it keeps working when OpenAI is unavailable.
+"""
+import math
+from datetime import timedelta
+
+import numpy as np
+
+from src.review_selector import normalize_text, parse_review_date, truncate_text, PLACEHOLDER_COMMENTS
+
+STOPWORDS = set("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing don dont down during each even every few for from further
+get gets got had has have having he her here hers him his how i if im in into is it its itself just
+know like lot lots make makes me more most much my no nor not now of off on once only or other our out
+over own really same she should so some still such take than that thats the their them then there these
+they this those through to too under until up us very was way we well were what when where which while
+who whom why will with would you your youre yours
+professor prof class classes course courses dr mr mrs ms teacher semester students student
+""".split())
+
+# Themes students commonly write about, and words that signal each one
+THEMES = {
+    'exams': {'exam', 'exams', 'test', 'tests', 'midterm', 'midterms', 'final', 'finals', 'quiz', 'quizzes'},
+    'assignments': {'homework', 'hw', 'assignment', 'assignments', 'project', 'projects', 'lab', 'labs', 'psets'},
+    'grading': {'grading', 'grade', 'grades', 'grader', 'graded', 'curve', 'curved', 'curves', 'partial', 'credit'},
+    'lectures': {'lecture', 'lectures', 'lecturer', 'explains', 'explain', 'explained', 'explanations', 'slides', 'notes'},
+    'accessibility': {'office', 'email', 'emails', 'responsive', 'approachable', 'available', 'accessible', 'cares', 'caring'},
+    'workload': {'workload', 'heavy', 'demanding', 'busy', 'intense', 'manageable'},
+    'attendance': {'attendance', 'mandatory', 'attend', 'skip', 'participation'},
+}
+
+KEYWORD_COUNT = 10
+QUOTE_COUNT = 3
+QUOTE_MAX_CHARS = 280
+QUOTE_MIN_WORDS = 8
+# Years at the end of the history compared against everything before them
+RECENT_YEARS = 2
+TREND_MIN_REVIEWS = 3
+TREND_THRESHOLD = 0.3
+
+
+def _terms(text):
+    """Words and two-word phrases of a review, without stopwords"""
+    words = [w for w in normalize_text(text).split() if len(w) > 1 and not w.isdigit()]
+    terms = [w for w in words if w not in STOPWORDS]
+    terms.extend(
+        f"{first} {second}"
+        for first, second in zip(words, words[1:])
+        if first not in STOPWORDS and second not in STOPWORDS
+    )
+    return terms
+
+
+def _tfidf(docs):
+    """Sparse, row-normalized TF-IDF weights as (rows, cols, weights, vocabulary, document frequency)"""
+    vocabulary = {}
+    rows, cols = [], []
+    for row, terms in enumerate(docs):
+        for term in terms:
+            cols.append(vocabulary.setdefault(term, len(vocabulary)))
+            rows.append(row)
+    size = max(len(vocabulary), 1)
+    if not cols:
+        empty = np.zeros(0)
+        return empty.astype(np.int64), empty.astype(np.int64), empty, [], np.zeros(size)
+
+    # Collapse repeated (review, term) pairs into counts
+    pairs, counts = np.unique(np.asarray(rows, dtype=np.int64) * size + np.asarray(cols, dtype=np.int64), return_counts=True)
+    rows, cols = pairs // size, pairs % size
+    df = np.bincount(cols, minlength=size).astype(float)
+    idf = np.log((1 + len(docs)) / (1 + df)) + 1
+    weights = (1 + np.log(counts)) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(docs)))
+    weights = weights / norms[rows]
+    terms = [None] * len(vocabulary)
+    for term, index in vocabulary.items():
+        terms[index] = term
+    return rows, cols, weights, terms, df
+
+
+def _keywords(cols, weights, terms, df, review_count, count=KEYWORD_COUNT):
+    if not terms:
+        return [], np.zeros(0)
+    scores = np.bincount(cols, weights=weights, minlength=len(terms))
+    # A keyword should recur; single mentions are noise once there are a few reviews
+    if review_count >= 4:
+        scores = np.where(df >= 2, scores, 0.0)
+    keywords = []
+    for index in np.argsort(-scores, kind='stable'):
+        if scores[index] <= 0 or len(keywords) >= count:
+            break
+        term = terms[index]
+        # Skip words already covered by a higher-ranked phrase and vice versa
+        if any(term in kept['term'].split() or kept['term'] in term.split() for kept in keywords):
+            continue
+        keywords.append({'term': term, 'score': round(float(scores[index]), 3), 'reviews': int(df[index])})
+    return keywords, scores
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), 2) if values else None
+
+
+def _themes(docs, reviews):
+    themes = []
+    for theme, words in THEMES.items():
+        mentioned = [review for terms, review in zip(docs, reviews) if words.intersection(terms)]
+        if mentioned:
+            themes.append({
+                'theme': theme,
+                'share': round(len(mentioned) / len(reviews), 2),
+                'average_quality': _mean(r.get('quality_rating') for r in mentioned)
+            })
+    themes.sort(key=lambda t: t['share'], reverse=True)
+    return themes
+
+
+def _distribution(values):
+    ratings = np.asarray([round(v) for v in values if v is not None], dtype=np.int64)
+    ratings = ratings[(ratings >= 1) & (ratings <= 5)]
+    counts = np.bincount(ratings, minlength=6)
+    return {str(rating): int(counts[rating]) for rating in range(1, 6)}
+
+
+def _trend(reviews):
+    dated = [(parse_review_date(r.get('timestamp')), r) for r in reviews]
+    dated = [(date, r) for date, r in dated if date is not None]
+    if not dated:
+        return {'by_year': [], 'direction': None}
+
+    by_year = {}
+    for date, review in dated:
+        by_year.setdefault(date.year, []).append(review)
+    years = [
+        {
+            'year': year,
+            'reviews': len(items),
+            'average_quality': _mean(r.get('quality_rating') for r in items),
+            'average_difficulty': _mean(r.get('difficulty_rating') for r in items)
+        }
+        for year, items in sorted(by_year.items())
+    ]
+
+    newest = max(date for date, _ in dated)
+    cutoff = newest - timedelta(days=365 * RECENT_YEARS)
+    recent = [r.get('quality_rating') for date, r in dated if date > cutoff and r.get('quality_rating') is not None]
+    earlier = [r.get('quality_rating') for date, r in dated if date <= cutoff and r.get('quality_rating') is not None]
+    trend = {'by_year': years, 'direction': None}
+    if len(recent) >= TREND_MIN_REVIEWS and len(earlier) >= TREND_MIN_REVIEWS:
+        recent_quality, earlier_quality = _mean(recent), _mean(earlier)
+        change = recent_quality - earlier_quality
+        if change >= TREND_THRESHOLD:
+            direction = 'improving'
+        elif change <= -TREND_THRESHOLD:
+            direction = 'declining'
+        else:
+            direction = 'steady'
+        trend.update(direction=direction, recent_quality=recent_quality, earlier_quality=earlier_quality)
+    return trend
+
+
+def _quotes(reviews, rows, cols, weights, scores, count=QUOTE_COUNT):
+    """Reviews closest to the overall TF-IDF centroid: the most praising, the most critical, then the most typical"""
+    if not len(weights):
+        return []
+    centroid = scores / max(np.linalg.norm(scores), 1e-9)
+    similarity = np.bincount(rows, weights=weights * centroid[cols], minlength=len(reviews))
+    candidates = [
+        index for index in np.argsort(-similarity, kind='stable')
+        if normalize_text(reviews[index].get('text')) not in PLACEHOLDER_COMMENTS
+        and len(normalize_text(reviews[index].get('text')).split()) >= QUOTE_MIN_WORDS
+    ]
+    quality = lambda index: reviews[index].get('quality_rating')
+    picks = []
+    for wanted in (lambda q: q is not None and q >= 4, lambda q: q is not None and q <= 2):
+        match = next((index for index in candidates if wanted(quality(index))), None)
+        if match is not None:
+            picks.append(match)
+    picks.extend(index for index in candidates if index not in picks)
+    return [
+        {
+            'text': truncate_text(reviews[index]['text'].strip(), QUOTE_MAX_CHARS),
+            'quality_rating': reviews[index].get('quality_rating'),
+            'difficulty_rating': reviews[index].get('difficulty_rating'),
+            'date': str(reviews[index].get('timestamp') or '')[:10] or None
+        }
+        for index in picks[:count]
+    ]
+
+
+def _summary(review_count, average_quality, average_difficulty, keywords, themes, trend):
+    quality = f"{average_quality:.1f}/5" if average_quality is not None else "n/a"
+    difficulty = f"{average_difficulty:.1f}/5" if average_difficulty is not None else "n/a"
+    noun = 'review' if review_count == 1 else 'reviews'
+    sentences = [f"Based on {review_count} {noun}, students rate quality {quality} and difficulty {difficulty}."]
+    if keywords:
+        terms = [k['term'] for k in keywords[:5]]
+        listed = terms[0] if len(terms) == 1 else f"{', '.join(terms[:-1])} and {terms[-1]}"
+        sentences.append(f"Frequently mentioned: {listed}.")
+    if themes:
+        top = themes[0]
+        sentence = f"The most discussed topic is {top['theme']} ({math.floor(top['share'] * 100)}% of reviews"
+        if top['average_quality'] is not None:
+            sentence += f", average quality {top['average_quality']:.1f}/5 in those reviews"
+        sentences.append(sentence + ").")
+    if trend.get('direction') in ('improving', 'declining'):
+        sentences.append(
+            f"Quality ratings are {trend['direction']}: {trend['recent_quality']:.1f}/5 over the last "
+            f"{RECENT_YEARS} years versus {trend['earlier_quality']:.1f}/5 before."
+        )
+    return ' '.join(sentences)
+
+
+def quick_insights(reviews):
+    """Summarize reviews locally; returns a JSON-serializable dict whose 'summary' stands in for the LLM text"""
+    reviews = [
+        r for r in reviews
+        if normalize_text(r.get('text')) not in PLACEHOLDER_COMMENTS or r.get('quality_rating') is not None
+    ]
+    # Rating-only reviews still count for averages, distributions and the trend,
+    # but "No Comments" must not turn into a keyword or a quote
+    docs = [
+        [] if normalize_text(r.get('text')) in PLACEHOLDER_COMMENTS else _terms(r.get('text'))
+        for r in reviews
+    ]
+    rows, cols, weights, terms, df = _tfidf(docs)
+    keywords, scores = _keywords(cols, weights, terms, df, len(reviews))
+    commented = [(set(d), r) for d, r in zip(docs, reviews) if d]
+    themes = _themes(*zip(*commented)) if commented else []
+    trend = _trend(reviews)
+    average_quality = _mean(r.get('quality_rating') for r in reviews)
+    average_difficulty = _mean(r.get('difficulty_rating') for r in reviews)
+    return {
+        'summary': _summary(len(reviews), average_quality, average_difficulty, keywords, themes, trend),
+        'number_of_reviews': len(reviews),
+        'keywords': keywords,
+        'themes': themes,
+        'quality_distribution': _distribution(r.get('quality_rating') for r in reviews),
+        'difficulty_distribution': _distribution(r.get('difficulty_rating') for r in reviews),
+        'trend': trend,
+        'quotes': _quotes(reviews, rows, cols, weights, scores)
+    }
+
+
+def quick_columns(reviews):
+    """Quick insights flattened into the columns of the batch CSV/JSON outputs"""
+    insights = quick_insights(reviews)
+    return {
+        'analysis': insights['summary'],
+        'keywords': ', '.join(k['term'] for k in insights['keywords']),
+        'quality_trend': insights['trend']['direction']
+    }
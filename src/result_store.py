@@ -0,0 +1,167 @@
+"""
+Server-side storage of analysis results and streaming exports
+
+Every /api/analyze response is written once to an NDJSON file under
+RESULTS_DIR and identified by a result ID, so exports can be streamed straight
+from disk instead of the client posting the whole payload back. The first line
+of each file holds metadata (owner and creation time); each following line is
+one professor result. Result sets older than RESULTS_RETENTION_DAYS, or beyond
+the newest RESULTS_MAX_FILES, are deleted as new ones are saved.
+"""
+import os
+import io
+import csv
+import json
+import time
+import uuid
+import logging
+import tempfile
+
+from src.retention import prune_directory
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.getenv('RESULTS_DIR') or os.path.join(PROJECT_ROOT, 'data', 'output', 'results')
+RESULTS_RETENTION_DAYS = float(os.getenv('RESULTS_RETENTION_DAYS', '7'))
+RESULTS_MAX_FILES = int(os.getenv('RESULTS_MAX_FILES', '5000'))
+
+EXPORT_FIELDS = ['url', 'course_code', 'professor_name', 'number_of_reviews', 'average_quality', 'average_difficulty', 'analysis']
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'professor_analyses.csv'),
+    'ndjson': ('application/x-ndjson', 'professor_analyses.ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'professor_analyses.parquet'),
+}
+
+PARQUET_ROW_GROUP_SIZE = 500
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _result_path(result_id):
+    # Result IDs are hex UUIDs; reject anything else before touching the filesystem
+    if not result_id or not all(c in '0123456789abcdef' for c in result_id):
+        return None
+    return os.path.join(RESULTS_DIR, f"{result_id}.ndjson")
+
+
+def save_results(results, owner=None):
+    """Persist a list of results and return its result ID"""
+    result_id = uuid.uuid4().hex
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = _result_path(result_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'_meta': {'owner': owner, 'created': time.time()}}) + '\n')
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+    prune_directory(RESULTS_DIR, RESULTS_RETENTION_DAYS, RESULTS_MAX_FILES)
+    return result_id
+
+
+def load_metadata(result_id):
+    """Return the metadata of a stored result set, or None if it does not exist"""
+    path = _result_path(result_id)
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.loads(f.readline()).get('_meta', {})
+
+
+def iter_results(result_id):
+    """Yield the stored results one at a time"""
+    path = _result_path(result_id)
+    with open(path, 'r', encoding='utf-8') as f:
+        f.readline()  # metadata
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def export_rows(results):
+    """Successful results reduced to the exported columns"""
+    for result in results:
+        if result.get('status') == 'success':
+            yield {field: result.get(field, '') for field in EXPORT_FIELDS}
+
+
+def stream_csv(rows):
+    """Yield CSV text one row at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    """Yield one JSON document per line"""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def stream_parquet(rows):
+    """Yield a Parquet file written in row groups
+
+    Parquet's footer can only be written once every row group is known, so
+    row groups are spooled to a temporary file (kept in memory while small)
+    and streamed out in fixed-size chunks once the writer is closed.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('url', pa.string()),
+        ('course_code', pa.string()),
+        ('professor_name', pa.string()),
+        ('number_of_reviews', pa.int64()),
+        ('average_quality', pa.float64()),
+        ('average_difficulty', pa.float64()),
+        ('analysis', pa.string()),
+    ])
+
+    def flush(writer, batch):
+        columns = {name: [None if row.get(name) in ('', None) else row.get(name) for row in batch] for name in schema.names}
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        with pq.ParquetWriter(spool, schema) as writer:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= PARQUET_ROW_GROUP_SIZE:
+                    flush(writer, batch)
+                    batch = []
+            if batch:
+                flush(writer, batch)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def stream_export(results, export_format):
+    """Return a generator producing the export body in the requested format"""
+    rows = export_rows(results)
+    if export_format == 'csv':
+        return stream_csv(rows)
+    if export_format == 'ndjson':
+        return stream_ndjson(rows)
+    if export_format == 'parquet':
+        return stream_parquet(rows)
+    raise ValueError(f"Unsupported export format: {export_format}")
+
+
+def parquet_available():
+    """Whether pyarrow is installed for Parquet exports"""
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        logging.warning("pyarrow is not installed; Parquet export is unavailable")
+        return False
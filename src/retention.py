@@ -0,0 +1,54 @@
+"""
+Age- and count-based cleanup of generated files
+
+Traces, profiles, stored results and batch input files are written to their
+own directories and are only useful for a while. Writers call
+prune_directory() after each write; the scan runs at most once per
+PRUNE_INTERVAL_SECONDS per directory and process, so the cost stays off the
+request path.
+"""
+import os
+import time
+import logging
+import threading
+
+PRUNE_INTERVAL_SECONDS = float(os.getenv('PRUNE_INTERVAL_SECONDS', '300'))
+
+_lock = threading.Lock()
+_last_pruned = {}
+
+
+def prune_directory(path, max_age_days=None, max_files=None, interval=PRUNE_INTERVAL_SECONDS):
+    """Delete files older than max_age_days, then the oldest beyond max_files; returns how many were removed"""
+    now = time.time()
+    with _lock:
+        if now - _last_pruned.get(path, 0) < interval:
+            return 0
+        _last_pruned[path] = now
+
+    try:
+        entries = [(e.stat().st_mtime, e.path) for e in os.scandir(path) if e.is_file()]
+    except OSError:
+        return 0
+    entries.sort(reverse=True)  # newest first
+
+    doomed = []
+    if max_age_days:
+        cutoff = now - max_age_days * 86400
+        doomed = [p for mtime, p in entries if mtime < cutoff]
+        entries = [(mtime, p) for mtime, p in entries if mtime >= cutoff]
+    if max_files and len(entries) > max_files:
+        doomed.extend(p for _, p in entries[max_files:])
+
+    removed = 0
+    for doomed_path in doomed:
+        try:
+            os.remove(doomed_path)
+            removed += 1
+        except FileNotFoundError:
+            pass  # another worker got there first
+        except OSError as e:
+            logging.warning(f"Could not remove {doomed_path}: {e}")
+    if removed:
+        logging.info(f"Pruned {removed} old files from {path}")
+    return removed
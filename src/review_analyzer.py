@@ -5,28 +5,108 @@ from openai import OpenAI
 import os
 from dotenv import load_dotenv
 import logging
-import random
+import threading
 import requests
-import re
-import base64
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from src.metrics import (
+    GRAPHQL_REVIEWS,
+    OPENAI_REQUESTS,
+    OPENAI_SECONDS,
+    OPENAI_RETRIES,
+    record_openai_usage,
+)
+from src.tracing import span
+from src.batch_analyzer import BatchAnalyzer
+from src.review_selector import select_reviews, reduce_reviews, parse_review_date, estimate_tokens
+from src.course_codes import matches_course, normalize_course_code
+from src.rmp_client import post_graphql, legacy_teacher_id, encode_node_id, professor_url
+from src.course_index import get_course_index
+from src.review_archive import archive_reviews
+from src.deadline import DeadlineExceeded
+from src.scheduler import upstream_slot, set_default_priority, BATCH
+from src.adaptive import RMP_CONTROLLER
+from src.sharding import parse_shard, shard_of, shard_basename, merge_shards
+from src.cassette import openai_http_client
+from src.usage import count_call, count_tokens
+from src.analysis_store import review_fingerprint, load_analysis, save_analysis
+from src.quick_insights import quick_insights, quick_columns
+from src.model_router import choose_route, record_llm_call, routing_signature
 
 # Get the project root directory (two levels up from this file)
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 INPUT_DIR = os.path.join(PROJECT_ROOT, 'data', 'input')
 OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'data', 'output')
 
+# Model settings of the batch path and the startup check; interactive calls are
+# routed per professor by src.model_router
+ANALYSIS_MODEL = "gpt-3.5-turbo"
+ANALYSIS_MAX_TOKENS = 300
+ANALYSIS_SYSTEM_PROMPT = "You are an educational analyst summarizing professor reviews."
+# Bump whenever the analysis prompt changes so stored analyses and ETags are invalidated
+PROMPT_VERSION = "2"
+
+# Ratings per GraphQL page when fetching reviews
+REVIEW_PAGE_SIZE = 20
+
+# Stored summaries are updated from only the new reviews, with a full rebuild
+# after this many updates or days, or when most reviews are new
+DELTA_REBUILD_EVERY = int(os.getenv('DELTA_REBUILD_EVERY', '5'))
+DELTA_REBUILD_DAYS = float(os.getenv('DELTA_REBUILD_DAYS', '90'))
+DELTA_MAX_NEW_FRACTION = float(os.getenv('DELTA_MAX_NEW_FRACTION', '0.5'))
+
+# Recently fetched review sets are kept briefly so a quick-insights request and
+# the LLM request that follows it (see /api/analyze) fetch from RMP only once
+REVIEW_MEMO_SECONDS = float(os.getenv('REVIEW_MEMO_SECONDS', '120'))
+REVIEW_MEMO_SIZE = 64
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def _format_rating(value):
+    return f"{value:.1f}" if value is not None else "n/a"
+
+def review_window_start(since_years):
+    """Earliest review date to keep for a window of the last since_years years"""
+    if not since_years:
+        return None
+    return datetime.now(timezone.utc) - timedelta(days=365.25 * float(since_years))
+
+def professor_key(url, course_code=None):
+    """Identity of one unit of fetch + analysis work in a batch run
+
+    Rows that share a teacher (and, for course-scoped runs, a course) produce
+    identical results, so batch pipelines do that work once per key.
+    """
+    key = legacy_teacher_id(url) or url
+    if course_code:
+        key = f"{key}-{normalize_course_code(course_code)}"
+    return key
+
+def analysis_fingerprint(head):
+    """Fingerprint (see src.analysis_store) of a fetch_review_head result under the current prompt and routing table"""
+    return review_fingerprint(head['num_ratings'], head['latest_review_id'], PROMPT_VERSION, f"routes-{routing_signature()}")
+
 class ReviewScraper:
-    def __init__(self):
+    # Shared by every instance, so a fetch by the LLM-free scraper serves the full one too
+    _recent_reviews = OrderedDict()
+    _recent_reviews_lock = threading.Lock()
+
+    def __init__(self, use_llm=True):
+        """With use_llm=False no OpenAI client is created (or required); only
+        fetching and quick_insights are available and analyze_reviews reports
+        the analysis as unavailable."""
         load_dotenv()
+        self.openai_client = None
+        if not use_llm:
+            return
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OpenAI API key not found in environment variables")
         try:
             # Initialize OpenAI client
-            self.openai_client = OpenAI(api_key=api_key)
+            self.openai_client = OpenAI(api_key=api_key, http_client=openai_http_client())
 
             # Test API access
             test_resp = self.openai_client.chat.completions.create(
@@ -52,48 +132,115 @@ class ReviewScraper:
 
     def extract_teacher_id_from_url(self, url):
         """Extract the teacher ID from the RateMyProfessors URL"""
-        # URL format: https://www.ratemyprofessors.com/ShowRatings.jsp?tid=1234567
-        # or newer format: https://www.ratemyprofessors.com/professor/1234567
         try:
-            match = re.search(r'(?:tid=|professor/)(\d+)', url)
-            if match:
-                teacher_id = match.group(1)
+            teacher_id = legacy_teacher_id(url)
+            if teacher_id:
                 # Encode to base64 for the GraphQL ID
-                encoded = base64.b64encode(f"Teacher-{teacher_id}".encode()).decode()
+                encoded = encode_node_id("Teacher", teacher_id)
                 logging.debug(f"Extracted teacher ID: {teacher_id}, encoded: {encoded}")
                 return encoded
         except Exception as e:
             logging.warning(f"Could not extract teacher ID from URL {url}: {e}")
         return None
 
-    def fetch_reviews_via_graphql(self, teacher_id_encoded, course_filter=None, max_reviews=None):
-        """Fetch reviews using the RateMyProfessors GraphQL API with cursor-based pagination"""
+    def post_graphql(self, operation_name, query, variables, deadline=None):
+        """POST one GraphQL operation to RateMyProfessors and return the decoded JSON
+
+        With a deadline the request timeout is shortened so it cannot outlive it.
+        """
+        if deadline is None:
+            return post_graphql(operation_name, query, variables)
+        try:
+            return post_graphql(operation_name, query, variables, deadline=deadline)
+        except requests.exceptions.Timeout:
+            deadline.check(operation_name)
+            raise
+
+    def get_course_filters(self, teacher_id_encoded, course_code, deadline=None):
+        """Return the teacher's RMP class names that match a course code
+
+        RMP's courseFilter only matches class names exactly as students entered
+        them, so the teacher's own list of class names is looked up and every
+        spelling of the course (e.g. "CS1114" and "CSUY1114") is returned.
+        """
+        query = """
+        query TeacherCourseCodesQuery($id: ID!) {
+          node(id: $id) {
+            ... on Teacher {
+              courseCodes {
+                courseName
+                courseCount
+              }
+            }
+          }
+        }
+        """
+        try:
+            with span('graphql.course_codes', course_code=course_code):
+                data = self.post_graphql("TeacherCourseCodesQuery", query, {"id": teacher_id_encoded}, deadline=deadline)
+            course_codes = ((data.get('data') or {}).get('node') or {}).get('courseCodes') or []
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logging.error(f"Error looking up course names for {teacher_id_encoded}: {e}")
+            return []
+
+        filters = [c['courseName'] for c in course_codes if c.get('courseName') and matches_course(c['courseName'], course_code)]
+        logging.info(f"Course {course_code} matches RMP class names {filters}")
+        return filters
+
+    def fetch_review_head(self, teacher_id_encoded, deadline=None):
+        """Cheap check of a teacher's review set: rating count and newest rating ID
+
+        Returns {'professor_name', 'num_ratings', 'latest_review_id'}, or None
+        if RMP has no such teacher.
+        """
+        query = """
+        query TeacherReviewHeadQuery($id: ID!) {
+          node(id: $id) {
+            ... on Teacher {
+              firstName
+              lastName
+              numRatings
+              ratings(first: 1) {
+                edges {
+                  node {
+                    id
+                  }
+                }
+              }
+            }
+          }
+        }
+        """
+        with span('graphql.review_head'):
+            data = self.post_graphql("TeacherReviewHeadQuery", query, {"id": teacher_id_encoded}, deadline=deadline)
+        if "errors" in data:
+            raise RuntimeError(f"GraphQL error: {data['errors']}")
+        node = (data.get('data') or {}).get('node')
+        if not node or 'numRatings' not in node:
+            return None
+        edges = (node.get('ratings') or {}).get('edges') or []
+        return {
+            'professor_name': f"{(node.get('firstName') or '').strip()} {(node.get('lastName') or '').strip()}".strip(),
+            'num_ratings': node.get('numRatings'),
+            'latest_review_id': edges[0]['node'].get('id') if edges else None
+        }
+
+    def fetch_reviews_via_graphql(self, teacher_id_encoded, course_filter=None, max_reviews=None, since=None, deadline=None):
+        """Fetch reviews using the RateMyProfessors GraphQL API with cursor-based pagination
+
+        RMP returns ratings newest first, so pagination stops as soon as
+        max_reviews have been collected or a review older than since (a
+        timezone-aware datetime) is reached. With a deadline, DeadlineExceeded
+        is raised rather than starting a page that cannot finish in time.
+        """
         reviews = []
+        reached_window_start = False
+        complete = False
         cursor = None
         page_count = 0
         professor_name = None
-        graphql_url = "https://www.ratemyprofessors.com/graphql"
-
-        # Headers that mimic a real browser to avoid 403 Forbidden
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36",
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate, br, zstd",
-            "Accept-Language": "en-US,en;q=0.6",
-            "Cache-Control": "no-cache",
-            "Content-Type": "application/json",
-            "Origin": "https://www.ratemyprofessors.com",
-            "Pragma": "no-cache",
-            "Priority": "u=1, i",
-            "Referer": "https://www.ratemyprofessors.com/",
-            "Sec-CH-UA": '"Chromium";v="142", "Brave";v="142", "Not_A Brand";v="99"',
-            "Sec-CH-UA-Mobile": "?0",
-            "Sec-CH-UA-Platform": '"Windows"',
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-origin",
-            "Sec-GPC": "1"
-        }
 
         graphql_query = """
         query RatingsListQuery(
@@ -142,23 +289,20 @@ class ReviewScraper:
             page_count += 1
             logging.info(f"Fetching page {page_count} of reviews (cursor: {cursor})")
 
+            page_size = REVIEW_PAGE_SIZE
+            if max_reviews:
+                page_size = min(page_size, max_reviews - len(reviews))
+
             variables = {
-                "count": 20,  # Fetch more per request for efficiency
+                "count": page_size,
                 "id": teacher_id_encoded,
                 "courseFilter": course_filter,
                 "cursor": cursor
             }
 
-            payload = {
-                "operationName": "RatingsListQuery",
-                "query": graphql_query,
-                "variables": variables
-            }
-
             try:
-                response = requests.post(graphql_url, json=payload, headers=headers, timeout=15)
-                response.raise_for_status()
-                data = response.json()
+                with span('graphql.page', page=page_count):
+                    data = self.post_graphql("RatingsListQuery", graphql_query, variables, deadline=deadline)
 
                 # Check for GraphQL errors
                 if "errors" in data:
@@ -180,13 +324,22 @@ class ReviewScraper:
                     ratings_connection = node.get('ratings', {})
                     edges = ratings_connection.get('edges', [])
 
+                    GRAPHQL_REVIEWS.inc(len(edges))
                     for edge in edges:
                         node = edge['node']
+                        if since is not None:
+                            review_date = parse_review_date(node.get('date'))
+                            if review_date is not None and review_date < since:
+                                reached_window_start = True
+                                break
                         reviews.append({
+                            'id': node.get('id'),
                             'text': node.get('comment', ''),
                             'timestamp': node.get('date', 'Unknown date'),
                             'quality_rating': node.get('clarityRating'),
-                            'difficulty_rating': node.get('difficultyRating')
+                            'difficulty_rating': node.get('difficultyRating'),
+                            'helpful_rating': node.get('helpfulRating'),
+                            'class_name': node.get('class')
                         })
 
                     page_info = ratings_connection.get('pageInfo', {})
@@ -195,23 +348,33 @@ class ReviewScraper:
 
                     logging.info(f"Page {page_count}: fetched {len(edges)} reviews, total so far: {len(reviews)}")
 
-                    if not has_next_page or not end_cursor:
-                        logging.info(f"No more pages. Total reviews fetched: {len(reviews)}")
-                        break
-
                     if max_reviews and len(reviews) >= max_reviews:
                         logging.info(f"Reached max_reviews limit ({max_reviews}). Stopping pagination.")
                         reviews = reviews[:max_reviews]
                         break
 
+                    if reached_window_start:
+                        logging.info(f"Reached reviews older than {since.date()}. Stopping pagination.")
+                        break
+
+                    if not has_next_page or not end_cursor:
+                        logging.info(f"No more pages. Total reviews fetched: {len(reviews)}")
+                        complete = True
+                        break
+
+                    # Pacing between pages is left to RMP_CONTROLLER in post_graphql
                     cursor = end_cursor
-                    time.sleep(0.5)  # Small delay between requests
+                    if deadline is not None:
+                        deadline.check('the next page')
 
                 except KeyError as e:
                     logging.error(f"Unexpected response structure: {e}")
                     logging.debug(f"Response: {data}")
                     break
 
+            except DeadlineExceeded:
+                logging.warning(f"Deadline reached after {len(reviews)} reviews, abandoning fetch")
+                raise
             except Exception as e:
                 logging.error(f"Error fetching reviews via GraphQL: {e}")
                 if page_count == 1:
@@ -225,11 +388,27 @@ class ReviewScraper:
         return {
             'reviews': reviews,
             'total_reviews': len(reviews),
-            'professor_name': professor_name
+            'professor_name': professor_name,
+            'complete': complete
         }
 
-    def scrape_reviews(self, url):
-        """Scrape all reviews from a professor's RMP page using GraphQL API"""
+    def scrape_reviews(self, url, course_code=None, max_reviews=None, since=None, deadline=None, use_memo=True):
+        """Scrape all reviews from a professor's RMP page using GraphQL API
+
+        With a course_code only the reviews for that course are fetched.
+        max_reviews and since bound the fetch to the most recent reviews, and
+        a deadline (src.deadline.Deadline) bounds its wall-clock time. A
+        complete fetch repeated within REVIEW_MEMO_SECONDS is answered from
+        memory (marked 'memoized') unless use_memo is False.
+        """
+        memo_key = (legacy_teacher_id(url) or url, normalize_course_code(course_code) if course_code else None, max_reviews, since)
+        if use_memo and REVIEW_MEMO_SECONDS > 0:
+            with self._recent_reviews_lock:
+                recent = self._recent_reviews.get(memo_key)
+            if recent is not None and time.monotonic() - recent[0] < REVIEW_MEMO_SECONDS:
+                logging.info(f"Reusing reviews fetched {time.monotonic() - recent[0]:.0f}s ago for: {url}")
+                return {**recent[1], 'memoized': True}
+
         logging.info(f"Scraping reviews from: {url}")
 
         # Extract teacher ID and convert to GraphQL ID format
@@ -238,21 +417,85 @@ class ReviewScraper:
             logging.error(f"Could not extract teacher ID from URL: {url}")
             return {'reviews': [], 'total_reviews': 0, 'professor_name': None}
 
-        # Fetch reviews using GraphQL with pagination
-        return self.fetch_reviews_via_graphql(teacher_id_encoded)
-            
-    def analyze_reviews(self, reviews):
-        """Use OpenAI to analyze and summarize the reviews"""
-        if not reviews:
-            return "No reviews available for analysis."
+        with span('scrape_reviews', url=url, course_code=course_code):
+            if not course_code:
+                # Fetch reviews using GraphQL with pagination
+                review_data = self.fetch_reviews_via_graphql(teacher_id_encoded, max_reviews=max_reviews, since=since, deadline=deadline)
+            else:
+                review_data = self._scrape_course_reviews(url, teacher_id_encoded, course_code, max_reviews, since, deadline)
+
+        # Only complete, unbounded histories give correct per-course counts
+        if review_data.get('complete') and review_data['reviews'] and not max_reviews and not since:
+            try:
+                get_course_index().record(legacy_teacher_id(url), review_data['professor_name'], review_data['reviews'], course_code=course_code)
+            except Exception as e:
+                logging.warning(f"Could not update course index for {url}: {e}")
+            if not course_code:
+                try:
+                    archive_reviews(legacy_teacher_id(url), review_data['professor_name'], review_data['reviews'])
+                except Exception as e:
+                    logging.warning(f"Could not archive reviews for {url}: {e}")
+        if review_data.get('complete') and review_data['reviews'] and REVIEW_MEMO_SECONDS > 0:
+            with self._recent_reviews_lock:
+                self._recent_reviews[memo_key] = (time.monotonic(), review_data)
+                self._recent_reviews.move_to_end(memo_key)
+                while len(self._recent_reviews) > REVIEW_MEMO_SIZE:
+                    self._recent_reviews.popitem(last=False)
+        return review_data
+
+    def _scrape_course_reviews(self, url, teacher_id_encoded, course_code, max_reviews, since, deadline=None):
+        """Fetch one course's reviews, merging every RMP spelling of the course"""
+        course_filters = self.get_course_filters(teacher_id_encoded, course_code, deadline=deadline)
+        if not course_filters:
+            logging.warning(f"No reviews for {course_code} on {url}")
+            return {'reviews': [], 'total_reviews': 0, 'professor_name': None, 'course_code': course_code}
+
+        # A course can appear under several spellings; fetch each and merge newest first
+        reviews = []
+        professor_name = None
+        complete = True
+        for course_filter in course_filters:
+            review_data = self.fetch_reviews_via_graphql(teacher_id_encoded, course_filter=course_filter, max_reviews=max_reviews, since=since, deadline=deadline)
+            reviews.extend(review_data['reviews'])
+            professor_name = professor_name or review_data['professor_name']
+            complete = complete and review_data['complete']
+        reviews.sort(key=lambda r: str(r.get('timestamp') or ''), reverse=True)
+        if max_reviews:
+            reviews = reviews[:max_reviews]
+        return {
+            'reviews': reviews,
+            'total_reviews': len(reviews),
+            'professor_name': professor_name,
+            'course_code': course_code,
+            'complete': complete
+        }
             
+    def build_analysis_messages(self, reviews):
+        """Build the chat messages that ask the LLM to summarize the reviews
+
+        Returns None when no review has a usable comment.
+        """
+        # Drop empty/duplicate reviews and trim the rest to the prompt token budget
+        selected, usable = reduce_reviews(reviews)
+        if not selected:
+            return None
+        
         # Combine all review texts with their quality and difficulty ratings
         all_reviews = "\n\n".join([
             f"Quality Rating: {review['quality_rating']}/5\n"
             f"Difficulty Rating: {review['difficulty_rating']}/5\n"
             f"Review: {review['text']}"
-            for review in reviews
+            for review in selected
         ])
+        if len(selected) < usable:
+            avg_quality, avg_difficulty = self.compute_averages(reviews)
+            logging.info(f"Prompt reduced to {len(selected)} of {usable} usable reviews ({len(reviews)} in total)")
+            all_reviews = (
+                f"(Representative sample of {len(selected)} out of {usable} reviews. "
+                f"Average quality across all reviews: {_format_rating(avg_quality)}/5, "
+                f"average difficulty: {_format_rating(avg_difficulty)}/5.)\n\n"
+                + all_reviews
+            )
         
         # Create a prompt for the LLM
         prompt = f"""Please analyze the following professor reviews and provide a 150-word summary 
@@ -264,20 +507,124 @@ class ReviewScraper:
         {all_reviews}
         """
         
+        return [
+            {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def analyze_reviews(self, reviews, deadline=None):
+        """Use OpenAI to analyze and summarize the reviews
+
+        With a deadline the OpenAI timeout and retry waits are capped by it and
+        DeadlineExceeded is raised once it has passed.
+        """
+        return self.analyze_reviews_routed(reviews, deadline=deadline)[0]
+
+    def analyze_reviews_routed(self, reviews, deadline=None):
+        """analyze_reviews, returning (analysis, route)
+
+        route is the model route that produced the text; its model is None
+        when the LLM was skipped for the quick summary. It is None itself when
+        no review has a usable comment.
+        """
+        messages = self.build_analysis_messages(reviews) if reviews else None
+        if messages is None:
+            return "No reviews available for analysis.", None
+            
+        # The routing table picks the model and output budget, or skips the LLM for tiny review sets
+        route = choose_route(len(reviews), sum(estimate_tokens(m['content']) for m in messages))
+        if route['model'] is None:
+            logging.info(f"Route {route['name']}: summarizing {len(reviews)} reviews without the LLM")
+            return quick_insights(reviews)['summary'], route
+        return self._complete(messages, route, deadline=deadline), route
+
+    def build_update_messages(self, previous_summary, new_reviews, total_reviews):
+        """Build the chat messages that ask the LLM to revise a summary with newly posted reviews
+
+        Returns None when none of the new reviews has a usable comment.
+        """
+        selected = select_reviews(new_reviews)
+        if not selected:
+            return None
+        new_text = "\n\n".join([
+            f"Quality Rating: {review['quality_rating']}/5\n"
+            f"Difficulty Rating: {review['difficulty_rating']}/5\n"
+            f"Review: {review['text']}"
+            for review in selected
+        ])
+        prompt = f"""Below is a 150-word summary of a professor's reviews, followed by {len(new_reviews)} 
+        reviews posted since it was written ({total_reviews} reviews in total now). Update the summary so it 
+        also reflects the new reviews, weighing them by their share of all reviews. Keep it about 150 words, 
+        covering the main themes, strengths, and areas for improvement, and stay objective. Reply with the 
+        updated summary only.
+        
+        Current summary:
+        {previous_summary}
+        
+        New reviews:
+        {new_text}
+        """
+        return [
+            {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def update_analysis(self, previous_summary, new_reviews, all_reviews, deadline=None):
+        """Revise an existing summary from only the reviews it hasn't seen
+
+        Costs tokens for the previous summary and new_reviews rather than the
+        whole history. all_reviews is the full current review set; it picks
+        the route, and a full analysis is done instead when that route skips
+        the LLM.
+        """
+        return self.update_analysis_routed(previous_summary, new_reviews, all_reviews, deadline=deadline)[0]
+
+    def update_analysis_routed(self, previous_summary, new_reviews, all_reviews, deadline=None):
+        """update_analysis, returning (analysis, route) like analyze_reviews_routed
+
+        route is None when previous_summary is returned unchanged.
+        """
+        messages = self.build_update_messages(previous_summary, new_reviews, len(all_reviews))
+        if messages is None:
+            # Only rating-only or duplicate reviews arrived; the text summary still holds
+            return previous_summary, None
+        route = choose_route(len(all_reviews), sum(estimate_tokens(m['content']) for m in messages))
+        if route['model'] is None:
+            return self.analyze_reviews_routed(all_reviews, deadline=deadline)
+        return self._complete(messages, route, deadline=deadline, label=f"{route['name']}:delta"), route
+
+    def _complete(self, messages, route, deadline=None, label=None):
+        """Run one chat completion on a route's model, with rate-limit retries; returns the text or an error string"""
+        if self.openai_client is None:
+            return "Analysis unavailable: no LLM configured."
+        model = route['model']
+        label = label or route['name']
         max_retries = 3
         retry_delay = 5  # seconds
         
         for attempt in range(max_retries):
             try:
                 # Use the chat completions API
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are an educational analyst summarizing professor reviews."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=300
-                )
+                request_options = {}
+                count_call('openai')
+                with upstream_slot('openai', deadline), span('openai.chat', model=model, route=label, attempt=attempt + 1), OPENAI_SECONDS.labels(model=model).time():
+                    if deadline is not None:
+                        request_options['timeout'] = deadline.timeout(60)
+                    started = time.monotonic()
+                    try:
+                        response = self.openai_client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=route['max_tokens'],
+                            **request_options
+                        )
+                    except Exception:
+                        record_llm_call(label, model, time.monotonic() - started, outcome='error')
+                        raise
+                record_llm_call(label, model, time.monotonic() - started, getattr(response, 'usage', None))
+                OPENAI_REQUESTS.labels(model=model, outcome='success').inc()
+                record_openai_usage(model, getattr(response, 'usage', None))
+                count_tokens(getattr(response, 'usage', None))
 
                 # Extract the text from the response
                 if response.choices and len(response.choices) > 0:
@@ -288,83 +635,281 @@ class ReviewScraper:
                 # If we reach here, we couldn't extract text
                 logging.error("Unable to parse text from OpenAI response object")
                 return "Error generating analysis."
+            except DeadlineExceeded:
+                raise
             except Exception as e:
+                if deadline is not None and deadline.expired:
+                    OPENAI_REQUESTS.labels(model=model, outcome='deadline').inc()
+                    raise DeadlineExceeded(f"Deadline reached during OpenAI analysis: {e}")
                 if "insufficient_quota" in str(e):
+                    OPENAI_REQUESTS.labels(model=model, outcome='quota').inc()
                     logging.error("OpenAI API quota exceeded. Please check your billing details.")
                     return "Analysis unavailable due to API quota limits."
                 elif "rate_limit" in str(e) or "429" in str(e):
+                    OPENAI_REQUESTS.labels(model=model, outcome='rate_limited').inc()
                     if attempt < max_retries - 1:
+                        OPENAI_RETRIES.labels(model=model).inc()
                         wait_time = retry_delay * (attempt + 1)  # Exponential backoff
                         logging.warning(f"Rate limit hit. Waiting {wait_time} seconds before retry {attempt + 1}/{max_retries}")
-                        time.sleep(wait_time)
+                        with span('sleep', reason='rate_limit'):
+                            if deadline is not None:
+                                deadline.sleep(wait_time, 'a rate limit retry')
+                            else:
+                                time.sleep(wait_time)
                         continue
                     else:
                         logging.error("Max retries reached for rate limit. Skipping analysis.")
                         return "Analysis unavailable due to rate limits."
                 else:
+                    OPENAI_REQUESTS.labels(model=model, outcome='error').inc()
                     logging.error(f"Error analyzing reviews: {e}")
                     return "Error generating analysis."
         
         return "Error generating analysis after multiple retries."
             
-    def process_all_professors(self):
-        """Process all professors from the CSV file"""
+    def analyze_professor(self, legacy_id, deadline=None, head=None):
+        """Analysis of a professor's full review history, reusing the stored one when still current
+
+        Returns {'fingerprint', 'result', 'cached'} or None if RMP has no such
+        teacher. The fingerprint (see src.analysis_store) is checked with one
+        small GraphQL call; only a changed review set is fetched and analyzed,
+        usually by updating the stored summary with just the new reviews
+        (see _delta_base). Failed analyses, and analyses of a failed or
+        partial fetch, are returned with fingerprint None and not stored. Pass
+        head when the caller already ran fetch_review_head.
+        """
+        if head is None:
+            head = self.fetch_review_head(encode_node_id("Teacher", legacy_id), deadline=deadline)
+        if head is None:
+            return None
+        fingerprint = analysis_fingerprint(head)
+        stored = load_analysis(legacy_id)
+        if stored and stored.get('fingerprint') == fingerprint:
+            return {'fingerprint': fingerprint, 'result': stored['result'], 'cached': True}
+
+        url = professor_url(legacy_id)
+        review_data = self.scrape_reviews(url, deadline=deadline)
+        if review_data.get('memoized') and review_data['reviews'][0].get('id') != head['latest_review_id']:
+            # A review arrived since the remembered fetch
+            review_data = self.scrape_reviews(url, deadline=deadline, use_memo=False)
+        reviews = review_data['reviews']
+        # A page error ends the fetch early; what it got must not be stored under the head's fingerprint
+        complete = bool(review_data.get('complete'))
+        extra = {'prompt_version': PROMPT_VERSION, 'routing_signature': routing_signature()}
+        if not reviews:
+            message = 'No reviews found for this professor' if complete else 'Could not fetch reviews for this professor'
+            return {'fingerprint': None, 'result': {'url': url, 'status': 'error', 'message': message}, 'cached': False}
+
+        avg_quality, avg_difficulty = self.compute_averages(reviews)
+        insights = quick_insights(reviews)
+        # Only a complete fetch tells which reviews are new; a partial one would drop the rest from the summary
+        delta = self._delta_base(stored, reviews) if complete else None
+        if delta is not None:
+            previous_summary, new_reviews = delta
+            logging.info(f"Updating summary for teacher {legacy_id} with {len(new_reviews)} new of {len(reviews)} reviews")
+            with span('update_analysis', reviews=len(new_reviews)):
+                analysis, route = self.update_analysis_routed(previous_summary, new_reviews, reviews, deadline=deadline)
+            # Only LLM summaries are updated, so an unchanged one stays an LLM summary
+            analysis_mode = 'quick' if route is not None and route['model'] is None else 'llm'
+            extra.update(rebuilt_at=stored['rebuilt_at'], delta_updates=stored['delta_updates'] + 1)
+        else:
+            with span('analyze_reviews', reviews=len(reviews)):
+                analysis, route = self.analyze_reviews_routed(reviews, deadline=deadline)
+            if route is None:
+                # Nothing but rating-only reviews; the quick summary still has the numbers
+                analysis = insights['summary']
+            analysis_mode = 'quick' if route is None or route['model'] is None else 'llm'
+            extra.update(rebuilt_at=time.time(), delta_updates=0)
+        result = {
+            'url': url,
+            'professor_name': review_data.get('professor_name') or head['professor_name'] or 'Professor',
+            'number_of_reviews': len(reviews),
+            'average_quality': avg_quality,
+            'average_difficulty': avg_difficulty,
+            'analysis': analysis,
+            'analysis_mode': analysis_mode,
+            'quick_insights': insights,
+            'status': 'success'
+        }
+        if analysis.startswith("Analysis unavailable") or analysis.startswith("Error") or not complete:
+            return {'fingerprint': None, 'result': result, 'cached': False}
+        # Only LLM summaries can be updated later
+        if analysis_mode == 'llm' and all(r.get('id') for r in reviews):
+            extra.update(review_ids=[r['id'] for r in reviews], complete_fetch=True)
+        save_analysis(legacy_id, fingerprint, result, extra=extra)
+        return {'fingerprint': fingerprint, 'result': result, 'cached': False}
+
+    def _delta_base(self, stored, reviews):
+        """(previous summary, new reviews) when a stored summary can be updated incrementally, else None
+
+        Falls back to a full rebuild when the stored summary was made under a
+        different prompt or routing table, after DELTA_REBUILD_EVERY updates
+        or DELTA_REBUILD_DAYS, when reviews have disappeared, when the new
+        reviews are more than DELTA_MAX_NEW_FRACTION of the total, or when the
+        stored review IDs may come from a partial fetch (records saved before
+        complete_fetch was recorded).
+        """
+        if not stored or not stored.get('review_ids') or stored.get('result', {}).get('status') != 'success':
+            return None
+        if not stored.get('complete_fetch'):
+            return None
+        if stored.get('prompt_version') != PROMPT_VERSION or stored.get('routing_signature') != routing_signature():
+            return None
+        if stored.get('delta_updates', 0) >= DELTA_REBUILD_EVERY:
+            return None
+        if time.time() - stored.get('rebuilt_at', 0) > DELTA_REBUILD_DAYS * 86400:
+            return None
+        covered = set(stored['review_ids'])
+        current = {r.get('id') for r in reviews}
+        if None in current or not covered <= current:
+            return None
+        new_reviews = [r for r in reviews if r['id'] not in covered]
+        if not new_reviews or len(new_reviews) > DELTA_MAX_NEW_FRACTION * len(reviews):
+            return None
+        return stored['result']['analysis'], new_reviews
+
+    def compute_averages(self, reviews):
+        """Return (average quality, average difficulty), ignoring missing ratings"""
+        quality_ratings = [r['quality_rating'] for r in reviews if r['quality_rating'] is not None]
+        difficulty_ratings = [r['difficulty_rating'] for r in reviews if r['difficulty_rating'] is not None]
+
+        avg_quality = sum(quality_ratings) / len(quality_ratings) if quality_ratings else None
+        avg_difficulty = sum(difficulty_ratings) / len(difficulty_ratings) if difficulty_ratings else None
+        return avg_quality, avg_difficulty
+
+    def analyze_in_batch(self, reviews_by_id, name='analysis'):
+        """Summarize many review sets with a single OpenAI Batch API job
+
+        reviews_by_id maps a caller-chosen ID to a list of reviews; the result
+        maps the same IDs to summary text ("Analysis unavailable" on failure).
+        """
+        jobs = {
+            str(key): self.build_analysis_messages(reviews)
+            for key, reviews in reviews_by_id.items()
+            if reviews
+        }
+        no_comments = {key for key, messages in jobs.items() if messages is None}
+        jobs = {key: messages for key, messages in jobs.items() if messages is not None}
+        batch = BatchAnalyzer(self.openai_client, ANALYSIS_MODEL, ANALYSIS_MAX_TOKENS)
+        summaries = batch.run(jobs, name=name)
+        return {
+            key: "No reviews available for analysis." if str(key) in no_comments else summaries.get(str(key)) or "Analysis unavailable"
+            for key in reviews_by_id
+        }
+
+    def process_all_professors(self, batch=False, course_scoped=False, max_reviews=None, since_years=None, workers=8, shard=None, quick=False):
+        """Process all professors from the CSV file
+
+        With batch=True the reviews for every professor are fetched first and
+        all summaries are produced by one OpenAI Batch API job. With
+        course_scoped=True only the reviews for each row's course are used.
+        max_reviews and since_years bound each professor to recent reviews.
+        Up to workers professors are processed at once. With quick=True the
+        LLM is skipped and each professor gets local quick insights instead.
+
+        Every professor is summarized from scratch; the incremental updates of
+        analyze_professor only apply to the analysis store.
+
+        With shard=(i, N) only the professors in shard i of N are processed and
+        the output goes to professor_analyses.shard-i-of-N.json/.csv; see
+        src.sharding for merging the shards.
+        """
+        since = review_window_start(since_years)
+        basename = shard_basename(*shard) if shard else 'professor_analyses'
         try:
             df = pd.read_csv(os.path.join(OUTPUT_DIR, 'professors.csv'))
-            results = []
-            
-            for _, row in df.iterrows():
+            if shard:
+                index, count = shard
+                in_shard = df['url'].map(lambda url: shard_of(url, count) == index)
+                logging.info(f"Shard {index}/{count}: {int(in_shard.sum())} of {len(df)} rows")
+                df = df[in_shard]
+
+            # Cross-listed courses list the same professor several times; do the work once per teacher
+            keyed_rows = [
+                (professor_key(row['url'], row['course_code'] if course_scoped else None), row)
+                for _, row in df.iterrows()
+            ]
+            unique_rows = {}
+            for key, row in keyed_rows:
+                unique_rows.setdefault(key, row)
+            if len(unique_rows) < len(keyed_rows):
+                logging.info(f"{len(keyed_rows)} rows reference {len(unique_rows)} distinct professors")
+
+            def process(key, row):
                 logging.info(f"Processing reviews for {row['professor_name']}...")
                 try:
-                    review_data = self.scrape_reviews(row['url'])
-                    
-                    if review_data and review_data['reviews']:
-                        try:
-                            # Calculate averages, handling None values
-                            quality_ratings = [r['quality_rating'] for r in review_data['reviews'] if r['quality_rating'] is not None]
-                            difficulty_ratings = [r['difficulty_rating'] for r in review_data['reviews'] if r['difficulty_rating'] is not None]
-                            
-                            avg_quality = sum(quality_ratings) / len(quality_ratings) if quality_ratings else None
-                            avg_difficulty = sum(difficulty_ratings) / len(difficulty_ratings) if difficulty_ratings else None
-                            
-                            # Add delay before analysis to avoid rate limits
-                            time.sleep(2)
-                            analysis = self.analyze_reviews(review_data['reviews'])
-                            
-                            if analysis.startswith("Analysis unavailable") or analysis.startswith("Error"):
-                                logging.warning(f"Analysis failed for {row['professor_name']}")
-                                analysis = "Analysis unavailable"
-                            
-                            results.append({
-                                'professor_name': row['professor_name'],
-                                'course_code': row['course_code'],
-                                'number_of_reviews': len(review_data['reviews']),
-                                'average_quality': avg_quality,
-                                'average_difficulty': avg_difficulty,
-                                'analysis': analysis
-                            })
-                            logging.info(f"Successfully scraped reviews for {row['professor_name']}")
-                        except Exception as e:
-                            logging.error(f"Error processing review data for {row['professor_name']}: {e}")
-                            continue
-                    else:
+                    review_data = self.scrape_reviews(
+                        row['url'],
+                        course_code=row['course_code'] if course_scoped else None,
+                        max_reviews=max_reviews,
+                        since=since
+                    )
+                    if not review_data or not review_data['reviews']:
                         logging.warning(f"No reviews found for {row['professor_name']}")
-                    
-                    # Add random delay between requests
-                    time.sleep(random.uniform(2, 4))
-                    
+                        return None
+
+                    avg_quality, avg_difficulty = self.compute_averages(review_data['reviews'])
+                    if quick:
+                        return {
+                            'number_of_reviews': len(review_data['reviews']),
+                            'average_quality': avg_quality,
+                            'average_difficulty': avg_difficulty,
+                            **quick_columns(review_data['reviews'])
+                        }, review_data['reviews']
+                    if batch:
+                        # Summarized together once every professor has been fetched
+                        analysis = None
+                    else:
+                        analysis = self.analyze_reviews(review_data['reviews'])
+                        if analysis.startswith("Analysis unavailable") or analysis.startswith("Error"):
+                            logging.warning(f"Analysis failed for {row['professor_name']}")
+                            analysis = "Analysis unavailable"
+
+                    logging.info(f"Successfully scraped reviews for {row['professor_name']}")
+                    return {
+                        'number_of_reviews': len(review_data['reviews']),
+                        'average_quality': avg_quality,
+                        'average_difficulty': avg_difficulty,
+                        'analysis': analysis
+                    }, review_data['reviews']
                 except Exception as e:
                     logging.error(f"Failed to process {row['professor_name']}: {e}")
-                    continue
+                    return None
+
+            # Professors are worked on concurrently; RMP_CONTROLLER paces the
+            # actual GraphQL traffic instead of fixed sleeps between professors
+            analyzed = {}
+            pending_reviews = {}
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {key: executor.submit(process, key, row) for key, row in unique_rows.items()}
+                for key, future in futures.items():
+                    outcome = future.result()
+                    if outcome is None:
+                        continue
+                    analyzed[key], reviews = outcome
+                    if batch:
+                        pending_reviews[key] = reviews
+            logging.info(f"RMP pacing at end of fetch: {RMP_CONTROLLER.stats_line()} ({RMP_CONTROLLER.decreases} cuts)")
+            
+            if pending_reviews:
+                for key, analysis in self.analyze_in_batch(pending_reviews, name=basename).items():
+                    analyzed[key]['analysis'] = analysis
+
+            # Fan each professor's result out to every row that references them
+            results = [
+                {'professor_name': row['professor_name'], 'course_code': row['course_code'], 'url': row['url'], **analyzed[key]}
+                for key, row in keyed_rows
+                if key in analyzed
+            ]
                 
             # Save results
-            with open(os.path.join(OUTPUT_DIR, 'professor_analyses.json'), 'w', encoding='utf-8') as f:
+            with open(os.path.join(OUTPUT_DIR, f'{basename}.json'), 'w', encoding='utf-8') as f:
                 json.dump(results, f, ensure_ascii=False, indent=2)
                 
             # Also save as CSV
             analysis_df = pd.DataFrame(results)
-            analysis_df.to_csv(os.path.join(OUTPUT_DIR, 'professor_analyses.csv'), index=False)
-            logging.info("Successfully saved results to professor_analyses.json and professor_analyses.csv")
+            analysis_df.to_csv(os.path.join(OUTPUT_DIR, f'{basename}.csv'), index=False)
+            logging.info(f"Successfully saved results to {basename}.json and {basename}.csv")
             
         except Exception as e:
             logging.error(f"Error processing professors: {e}")
@@ -375,8 +920,44 @@ class ReviewScraper:
         logging.info("Cleanup complete")
 
 if __name__ == "__main__":
-    scraper = ReviewScraper()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyze every professor listed in data/output/professors.csv")
+    parser.add_argument('--batch', action='store_true', help="Summarize through one OpenAI Batch API job instead of per-professor calls")
+    parser.add_argument('--course-scoped', action='store_true', help="Only use each professor's reviews for the course they were found under")
+    parser.add_argument('--max-reviews', type=int, help="Only fetch and summarize each professor's most recent N reviews")
+    parser.add_argument('--since-years', type=float, help="Only fetch and summarize reviews from the last N years")
+    parser.add_argument('--quick', action='store_true', help="Skip the LLM and summarize reviews with local quick insights")
+    parser.add_argument('--workers', type=int, default=8, help="Professors processed concurrently (default 8)")
+    parser.add_argument('--shard', help="Only process shard i of N (e.g. 2/4), writing professor_analyses.shard-i-of-N.*")
+    parser.add_argument('--merge-shards', type=int, metavar='N', help="Merge the outputs of N shards into professor_analyses.* and exit")
+    args = parser.parse_args()
+
+    if args.merge_shards:
+        try:
+            merge_shards(OUTPUT_DIR, args.merge_shards)
+        except FileNotFoundError as e:
+            parser.error(str(e))
+        raise SystemExit(0)
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        parser.error(str(e))
+    if args.quick and args.batch:
+        parser.error("--quick and --batch are mutually exclusive")
+
+    # Leave RMP and OpenAI capacity to the web app while it is serving users
+    set_default_priority(BATCH)
+    scraper = ReviewScraper(use_llm=not args.quick)
     try:
-        scraper.process_all_professors()
+        scraper.process_all_professors(
+            batch=args.batch,
+            course_scoped=args.course_scoped,
+            max_reviews=args.max_reviews,
+            since_years=args.since_years,
+            workers=max(1, args.workers),
+            shard=shard,
+            quick=args.quick
+        )
     finally:
         scraper.close() 
\ No newline at end of file
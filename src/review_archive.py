@@ -0,0 +1,311 @@
+"""
+Columnar archive of every scraped review, for cross-professor analytics
+
+Each complete, unscoped review fetch is written to a per-teacher Parquet file
+under REVIEW_ARCHIVE_DIR/teachers/ with the columns teacher, professor_name,
+review_id, course (normalized, e.g. CSUY1114), date, clarity, difficulty,
+helpful and comment, replacing that teacher's previous file. For queries the
+teacher files are consolidated into one uncompressed Arrow IPC snapshot
+(REVIEW_ARCHIVE_DIR/reviews.arrow) that is memory-mapped, so department-wide
+aggregations read straight from the page cache with no network calls. The
+snapshot is rebuilt by the first query after teacher files change, at most
+every REVIEW_ARCHIVE_REFRESH_SECONDS, or with `python -m src.review_archive rebuild`.
+
+  python -m src.review_archive query --department CS-UY --since 2022-01-01 --group-by teacher --order-by difficulty
+
+pyarrow is optional: without it reviews are simply not archived.
+"""
+import os
+import re
+import time
+import logging
+import threading
+from datetime import date, datetime
+
+from src.course_codes import normalize_course_code, course_code_variants
+from src.review_selector import parse_review_date
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHIVE_DIR = os.getenv('REVIEW_ARCHIVE_DIR') or os.path.join(PROJECT_ROOT, 'data', 'archive')
+TEACHERS_DIR = os.path.join(ARCHIVE_DIR, 'teachers')
+SNAPSHOT_PATH = os.path.join(ARCHIVE_DIR, 'reviews.arrow')
+REFRESH_SECONDS = float(os.getenv('REVIEW_ARCHIVE_REFRESH_SECONDS', '300'))
+
+# Columns grouped on for each group_by value
+GROUP_KEYS = {
+    'teacher': ['teacher', 'professor_name'],
+    'course': ['course'],
+    'year': ['year'],
+}
+ORDER_FIELDS = ('reviews', 'clarity', 'difficulty', 'helpful')
+
+_snapshot_lock = threading.Lock()
+_snapshot = None  # (snapshot mtime_ns, memory-mapped table)
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('teacher', pa.string()),
+        ('professor_name', pa.string()),
+        ('review_id', pa.string()),
+        ('course', pa.string()),
+        ('date', pa.date32()),
+        ('clarity', pa.float64()),
+        ('difficulty', pa.float64()),
+        ('helpful', pa.float64()),
+        ('comment', pa.string()),
+    ])
+
+
+def archive_available():
+    """Whether pyarrow is installed for the review archive"""
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def archive_reviews(legacy_id, professor_name, reviews):
+    """Replace a teacher's archived reviews with a complete, unscoped review set"""
+    if not archive_available() or not str(legacy_id).isdigit():
+        return
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def rating(value):
+        return float(value) if value is not None else None
+
+    def review_date(value):
+        parsed = parse_review_date(value)
+        return parsed.date() if parsed else None
+
+    columns = {
+        'teacher': [str(legacy_id)] * len(reviews),
+        'professor_name': [professor_name] * len(reviews),
+        'review_id': [r.get('id') for r in reviews],
+        'course': [normalize_course_code(r.get('class_name')) or None for r in reviews],
+        'date': [review_date(r.get('timestamp')) for r in reviews],
+        'clarity': [rating(r.get('quality_rating')) for r in reviews],
+        'difficulty': [rating(r.get('difficulty_rating')) for r in reviews],
+        'helpful': [rating(r.get('helpful_rating')) for r in reviews],
+        'comment': [r.get('text') for r in reviews],
+    }
+    path = os.path.join(TEACHERS_DIR, f"{legacy_id}.parquet")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(TEACHERS_DIR, exist_ok=True)
+        pq.write_table(pa.Table.from_pydict(columns, schema=_schema()), tmp_path)
+        # Replacing the file bumps the directory's mtime, which marks the snapshot stale
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Could not archive reviews for teacher {legacy_id}: {e}")
+
+
+def rebuild_snapshot():
+    """Consolidate every teacher file into the memory-mappable snapshot; returns its row count"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    try:
+        teachers_mtime = os.stat(TEACHERS_DIR).st_mtime_ns
+    except FileNotFoundError:
+        teachers_mtime = 0
+    try:
+        paths = sorted(e.path for e in os.scandir(TEACHERS_DIR) if e.name.endswith('.parquet'))
+    except FileNotFoundError:
+        paths = []
+    tables = [pq.read_table(path, memory_map=True, schema=_schema()) for path in paths]
+    table = pa.concat_tables(tables) if tables else _schema().empty_table()
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    tmp_path = f"{SNAPSHOT_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=64 * 1024)
+    # Stamped with the teacher directory's state as scanned, so a file written
+    # during the rebuild still leaves the snapshot stale
+    os.utime(tmp_path, ns=(teachers_mtime, teachers_mtime))
+    os.replace(tmp_path, SNAPSHOT_PATH)
+    logging.info(f"Review archive snapshot rebuilt: {table.num_rows} reviews from {len(paths)} teachers")
+    return table.num_rows
+
+
+def load_archive():
+    """The whole archive as a memory-mapped Arrow table
+
+    A snapshot that misses recent teacher updates is rebuilt once it is
+    REVIEW_ARCHIVE_REFRESH_SECONDS old, so a busy scraper doesn't make every
+    query pay for a rebuild.
+    """
+    import pyarrow as pa
+
+    global _snapshot
+    with _snapshot_lock:
+        try:
+            teachers_mtime = os.stat(TEACHERS_DIR).st_mtime_ns
+        except FileNotFoundError:
+            teachers_mtime = 0
+        try:
+            snapshot_stat = os.stat(SNAPSHOT_PATH)
+            snapshot_mtime = snapshot_stat.st_mtime_ns
+            # ctime is when the snapshot was written (mtime is stamped, see rebuild_snapshot)
+            snapshot_age = time.time() - snapshot_stat.st_ctime
+        except FileNotFoundError:
+            snapshot_mtime = None
+        if snapshot_mtime is None or (snapshot_mtime < teachers_mtime and snapshot_age >= REFRESH_SECONDS):
+            rebuild_snapshot()
+            snapshot_mtime = os.stat(SNAPSHOT_PATH).st_mtime_ns
+        if _snapshot is None or _snapshot[0] != snapshot_mtime:
+            # Zero-copy: column buffers point into the mapped file
+            source = pa.memory_map(SNAPSHOT_PATH, 'r')
+            _snapshot = (snapshot_mtime, pa.ipc.open_file(source).read_all())
+        return _snapshot[1]
+
+
+def _parse_date(value, name):
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{name} must be a date like 2022-01-01, got {value!r}")
+
+
+def _department_pattern(department):
+    """Regex matching normalized course codes of a department: "CS-UY" -> ^(CSUY|CS)[0-9]"""
+    prefixes = {normalize_course_code(department)}
+    if '-' in department:
+        prefixes.add(normalize_course_code(department.split('-')[0]))
+    prefixes.discard('')
+    if not prefixes:
+        raise ValueError(f"Invalid department: {department!r}")
+    alternatives = '|'.join(sorted((re.escape(p) for p in prefixes), key=len, reverse=True))
+    return f"^(?:{alternatives})[0-9]"
+
+
+def query_reviews(course=None, department=None, teacher=None, since=None, until=None,
+                  group_by=None, min_reviews=1, order_by='reviews', descending=True, limit=None):
+    """Filtered, grouped aggregates over the archive
+
+    Filters: course (any RMP spelling of a course code), department (e.g.
+    "CS-UY"), teacher (RMP legacy ID or list of them) and since/until dates
+    (inclusive). group_by is None for one overall row or one of GROUP_KEYS.
+    Each row has reviews plus average clarity, difficulty and helpful; groups
+    with fewer than min_reviews reviews are dropped. Rows are sorted by
+    order_by (one of ORDER_FIELDS) and cut to limit.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if group_by is not None and group_by not in GROUP_KEYS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_KEYS)}")
+    if order_by not in ORDER_FIELDS:
+        raise ValueError(f"order_by must be one of {', '.join(ORDER_FIELDS)}")
+    since = _parse_date(since, 'since')
+    until = _parse_date(until, 'until')
+
+    table = load_archive()
+    mask = None
+
+    def narrow(condition):
+        nonlocal mask
+        mask = condition if mask is None else pc.and_(mask, condition)
+
+    if course:
+        narrow(pc.is_in(table['course'], value_set=pa.array(sorted(course_code_variants(course)), pa.string())))
+    if department:
+        narrow(pc.match_substring_regex(table['course'], _department_pattern(department)))
+    if teacher:
+        teachers = [teacher] if isinstance(teacher, (str, int)) else teacher
+        narrow(pc.is_in(table['teacher'], value_set=pa.array([str(t) for t in teachers], pa.string())))
+    if since:
+        narrow(pc.greater_equal(table['date'], pa.scalar(since, pa.date32())))
+    if until:
+        narrow(pc.less_equal(table['date'], pa.scalar(until, pa.date32())))
+    if mask is not None:
+        table = table.filter(pc.fill_null(mask, False))
+
+    keys = GROUP_KEYS.get(group_by, [])
+    if 'year' in keys:
+        table = table.append_column('year', pc.year(table['date']))
+    if not keys:
+        table = table.append_column('all', pa.array([0] * table.num_rows, pa.int8()))
+    grouped = table.group_by(keys or ['all']).aggregate([
+        ('review_id', 'count', pc.CountOptions(mode='all')),
+        ('clarity', 'mean'),
+        ('difficulty', 'mean'),
+        ('helpful', 'mean'),
+    ])
+    grouped = grouped.rename_columns([
+        {'review_id_count': 'reviews', 'clarity_mean': 'clarity', 'difficulty_mean': 'difficulty', 'helpful_mean': 'helpful'}.get(name, name)
+        for name in grouped.column_names
+    ])
+    if not keys:
+        grouped = grouped.drop_columns(['all'])
+    if min_reviews and min_reviews > 1:
+        grouped = grouped.filter(pc.greater_equal(grouped['reviews'], min_reviews))
+    grouped = grouped.sort_by([(order_by, 'descending' if descending else 'ascending')] + [(k, 'ascending') for k in keys])
+    if limit:
+        grouped = grouped.slice(0, limit)
+
+    rows = grouped.to_pylist()
+    for row in rows:
+        for field in ('clarity', 'difficulty', 'helpful'):
+            if row[field] is not None:
+                row[field] = round(row[field], 3)
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Query the columnar review archive")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild', help="Rebuild the memory-mapped snapshot from the teacher files")
+    query_parser = subparsers.add_parser('query', help="Filtered, grouped review aggregates")
+    query_parser.add_argument('--course', help="Course code, e.g. CS-UY 1114")
+    query_parser.add_argument('--department', help="Department prefix, e.g. CS-UY")
+    query_parser.add_argument('--teacher', action='append', help="RMP teacher ID (repeatable)")
+    query_parser.add_argument('--since', help="Only reviews on or after this date (YYYY-MM-DD)")
+    query_parser.add_argument('--until', help="Only reviews on or before this date (YYYY-MM-DD)")
+    query_parser.add_argument('--group-by', choices=list(GROUP_KEYS), help="Group rows by teacher, course or year")
+    query_parser.add_argument('--min-reviews', type=int, default=1, help="Drop groups with fewer reviews")
+    query_parser.add_argument('--order-by', choices=ORDER_FIELDS, default='reviews', help="Sort field (default reviews)")
+    query_parser.add_argument('--ascending', action='store_true', help="Sort ascending instead of descending")
+    query_parser.add_argument('--limit', type=int, help="Maximum rows to print")
+    query_parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    if not archive_available():
+        parser.error("The review archive requires pyarrow to be installed")
+    if args.command == 'rebuild':
+        rebuild_snapshot()
+        raise SystemExit(0)
+
+    started = time.perf_counter()
+    try:
+        rows = query_reviews(
+            course=args.course,
+            department=args.department,
+            teacher=args.teacher,
+            since=args.since,
+            until=args.until,
+            group_by=args.group_by,
+            min_reviews=args.min_reviews,
+            order_by=args.order_by,
+            descending=not args.ascending,
+            limit=args.limit
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2, default=str))
+    else:
+        import pandas as pd
+        print(pd.DataFrame(rows).to_string(index=False) if rows else "No matching reviews")
+    logging.info(f"{len(rows)} rows in {time.perf_counter() - started:.3f}s")
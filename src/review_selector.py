@@ -0,0 +1,170 @@
+"""
+Prompt reduction for review summaries
+
+Before reviews are sent to the LLM they go through select_reviews(), which
+drops empty and placeholder comments, collapses exact and near-duplicate
+reviews, truncates very long ones and, when the remainder still exceeds the
+token budget, picks a recency-weighted subset that avoids sending the same
+point twice. Similarity uses MinHash signatures over word shingles so a
+professor with hundreds of reviews is reduced in milliseconds.
+"""
+import os
+import re
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '3000'))
+REVIEW_MAX_CHARS = int(os.getenv('REVIEW_MAX_CHARS', '1000'))
+REVIEW_HALF_LIFE_YEARS = float(os.getenv('REVIEW_HALF_LIFE_YEARS', '3'))
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# Compared after normalize_text(), which turns "N/A" into "n a" and drops bare punctuation
+PLACEHOLDER_COMMENTS = {'', 'no comments', 'no comment', 'none', 'n a', 'na'}
+
+# Per-review overhead of the "Quality Rating/Difficulty Rating/Review" lines
+REVIEW_OVERHEAD_TOKENS = 15
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English)"""
+    return len(text) // 4 + 1
+
+
+def normalize_text(text):
+    """Lowercase and strip punctuation so trivially different reviews compare equal"""
+    return ' '.join(_WORD_RE.findall((text or '').lower()))
+
+
+def parse_review_date(value):
+    """Parse RMP's "2023-05-12 18:39:09 +0000 UTC" dates; None if unparseable"""
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def truncate_text(text, max_chars=REVIEW_MAX_CHARS):
+    """Cut overly long reviews at a word boundary"""
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(' ', 1)[0] + ' …'
+
+
+def minhash_signature(normalized):
+    """MinHash signature of a text's word shingles"""
+    words = normalized.split()
+    if len(words) < SHINGLE_SIZE:
+        shingles = [normalized]
+    else:
+        shingles = [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in set(shingles)), dtype=np.uint64)
+    # (a * x + b) mod p for every permutation and shingle, keep the minimum per permutation
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+def _drop_near_duplicates(signatures):
+    """Return indexes to keep, dropping later reviews that near-duplicate an earlier one"""
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    buckets = {}
+    dropped = set()
+    for i, signature in enumerate(signatures):
+        candidates = set()
+        for band in range(LSH_BANDS):
+            key = (band, signature[band * rows:(band + 1) * rows].tobytes())
+            candidates.update(buckets.get(key, ()))
+            buckets.setdefault(key, []).append(i)
+        for j in candidates:
+            if j not in dropped and np.mean(signatures[j] == signature) >= NEAR_DUPLICATE_THRESHOLD:
+                dropped.add(i)
+                break
+    return [i for i in range(len(signatures)) if i not in dropped]
+
+
+def _recency_weights(reviews, now):
+    weights = []
+    for review in reviews:
+        date = parse_review_date(review.get('timestamp'))
+        if date is None:
+            weights.append(0.5)
+            continue
+        age_years = max(0.0, (now - date).days / 365.25)
+        weights.append(0.5 ** (age_years / REVIEW_HALF_LIFE_YEARS))
+    return np.array(weights)
+
+
+def select_reviews(reviews, token_budget=None, now=None):
+    """Reduce reviews to a representative subset that fits the token budget
+
+    Returns new review dicts (texts possibly truncated) in their original
+    order. A budget of 0 keeps every usable review.
+    """
+    return reduce_reviews(reviews, token_budget, now)[0]
+
+
+def reduce_reviews(reviews, token_budget=None, now=None):
+    """select_reviews() that also returns how many usable reviews there were
+
+    Returns (selected, usable): usable counts the reviews left after dropping
+    placeholders and duplicates, so selected is shorter than usable only when
+    the token budget cut real reviews.
+    """
+    token_budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    now = now or datetime.now(timezone.utc)
+
+    # Drop empty/placeholder comments and exact duplicates, truncate long rants
+    cleaned = []
+    normalized = []
+    seen = set()
+    for review in reviews:
+        text = (review.get('text') or '').strip()
+        norm = normalize_text(text)
+        if norm in PLACEHOLDER_COMMENTS or norm in seen:
+            continue
+        seen.add(norm)
+        cleaned.append(dict(review, text=truncate_text(text)))
+        normalized.append(norm)
+
+    if not cleaned:
+        return [], 0
+
+    signatures = np.array([minhash_signature(norm) for norm in normalized])
+    keep = _drop_near_duplicates(signatures)
+    cleaned = [cleaned[i] for i in keep]
+    signatures = signatures[keep]
+
+    costs = np.array([estimate_tokens(r['text']) + REVIEW_OVERHEAD_TOKENS for r in cleaned])
+    if token_budget <= 0 or costs.sum() <= token_budget:
+        return cleaned, len(cleaned)
+
+    # Greedy selection: prefer recent reviews that say something not yet covered
+    weights = _recency_weights(cleaned, now)
+    max_similarity = np.zeros(len(cleaned))
+    available = np.ones(len(cleaned), dtype=bool)
+    chosen = []
+    remaining = token_budget
+    while True:
+        available &= costs <= remaining
+        if not available.any():
+            break
+        scores = np.where(available, weights * (1.0 - max_similarity), -1.0)
+        best = int(scores.argmax())
+        chosen.append(best)
+        available[best] = False
+        remaining -= costs[best]
+        similarity = (signatures == signatures[best]).mean(axis=1)
+        np.maximum(max_similarity, similarity, out=max_similarity)
+
+    return [cleaned[i] for i in sorted(chosen)], len(cleaned)
@@ -0,0 +1,99 @@
+"""
+Low-level access to the RateMyProfessors GraphQL API
+
+Shared by review fetching, teacher search and the roster crawler so every
+request goes out with the same browser headers and is counted the same way.
+"""
+import os
+import re
+import time
+import base64
+import requests
+
+from src.http_client import get_session
+from src.metrics import GRAPHQL_REQUESTS, GRAPHQL_PAGE_SECONDS
+from src.scheduler import upstream_slot
+from src.adaptive import rmp_controller
+from src.cassette import CassetteMiss
+from src.usage import count_call
+
+RMP_GRAPHQL_URL = "https://www.ratemyprofessors.com/graphql"
+
+# Headers that mimic a real browser to avoid 403 Forbidden
+RMP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36",
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate, br, zstd",
+    "Accept-Language": "en-US,en;q=0.6",
+    "Cache-Control": "no-cache",
+    "Content-Type": "application/json",
+    "Origin": "https://www.ratemyprofessors.com",
+    "Pragma": "no-cache",
+    "Priority": "u=1, i",
+    "Referer": "https://www.ratemyprofessors.com/",
+    "Sec-CH-UA": '"Chromium";v="142", "Brave";v="142", "Not_A Brand";v="99"',
+    "Sec-CH-UA-Mobile": "?0",
+    "Sec-CH-UA-Platform": '"Windows"',
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-origin",
+    "Sec-GPC": "1"
+}
+
+# RMP's legacy school ID; 675 is New York University
+RMP_SCHOOL_ID = os.getenv('RMP_SCHOOL_ID', '675')
+
+
+def post_graphql(operation_name, query, variables, timeout=15, deadline=None):
+    """POST one GraphQL operation to RateMyProfessors and return the decoded JSON
+
+    With a deadline, waiting for a call slot is bounded by it and the request
+    timeout is shortened so the call cannot outlive it.
+    """
+    payload = {
+        "operationName": operation_name,
+        "query": query,
+        "variables": variables
+    }
+
+    count_call('rmp')
+    # The scheduler picks who goes next; the adaptive controller paces when
+    with upstream_slot('rmp', deadline), rmp_controller().slot(deadline) as outcome:
+        capped = False
+        if deadline is not None:
+            # Computed after any wait for the slot, so queueing counts against the deadline
+            capped = deadline.remaining() < timeout
+            timeout = deadline.timeout(timeout)
+        started = time.monotonic()
+        try:
+            response = get_session().post(RMP_GRAPHQL_URL, json=payload, headers=RMP_HEADERS, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            GRAPHQL_REQUESTS.labels(outcome='error').inc()
+            # Neither our own deadline nor a missing recording says RMP is struggling
+            if isinstance(e, CassetteMiss) or (capped and isinstance(e, requests.exceptions.Timeout)):
+                outcome.ignore()
+            raise
+        finally:
+            GRAPHQL_PAGE_SECONDS.observe(time.monotonic() - started)
+        outcome.status(response.status_code)
+    GRAPHQL_REQUESTS.labels(outcome=str(response.status_code)).inc()
+    response.raise_for_status()
+    return response.json()
+
+
+def legacy_teacher_id(url):
+    """Numeric RMP teacher ID from a professor URL, or None"""
+    # URL format: https://www.ratemyprofessors.com/ShowRatings.jsp?tid=1234567
+    # or newer format: https://www.ratemyprofessors.com/professor/1234567
+    match = re.search(r'(?:tid=|professor/)(\d+)', url or '')
+    return match.group(1) if match else None
+
+
+def encode_node_id(type_name, legacy_id):
+    """GraphQL node ID for a legacy ID, e.g. ("Teacher", 123) -> base64("Teacher-123")"""
+    return base64.b64encode(f"{type_name}-{legacy_id}".encode()).decode()
+
+
+def professor_url(legacy_id):
+    """Canonical RMP profile URL for a legacy teacher ID"""
+    return f"https://www.ratemyprofessors.com/professor/{legacy_id}"
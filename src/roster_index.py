@@ -0,0 +1,287 @@
+"""
+Prefetched school roster for instant professor autocomplete
+
+A background job crawls every teacher at a school once through paginated RMP
+teacher search and stores the roster as a compact column-oriented JSON file.
+Serving processes load it into sorted token arrays, so a prefix lookup is a
+couple of binary searches and never touches the network. A trigram fallback
+catches typos when no prefix matches.
+
+Build or refresh the index from the command line with:
+  python -m src.roster_index build
+"""
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from collections import defaultdict
+
+from src.paths import CACHE_DIR
+from src.rmp_client import RMP_SCHOOL_ID, post_graphql, encode_node_id, professor_url
+from src.teacher_search import normalize_name
+from src.scheduler import priority, BATCH
+
+ROSTER_REFRESH_HOURS = float(os.getenv('ROSTER_REFRESH_HOURS', '168'))
+ROSTER_PAGE_SIZE = 100
+# How often a serving process checks whether another process rebuilt the file
+RELOAD_CHECK_SECONDS = 60
+
+ROSTER_QUERY = """
+query TeacherRosterQuery($query: TeacherSearchQuery!, $count: Int!, $cursor: String) {
+  search: newSearch {
+    teachers(query: $query, first: $count, after: $cursor) {
+      resultCount
+      edges {
+        node {
+          legacyId
+          firstName
+          lastName
+          department
+          numRatings
+        }
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+    }
+  }
+}
+"""
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def crawl_school_roster(school_id=None):
+    """Fetch every teacher at a school, returning column lists for the index file"""
+    school_id = str(school_id or RMP_SCHOOL_ID)
+    columns = {'legacy_ids': [], 'names': [], 'departments': [], 'num_ratings': []}
+    variables = {
+        "query": {"text": "", "schoolID": encode_node_id("School", school_id), "fallback": False},
+        "count": ROSTER_PAGE_SIZE,
+        "cursor": None
+    }
+    page = 0
+    while True:
+        page += 1
+        data = post_graphql("TeacherRosterQuery", ROSTER_QUERY, variables)
+        if "errors" in data:
+            raise RuntimeError(f"GraphQL error while crawling roster: {data['errors']}")
+        teachers = data['data']['search']['teachers']
+        for edge in teachers.get('edges') or []:
+            node = edge['node']
+            columns['legacy_ids'].append(str(node.get('legacyId')))
+            columns['names'].append(f"{(node.get('firstName') or '').strip()} {(node.get('lastName') or '').strip()}".strip())
+            columns['departments'].append(node.get('department') or '')
+            columns['num_ratings'].append(node.get('numRatings') or 0)
+        logging.info(f"Roster page {page}: {len(columns['names'])} of {teachers.get('resultCount')} teachers")
+        page_info = teachers.get('pageInfo') or {}
+        if not page_info.get('hasNextPage') or not page_info.get('endCursor'):
+            break
+        # Pages are paced by the adaptive controller in post_graphql
+        variables['cursor'] = page_info['endCursor']
+    return columns
+
+
+class RosterIndex:
+    def __init__(self, school_id=None, path=None, auto_refresh=False):
+        """With auto_refresh, lookups start a background re-crawl once the roster goes stale"""
+        self.school_id = str(school_id or RMP_SCHOOL_ID)
+        self.auto_refresh = auto_refresh
+        self.path = path or os.path.join(CACHE_DIR, f"roster_{self.school_id}.json")
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        self._last_reload_check = 0
+        self._building = False
+        self.built_at = None
+        self._columns = None
+        self._tokens = []
+        self._token_ids = []
+        self._trigrams = {}
+        self._gram_counts = []
+
+    @property
+    def ready(self):
+        return self._columns is not None
+
+    def is_stale(self):
+        if not os.path.exists(self.path):
+            return True
+        return time.time() - os.path.getmtime(self.path) > ROSTER_REFRESH_HOURS * 3600
+
+    def load(self):
+        """Load the on-disk roster and build the in-memory lookup arrays"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        columns = data['columns']
+        token_pairs = []
+        trigram_index = defaultdict(list)
+        gram_counts = []
+        for i, name in enumerate(columns['names']):
+            normalized = normalize_name(name)
+            for token in set(normalized.split()):
+                token_pairs.append((token, i))
+            grams = trigrams(normalized)
+            gram_counts.append(len(grams))
+            for gram in grams:
+                trigram_index[gram].append(i)
+        token_pairs.sort()
+
+        with self._lock:
+            self._columns = columns
+            self._tokens = [token for token, _ in token_pairs]
+            self._token_ids = [i for _, i in token_pairs]
+            self._trigrams = dict(trigram_index)
+            self._gram_counts = gram_counts
+            self._loaded_mtime = mtime
+            self.built_at = data.get('built_at')
+        logging.info(f"Loaded roster index with {len(columns['names'])} teachers from {self.path}")
+        return True
+
+    def build(self):
+        """Crawl the school's roster and atomically replace the index file"""
+        columns = crawl_school_roster(self.school_id)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'school_id': self.school_id, 'built_at': time.time(), 'columns': columns}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self.load()
+
+    def refresh_in_background(self):
+        """Rebuild a missing or stale index on a daemon thread
+
+        A lock file keeps several gunicorn workers from crawling at once.
+        """
+        if not self.is_stale() or self._building:
+            return
+        lock_path = f"{self.path}.lock"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            # Lock files left behind by a crashed build expire after an hour
+            if os.path.exists(lock_path) and time.time() - os.path.getmtime(lock_path) > 3600:
+                os.remove(lock_path)
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+        except OSError:
+            return
+
+        def run():
+            try:
+                # The crawl is background work; user-facing requests go first
+                with priority(BATCH):
+                    self.build()
+            except Exception as e:
+                logging.error(f"Failed to build roster index: {e}")
+            finally:
+                self._building = False
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+
+        self._building = True
+        threading.Thread(target=run, name='roster-index-build', daemon=True).start()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_reload_check < RELOAD_CHECK_SECONDS and self.ready:
+            return
+        self._last_reload_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != self._loaded_mtime:
+            self.load()
+        # Long-lived workers would otherwise keep serving the roster they started with
+        if self.auto_refresh:
+            self.refresh_in_background()
+
+    def _prefix_ids(self, token):
+        start = bisect.bisect_left(self._tokens, token)
+        end = bisect.bisect_left(self._tokens, token + '\uffff', lo=start)
+        return set(self._token_ids[start:end])
+
+    def _fuzzy_ids(self, normalized, limit):
+        counts = defaultdict(int)
+        query_grams = trigrams(normalized)
+        for gram in query_grams:
+            for i in self._trigrams.get(gram, ()):
+                counts[i] += 1
+        scored = []
+        for i, shared in counts.items():
+            # Dice coefficient on trigram sets
+            score = 2 * shared / (len(query_grams) + self._gram_counts[i])
+            if score >= 0.4:
+                scored.append((score, i))
+        scored.sort(reverse=True)
+        return [i for _, i in scored[:limit * 3]]
+
+    def search(self, query, limit=10):
+        """Return up to limit teachers whose name tokens start with the query's tokens
+
+        Falls back to trigram similarity when nothing matches by prefix.
+        """
+        self._maybe_reload()
+        if not self.ready:
+            return []
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+
+        with self._lock:
+            columns = self._columns
+            matches = None
+            for token in normalized.split():
+                ids = self._prefix_ids(token)
+                matches = ids if matches is None else matches & ids
+                if not matches:
+                    break
+            fuzzy = False
+            if matches:
+                ranked = sorted(matches, key=lambda i: -columns['num_ratings'][i])
+            else:
+                fuzzy = True
+                ranked = self._fuzzy_ids(normalized, limit)
+
+        return [
+            {
+                'legacy_id': columns['legacy_ids'][i],
+                'professor_name': columns['names'][i],
+                'department': columns['departments'][i],
+                'num_ratings': columns['num_ratings'][i],
+                'url': professor_url(columns['legacy_ids'][i]),
+                'fuzzy': fuzzy
+            }
+            for i in ranked[:limit]
+        ]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Build or query the prefetched school roster index")
+    parser.add_argument('command', choices=['build', 'search'])
+    parser.add_argument('query', nargs='?', default='')
+    parser.add_argument('--school-id', default=None, help="RMP legacy school ID (defaults to RMP_SCHOOL_ID)")
+    args = parser.parse_args()
+
+    index = RosterIndex(school_id=args.school_id)
+    if args.command == 'build':
+        index.build()
+    else:
+        index.load()
+        for teacher in index.search(args.query):
+            print(f"{teacher['professor_name']:<30} {teacher['department']:<25} {teacher['num_ratings']:>5}  {teacher['url']}")
@@ -0,0 +1,202 @@
+"""
+Priority scheduling of upstream calls between interactive and batch work
+
+Every RateMyProfessors and OpenAI call passes through an UpstreamGate, which
+limits how many run at once per process and hands free slots to interactive
+callers first. Batch work (main.py, python -m src.review_analyzer) runs in
+separate processes from the web app, so on top of the in-process gate the web
+app touches a beacon file while it has interactive calls in flight; batch
+callers that see a fresh beacon back off before each call.
+
+Neither rule can starve batch work: a batch waiter that has waited longer
+than SCHEDULER_MAX_BATCH_WAIT seconds is treated as interactive, and the
+beacon back-off is bounded by the same limit. A caller that passes its
+request Deadline stops waiting with DeadlineExceeded when it runs out.
+
+The slot counts are deliberately far below gunicorn's request threads
+(GUNICORN_THREADS, 100 per worker): they bound how hard one process hits RMP
+and OpenAI, and threads beyond them queue here cheaply. Raise them together
+with the worker count in mind, since every worker gets its own slots.
+"""
+import os
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from src.deadline import DeadlineExceeded
+from src.metrics import SCHEDULER_WAIT_SECONDS
+from src.paths import CACHE_DIR
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch'}
+
+# Concurrent calls per upstream and process, and how many of them batch work may hold
+UPSTREAM_SLOTS = {
+    'rmp': int(os.getenv('SCHEDULER_RMP_SLOTS', '8')),
+    'openai': int(os.getenv('SCHEDULER_OPENAI_SLOTS', '8')),
+}
+RESERVED_INTERACTIVE_SLOTS = int(os.getenv('SCHEDULER_RESERVED_SLOTS', '2'))
+MAX_BATCH_WAIT = float(os.getenv('SCHEDULER_MAX_BATCH_WAIT', '30'))
+
+BEACON_PATH = os.getenv('SCHEDULER_BEACON_PATH') or os.path.join(CACHE_DIR, 'interactive.beacon')
+# Interactive traffic counts as active for this long after the beacon was touched
+BEACON_ACTIVE_SECONDS = 5
+BEACON_TOUCH_INTERVAL = 1
+BATCH_BACKOFF_SECONDS = 0.5
+
+_priority = contextvars.ContextVar('upstream_priority', default=None)
+_default_priority = INTERACTIVE
+
+
+def set_default_priority(level):
+    """Process-wide priority for calls made outside a priority() block
+
+    Batch entry points call this once so threads they start inherit it.
+    """
+    global _default_priority
+    _default_priority = level
+
+
+def current_priority():
+    level = _priority.get()
+    return _default_priority if level is None else level
+
+
+@contextmanager
+def priority(level):
+    """Run the enclosed upstream calls at the given priority"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class UpstreamGate:
+    def __init__(self, name, slots, reserved=RESERVED_INTERACTIVE_SLOTS):
+        self.name = name
+        self.slots = max(1, slots)
+        # Batch work may never fill the slots kept back for interactive callers
+        self.batch_slots = max(1, self.slots - reserved)
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._batch_in_use = 0
+        self._waiting = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+
+    def _can_run(self, entry, level):
+        if self._in_use >= self.slots:
+            return False
+        if level == BATCH and self._batch_in_use >= self.batch_slots:
+            return False
+        return self._waiting[0] == entry
+
+    def acquire(self, level, deadline=None):
+        """Block until a slot is free for a caller of the given priority
+
+        Raises DeadlineExceeded if the deadline runs out while waiting.
+        """
+        started = time.monotonic()
+        entry = (level, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            while not self._can_run(entry, entry[0]):
+                timeout = None
+                if entry[0] == BATCH:
+                    waited = time.monotonic() - started
+                    if waited >= MAX_BATCH_WAIT:
+                        # Starvation protection: promote to interactive rank
+                        self._waiting.remove(entry)
+                        entry = (INTERACTIVE, entry[1])
+                        self._waiting.append(entry)
+                        heapq.heapify(self._waiting)
+                        continue
+                    timeout = MAX_BATCH_WAIT - waited
+                if deadline is not None:
+                    if deadline.expired:
+                        self._waiting.remove(entry)
+                        heapq.heapify(self._waiting)
+                        # The next waiter may be able to run now that we're out of the way
+                        self._cond.notify_all()
+                        SCHEDULER_WAIT_SECONDS.labels(upstream=self.name, priority=PRIORITY_NAMES[level]).observe(time.monotonic() - started)
+                        raise DeadlineExceeded(f"Deadline of {deadline.seconds:g}s exceeded waiting for a {self.name} slot")
+                    timeout = deadline.remaining() if timeout is None else min(timeout, deadline.remaining())
+                self._cond.wait(timeout)
+            heapq.heappop(self._waiting)
+            self._in_use += 1
+            if level == BATCH:
+                self._batch_in_use += 1
+            self._cond.notify_all()
+        SCHEDULER_WAIT_SECONDS.labels(upstream=self.name, priority=PRIORITY_NAMES[level]).observe(time.monotonic() - started)
+
+    def release(self, level):
+        with self._cond:
+            self._in_use -= 1
+            if level == BATCH:
+                self._batch_in_use -= 1
+            self._cond.notify_all()
+
+
+_gates = {name: UpstreamGate(name, slots) for name, slots in UPSTREAM_SLOTS.items()}
+
+
+def slot_limit(upstream, level=INTERACTIVE):
+    """Most calls to an upstream that one process can have in flight at a priority"""
+    gate = _gates[upstream]
+    return gate.batch_slots if level == BATCH else gate.slots
+
+_last_beacon_touch = 0.0
+
+
+def _touch_beacon():
+    global _last_beacon_touch
+    now = time.monotonic()
+    if now - _last_beacon_touch < BEACON_TOUCH_INTERVAL:
+        return
+    _last_beacon_touch = now
+    try:
+        os.makedirs(os.path.dirname(BEACON_PATH), exist_ok=True)
+        with open(BEACON_PATH, 'a'):
+            pass
+        os.utime(BEACON_PATH)
+    except OSError:
+        pass
+
+
+def interactive_active():
+    """Whether any process has made interactive upstream calls in the last few seconds"""
+    try:
+        return time.time() - os.path.getmtime(BEACON_PATH) < BEACON_ACTIVE_SECONDS
+    except OSError:
+        return False
+
+
+@contextmanager
+def upstream_slot(upstream, deadline=None):
+    """Hold one of an upstream's call slots for the enclosed call
+
+    With a deadline, waiting for the slot raises DeadlineExceeded once it has
+    passed; compute request timeouts from the deadline inside the block.
+    """
+    level = current_priority()
+    if level == INTERACTIVE:
+        _touch_beacon()
+    else:
+        # Give way to another process's interactive traffic, but not forever
+        give_way_until = time.monotonic() + MAX_BATCH_WAIT
+        while interactive_active() and time.monotonic() < give_way_until:
+            if deadline is not None:
+                deadline.sleep(BATCH_BACKOFF_SECONDS, f"a {upstream} slot")
+            else:
+                time.sleep(BATCH_BACKOFF_SECONDS)
+
+    gate = _gates[upstream]
+    gate.acquire(level, deadline)
+    try:
+        yield
+    finally:
+        gate.release(level)
@@ -0,0 +1,94 @@
+"""
+Splitting batch runs across machines and merging their outputs
+
+Each node runs `python -m src.review_analyzer --shard i/N` against the same
+professors.csv and processes only the teachers whose stable hash falls in its
+shard, writing professor_analyses.shard-i-of-N.json/.csv. Once every node is
+done and the shard files sit in one OUTPUT_DIR (shared volume, rsync, ...),
+`python -m src.review_analyzer --merge-shards N` combines them into the usual
+professor_analyses.json/.csv. Nodes never talk to each other; the files are
+the only coordination.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+
+import pandas as pd
+
+from src.rmp_client import legacy_teacher_id
+
+
+def parse_shard(text):
+    """Parse "i/N" (1 <= i <= N) into (i, N)"""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', text or '')
+    if not match:
+        raise ValueError(f"Shard must look like i/N, got {text!r}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and N, got {text!r}")
+    return index, count
+
+
+def shard_of(url, count):
+    """1-based shard a professor belongs to, stable across machines and runs
+
+    Hashes the RMP teacher ID rather than the URL text, so every spelling of a
+    professor's URL (and every course they teach) lands on the same shard.
+    """
+    teacher = legacy_teacher_id(url) or url
+    digest = hashlib.sha1(str(teacher).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def shard_basename(index, count):
+    return f"professor_analyses.shard-{index}-of-{count}"
+
+
+def row_key(url, professor_name, course_code):
+    """Identity of an output row: the RMP teacher ID and the course
+
+    Two professors can share a name in the same course, so the name is only
+    used for rows without a URL.
+    """
+    teacher = legacy_teacher_id(url) or url or professor_name
+    return str(teacher), str(course_code)
+
+
+def merge_shards(output_dir, count):
+    """Combine every shard's output into professor_analyses.json/.csv
+
+    Rows come out in professors.csv order, so the merged files don't depend on
+    which node finished first. Raises FileNotFoundError naming any shard whose
+    output is missing.
+    """
+    paths = [os.path.join(output_dir, f"{shard_basename(i, count)}.json") for i in range(1, count + 1)]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Missing shard outputs: {', '.join(os.path.basename(p) for p in missing)}")
+
+    results = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            results.extend(json.load(f))
+
+    order = {}
+    try:
+        professors = pd.read_csv(os.path.join(output_dir, 'professors.csv'))
+        for position, row in enumerate(professors.itertuples(index=False)):
+            order.setdefault(row_key(row.url, row.professor_name, row.course_code), position)
+    except (OSError, ValueError, AttributeError) as e:
+        logging.warning(f"Could not read professors.csv for merge order, sorting by course and name: {e}")
+    results.sort(key=lambda r: (
+        order.get(row_key(r.get('url'), r.get('professor_name'), r.get('course_code')), len(order)),
+        str(r.get('course_code')),
+        str(r.get('professor_name')),
+        row_key(r.get('url'), r.get('professor_name'), r.get('course_code'))
+    ))
+
+    with open(os.path.join(output_dir, 'professor_analyses.json'), 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    pd.DataFrame(results).to_csv(os.path.join(output_dir, 'professor_analyses.csv'), index=False)
+    logging.info(f"Merged {len(results)} results from {count} shards into professor_analyses.json and professor_analyses.csv")
+    return results
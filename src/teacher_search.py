@@ -0,0 +1,188 @@
+"""
+Resolve professor names to RateMyProfessors profiles via RMP's teacher search
+
+Many names are resolved in a single GraphQL request by aliasing one search
+per name, and the name -> legacy ID mapping is cached on disk so repeat
+lookups never leave the process. Unlike professor_finder this needs no Google
+Custom Search quota.
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+
+from src.paths import CACHE_DIR
+from src.rmp_client import RMP_SCHOOL_ID, post_graphql, encode_node_id, professor_url
+from src.tracing import span
+
+# Names RMP doesn't know are retried after a day; found teachers are kept for a month
+MISS_TTL_SECONDS = 24 * 3600
+HIT_TTL_SECONDS = 30 * 24 * 3600
+# Upper bound on aliased searches per GraphQL request
+MAX_NAMES_PER_REQUEST = 25
+
+TEACHER_FIELDS = """
+              id
+              legacyId
+              firstName
+              lastName
+              department
+              numRatings
+              avgRating
+              avgDifficulty
+"""
+
+
+def normalize_name(name):
+    """Lowercase, strip punctuation and collapse whitespace"""
+    return ' '.join(re.findall(r"[a-z0-9]+", (name or '').lower()))
+
+
+def teacher_record(node):
+    """Flatten a Teacher node into the dict stored in the cache and returned to callers"""
+    legacy_id = str(node.get('legacyId'))
+    return {
+        'legacy_id': legacy_id,
+        'professor_name': f"{node.get('firstName', '').strip()} {node.get('lastName', '').strip()}".strip(),
+        'department': node.get('department'),
+        'num_ratings': node.get('numRatings'),
+        'avg_rating': node.get('avgRating'),
+        'avg_difficulty': node.get('avgDifficulty'),
+        'url': professor_url(legacy_id)
+    }
+
+
+def best_match(name, nodes):
+    """Pick the search result that best matches a name, or None"""
+    wanted = normalize_name(name)
+    wanted_tokens = set(wanted.split())
+    best, best_score = None, None
+    for node in nodes:
+        full = normalize_name(f"{node.get('firstName', '')} {node.get('lastName', '')}")
+        tokens = set(full.split())
+        if full == wanted:
+            overlap = len(wanted_tokens) + 1
+        else:
+            overlap = len(wanted_tokens & tokens)
+        # Every searched token must appear, so "Smith" doesn't resolve to "John Smithson"
+        if overlap < len(wanted_tokens):
+            continue
+        score = (overlap, node.get('numRatings') or 0)
+        if best_score is None or score > best_score:
+            best, best_score = node, score
+    return best
+
+
+class TeacherSearch:
+    def __init__(self, school_id=None, cache_path=None):
+        self.school_id = str(school_id or RMP_SCHOOL_ID)
+        self.cache_path = cache_path or os.path.join(CACHE_DIR, f"teacher_search_{self.school_id}.json")
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        """Write the cache atomically so concurrent workers never read a partial file"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        # Keep entries other processes added since we loaded; ours take precedence
+        merged = self._load_cache()
+        merged.update(self._cache)
+        self._cache = merged
+        tmp_path = f"{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._cache, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    def _cached(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return False, None
+        ttl = HIT_TTL_SECONDS if entry.get('teacher') else MISS_TTL_SECONDS
+        if time.time() - entry.get('cached_at', 0) > ttl:
+            return False, None
+        return True, entry.get('teacher')
+
+    def search(self, names):
+        """Run one aliased GraphQL teacher search for several names
+
+        Returns ({name: [Teacher node, ...]}, clean), where clean is False if
+        the response carried GraphQL errors, so empty results can't be trusted.
+        """
+        declarations = ', '.join(f"$q{i}: TeacherSearchQuery!" for i in range(len(names)))
+        selections = '\n'.join(
+            f"""
+          t{i}: newSearch {{
+            teachers(query: $q{i}, first: 10) {{
+              edges {{
+                node {{{TEACHER_FIELDS}                }}
+              }}
+            }}
+          }}"""
+            for i in range(len(names))
+        )
+        query = f"query TeacherSearchBatchQuery({declarations}) {{{selections}\n        }}"
+        school_node_id = encode_node_id("School", self.school_id)
+        variables = {
+            f"q{i}": {"text": name, "schoolID": school_node_id, "fallback": False}
+            for i, name in enumerate(names)
+        }
+
+        data = post_graphql("TeacherSearchBatchQuery", query, variables)
+        clean = not data.get("errors")
+        if not clean:
+            logging.error(f"GraphQL error during teacher search: {data['errors']}")
+        results = {}
+        for i, name in enumerate(names):
+            block = (data.get('data') or {}).get(f"t{i}") or {}
+            edges = (block.get('teachers') or {}).get('edges') or []
+            results[name] = [edge['node'] for edge in edges if edge.get('node')]
+        return results, clean
+
+    def resolve(self, names):
+        """Resolve professor names to teacher records
+
+        Returns {name: record or None}. Cached names are answered locally;
+        the rest are looked up in as few GraphQL requests as possible.
+        """
+        resolved = {}
+        to_search = []
+        with self._lock:
+            for name in names:
+                found, teacher = self._cached(normalize_name(name))
+                if found:
+                    resolved[name] = teacher
+                elif name not in to_search:
+                    to_search.append(name)
+
+        if to_search:
+            logging.info(f"Searching RMP for {len(to_search)} professor names ({len(resolved)} cached)")
+        for start in range(0, len(to_search), MAX_NAMES_PER_REQUEST):
+            chunk = to_search[start:start + MAX_NAMES_PER_REQUEST]
+            try:
+                with span('graphql.teacher_search', names=len(chunk)):
+                    results, clean = self.search(chunk)
+            except Exception as e:
+                logging.error(f"Error searching RMP for professor names: {e}")
+                for name in chunk:
+                    resolved[name] = None
+                continue
+
+            with self._lock:
+                for name in chunk:
+                    node = best_match(name, results.get(name, []))
+                    teacher = teacher_record(node) if node else None
+                    resolved[name] = teacher
+                    # A miss from an errored response may be transient; only cache it when the response was clean
+                    if teacher or clean:
+                        self._cache[normalize_name(name)] = {'teacher': teacher, 'cached_at': time.time()}
+                self._save_cache()
+
+        return resolved
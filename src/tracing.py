@@ -0,0 +1,216 @@
+"""
+Request-scoped span tracing and an on-demand sampling profiler
+
+Tracing is off unless a trace has been started for the current context, in
+which case span() returns a shared no-op context manager, so the
+instrumentation left in the scraper costs a context-variable lookup per call.
+Finished traces are written to TRACE_DIR as JSON so any gunicorn worker can
+serve them back; traces and profiles past TRACE_RETENTION_DAYS or beyond
+TRACE_MAX_FILES are pruned as new ones are written.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+from src.retention import prune_directory
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACE_DIR = os.getenv('TRACE_DIR') or os.path.join(PROJECT_ROOT, 'data', 'output', 'traces')
+PROFILE_DIR = os.getenv('PROFILE_DIR') or os.path.join(PROJECT_ROOT, 'data', 'output', 'profiles')
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0') or 0)
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005') or 0.005)
+TRACE_RETENTION_DAYS = float(os.getenv('TRACE_RETENTION_DAYS', '7'))
+TRACE_MAX_FILES = int(os.getenv('TRACE_MAX_FILES', '1000'))
+
+_current_span = ContextVar('current_span', default=None)
+
+
+class Span:
+    """A timed section of work with child spans"""
+
+    __slots__ = ('name', 'attrs', 'started', 'ended', 'children', 'error')
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.started = time.perf_counter()
+        self.ended = None
+        self.children = []
+        self.error = None
+
+    @property
+    def duration(self):
+        end = self.ended if self.ended is not None else time.perf_counter()
+        return end - self.started
+
+    def to_dict(self, origin=None):
+        """Serialize the span tree with offsets relative to the root span"""
+        origin = self.started if origin is None else origin
+        data = {
+            'name': self.name,
+            'start_ms': round((self.started - origin) * 1000, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            data['attrs'] = self.attrs
+        if self.error:
+            data['error'] = self.error
+        if self.children:
+            data['children'] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+class _NoopSpan:
+    """Context manager used when no trace is active"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _SpanContext:
+    def __init__(self, parent, name, attrs):
+        self.parent = parent
+        self.span = Span(name, attrs)
+        self.token = None
+
+    def __enter__(self):
+        self.parent.children.append(self.span)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.ended = time.perf_counter()
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self.token)
+        return False
+
+
+def span(name, **attrs):
+    """Time a block as a child of the current span; a no-op when tracing is off"""
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return _SpanContext(parent, name, attrs)
+
+
+def tracing_active():
+    """Whether a trace is being recorded for the current context"""
+    return _current_span.get() is not None
+
+
+def should_trace(header_value):
+    """Decide whether to trace a request from its X-Trace header and the sample rate"""
+    if header_value and header_value.lower() in ('1', 'true', 'yes'):
+        return True
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+class Trace:
+    """Root of a span tree for one request or job"""
+
+    def __init__(self, name, **attrs):
+        self.trace_id = uuid.uuid4().hex
+        self.root = Span(name, attrs)
+        self.token = _current_span.set(self.root)
+        self.profiler = None
+
+    def start_profiler(self):
+        """Sample the calling thread's stack until the trace finishes"""
+        self.profiler = SamplingProfiler(threading.get_ident())
+        self.profiler.start()
+
+    def finish(self, **attrs):
+        """Close the root span, detach it from the context and persist the tree"""
+        self.root.ended = time.perf_counter()
+        self.root.attrs.update(attrs)
+        _current_span.reset(self.token)
+        data = {'trace_id': self.trace_id, 'created': time.time(), 'root': self.root.to_dict()}
+        if self.profiler is not None:
+            data['profile'] = self.profiler.stop(os.path.join(PROFILE_DIR, f"{self.trace_id}.folded"))
+        save_trace(data)
+        return data
+
+
+def save_trace(data):
+    """Write a finished trace to TRACE_DIR"""
+    try:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        path = os.path.join(TRACE_DIR, f"{data['trace_id']}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+    except OSError as e:
+        logging.warning(f"Could not save trace {data.get('trace_id')}: {e}")
+    prune_directory(TRACE_DIR, TRACE_RETENTION_DAYS, TRACE_MAX_FILES)
+
+
+def load_trace(trace_id):
+    """Return a stored trace by ID, or None if it does not exist"""
+    # Trace IDs are hex UUIDs; reject anything else before touching the filesystem
+    if not trace_id or not all(c in '0123456789abcdef' for c in trace_id):
+        return None
+    path = os.path.join(TRACE_DIR, f"{trace_id}.json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class SamplingProfiler:
+    """Periodically sample one thread's Python stack into collapsed-stack counts
+
+    The output file uses the "folded" format understood by flamegraph.pl and
+    speedscope: one line per distinct stack, frames joined by ';', then a count.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self, path):
+        """Stop sampling, write the folded stacks to path and return the path"""
+        self._stop.set()
+        self._thread.join()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            logging.warning(f"Could not write profile {path}: {e}")
+            return None
+        prune_directory(os.path.dirname(path), TRACE_RETENTION_DAYS, TRACE_MAX_FILES)
+        return path
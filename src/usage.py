@@ -0,0 +1,76 @@
+"""
+Per-job accounting of upstream calls and LLM tokens
+
+Code that spends against a budget (the cache warmer) opens a meter with
+`with metered() as meter:`; every RMP GraphQL call, Google Custom Search query
+and OpenAI completion made in that context is added to it. Outside a meter
+the hooks do nothing. Meters follow contextvars, so work handed to other
+threads is not counted unless the context is copied along.
+"""
+import threading
+import contextvars
+from contextlib import contextmanager
+
+_meter = contextvars.ContextVar('usage_meter', default=None)
+
+
+class UsageMeter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rmp_calls = 0
+        self.cse_calls = 0
+        self.openai_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def upstream_calls(self):
+        return self.rmp_calls + self.cse_calls + self.openai_calls
+
+    @property
+    def tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def as_dict(self):
+        return {
+            'rmp_calls': self.rmp_calls,
+            'cse_calls': self.cse_calls,
+            'openai_calls': self.openai_calls,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+        }
+
+
+@contextmanager
+def metered():
+    """Count the upstream usage of the enclosed block"""
+    meter = UsageMeter()
+    token = _meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _meter.reset(token)
+
+
+def count_call(kind):
+    """Record one upstream call; kind is 'rmp', 'cse' or 'openai'"""
+    meter = _meter.get()
+    if meter is not None:
+        with meter._lock:
+            setattr(meter, f"{kind}_calls", getattr(meter, f"{kind}_calls") + 1)
+
+
+def count_tokens(usage):
+    """Record the token counts from an OpenAI usage object or dict"""
+    meter = _meter.get()
+    if meter is None or usage is None:
+        return
+    if isinstance(usage, dict):
+        prompt_tokens = usage.get('prompt_tokens') or 0
+        completion_tokens = usage.get('completion_tokens') or 0
+    else:
+        prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+    with meter._lock:
+        meter.prompt_tokens += prompt_tokens
+        meter.completion_tokens += completion_tokens
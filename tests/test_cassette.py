@@ -0,0 +1,128 @@
+import gzip
+import time
+
+import httpx
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import cassette
+from src.cassette import Cassette, CassetteAdapter, CassetteTransport, CassetteMiss
+
+URL = "https://www.ratemyprofessors.com/graphql"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'traffic.jsonl.gz')
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Stands in for the network behind CassetteAdapter; returns the requests it saw"""
+    seen = []
+
+    def send(self, request, **kwargs):
+        seen.append(request)
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/json'
+        response.headers['Set-Cookie'] = 'session=abc'
+        response._content = f'{{"answer": {len(seen)}}}'.encode('utf-8')
+        response.url = request.url
+        response.request = request
+        return response
+
+    monkeypatch.setattr(HTTPAdapter, 'send', send)
+    return seen
+
+
+def session_for(active):
+    session = requests.Session()
+    session.mount('https://', CassetteAdapter(active))
+    return session
+
+
+def test_requests_round_trip(path, upstream):
+    recorder = session_for(Cassette(path, 'record'))
+    recorded = recorder.post(URL + "?key=secret", json={'query': 'q', 'variables': {'id': 1, 'count': 20}})
+
+    player = session_for(Cassette(path, 'replay'))
+    # Same request with another API key and the JSON keys in another order
+    replayed = player.post(URL + "?key=other", json={'variables': {'count': 20, 'id': 1}, 'query': 'q'})
+
+    assert len(upstream) == 1
+    assert replayed.status_code == recorded.status_code == 200
+    assert replayed.json() == recorded.json() == {'answer': 1}
+    assert 'set-cookie' not in replayed.headers
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        stored = f.read()
+    assert 'secret' not in stored and 'session=abc' not in stored
+
+
+def test_unrecorded_request_is_a_miss(path, upstream):
+    session_for(Cassette(path, 'record')).post(URL, json={'query': 'recorded'})
+    player = session_for(Cassette(path, 'replay'))
+
+    with pytest.raises(CassetteMiss):
+        player.post(URL, json={'query': 'never recorded'})
+    # A miss is a ConnectionError, so callers treat it like a network failure
+    assert issubclass(CassetteMiss, requests.exceptions.ConnectionError)
+    assert len(upstream) == 1
+
+
+def test_repeated_requests_replay_in_order(path, upstream):
+    recorder = session_for(Cassette(path, 'record'))
+    for _ in range(2):
+        recorder.post(URL, json={'query': 'same'})
+
+    player = session_for(Cassette(path, 'replay'))
+    answers = [player.post(URL, json={'query': 'same'}).json()['answer'] for _ in range(3)]
+
+    assert answers == [1, 2, 2]
+
+
+def test_replay_latency_is_scaled(path):
+    Cassette(path, 'record').record('POST', URL, b'{}', 'application/json', 200, {}, b'{}', elapsed=0.2)
+
+    started = time.monotonic()
+    Cassette(path, 'replay', latency_scale=0.5).play('POST', URL, b'{}', 'application/json')
+    scaled = time.monotonic() - started
+    started = time.monotonic()
+    Cassette(path, 'replay').play('POST', URL, b'{}', 'application/json')
+    instant = time.monotonic() - started
+
+    assert 0.1 <= scaled < 0.2
+    assert instant < 0.05
+
+
+def test_httpx_round_trip(path):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={'choices': [{'message': {'content': 'summary'}}]})
+
+    with httpx.Client(transport=CassetteTransport(Cassette(path, 'record'), wrapped=httpx.MockTransport(handler))) as client:
+        recorded = client.post("https://api.openai.com/v1/chat/completions", json={'model': 'gpt-3.5-turbo'})
+    with httpx.Client(transport=CassetteTransport(Cassette(path, 'replay'))) as client:
+        replayed = client.post("https://api.openai.com/v1/chat/completions", json={'model': 'gpt-3.5-turbo'})
+
+    assert len(calls) == 1
+    assert replayed.json() == recorded.json()
+
+
+def test_configure(path, monkeypatch):
+    monkeypatch.setattr(cassette, '_cassette', None)
+    monkeypatch.setattr(cassette, '_configured', False)
+    Cassette(path, 'record').record('GET', URL, None, None, 200, {}, b'ok', elapsed=0.0)
+
+    active = cassette.configure('replay', path, 0)
+
+    assert cassette.get_cassette() is active
+    assert active.mode == 'replay'
+    assert cassette.configure('off') is None
+    with pytest.raises(ValueError):
+        cassette.configure('rewind', path)
+    with pytest.raises(FileNotFoundError):
+        cassette.configure('replay', path + '.missing')
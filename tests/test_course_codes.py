@@ -0,0 +1,22 @@
+from src.course_codes import normalize_course_code, course_code_variants, matches_course
+
+
+def test_normalize_course_code():
+    assert normalize_course_code("cs-uy 1114") == "CSUY1114"
+    assert normalize_course_code(None) == ""
+
+
+def test_variants():
+    assert course_code_variants("CS-UY 1114") == {"CSUY1114", "CS1114"}
+    assert course_code_variants("CS1114") == {"CS1114"}
+
+
+def test_variants_of_nothing():
+    assert course_code_variants(None) == set()
+    assert course_code_variants("") == set()
+
+
+def test_matches_course():
+    assert matches_course("CS 1114", "CS-UY 1114")
+    assert not matches_course("CS1134", "CS-UY 1114")
+    assert not matches_course("CS1114", None)
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+
+import pytest
+
+from src import model_router, retention
+from src.model_router import choose_route, record_llm_call, ledger_summary, estimate_cost, load_routes, _ledger_file
+
+ROUTES = [
+    {'name': 'skip', 'max_reviews': 2, 'model': None},
+    {'name': 'small', 'max_prompt_tokens': 800, 'model': 'gpt-3.5-turbo', 'max_tokens': 200},
+    {'name': 'standard', 'model': 'gpt-4o-mini', 'max_tokens': 300},
+]
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_router, 'LLM_LEDGER_DIR', str(tmp_path))
+    monkeypatch.setattr(model_router, '_ledger_frames', {})
+    return tmp_path
+
+
+def test_choose_route_takes_the_first_fitting_route():
+    assert choose_route(1, 5000, routes=ROUTES)['name'] == 'skip'
+    assert choose_route(3, 800, routes=ROUTES)['name'] == 'small'
+    assert choose_route(3, 801, routes=ROUTES)['name'] == 'standard'
+
+
+def test_choose_route_needs_a_catch_all():
+    with pytest.raises(ValueError):
+        choose_route(10, 10_000, routes=ROUTES[:2])
+
+
+def test_load_routes_rejects_a_limited_last_route(monkeypatch):
+    monkeypatch.setenv('MODEL_ROUTES', json.dumps(ROUTES[:2]))
+    with pytest.raises(ValueError, match="last model route"):
+        load_routes()
+    monkeypatch.setenv('MODEL_ROUTES', json.dumps([{'name': 'x', 'model': 'gpt-4o'}]))
+    with pytest.raises(ValueError, match="max_tokens"):
+        load_routes()
+
+
+def test_estimate_cost():
+    assert estimate_cost('gpt-4o-mini', 1_000_000, 1_000_000) == pytest.approx(0.75)
+    assert estimate_cost('unknown-model', 100, 100) is None
+
+
+def test_empty_ledger(ledger):
+    assert ledger_summary() == {'calls': 0, 'cost': 0.0, 'routes': []}
+
+
+def test_ledger_summary_aggregates_per_route_and_model(ledger):
+    record_llm_call('small', 'gpt-3.5-turbo', 1.0, {'prompt_tokens': 600, 'completion_tokens': 100})
+    record_llm_call('small', 'gpt-3.5-turbo', 3.0, {'prompt_tokens': 400, 'completion_tokens': 100})
+    record_llm_call('small', 'gpt-3.5-turbo', 30.0, outcome='error')
+    record_llm_call('standard', 'gpt-4o-mini', 2.0, {'prompt_tokens': 2000, 'completion_tokens': 300})
+
+    summary = ledger_summary()
+
+    assert summary['calls'] == 4
+    small, standard = summary['routes']
+    assert (small['route'], small['model']) == ('small', 'gpt-3.5-turbo')
+    assert small['calls'] == 3
+    assert small['errors'] == 1
+    assert small['prompt_tokens'] == 1000
+    assert small['completion_tokens'] == 200
+    # Latency only counts successful calls
+    assert small['latency_mean'] == 2.0
+    assert small['cost'] == pytest.approx(estimate_cost('gpt-3.5-turbo', 1000, 200))
+    assert standard['calls'] == 1 and standard['errors'] == 0
+    assert summary['cost'] == pytest.approx(small['cost'] + standard['cost'])
+
+
+def test_ledger_summary_window(ledger):
+    old = {'t': time.time() - 3 * 3600, 'route': 'small', 'model': 'gpt-3.5-turbo', 'outcome': 'success',
+           'seconds': 1.0, 'prompt_tokens': 10, 'completion_tokens': 10, 'cost': 0.001}
+    with open(_ledger_file(old['t']), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(old) + '\n')
+    record_llm_call('small', 'gpt-3.5-turbo', 1.0, {'prompt_tokens': 10, 'completion_tokens': 10})
+
+    assert ledger_summary()['calls'] == 2
+    assert ledger_summary(hours=1)['calls'] == 1
+
+
+def test_ledger_is_split_by_day_and_pruned(ledger, monkeypatch):
+    now = time.time()
+    for days_ago in (0, 2, 45):
+        entry = {'t': now - days_ago * 86400, 'route': 'small', 'model': 'gpt-3.5-turbo', 'outcome': 'success',
+                 'seconds': 1.0, 'prompt_tokens': 10, 'completion_tokens': 10, 'cost': 0.001}
+        path = _ledger_file(entry['t'])
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+        os.utime(path, (entry['t'], entry['t']))
+    assert len(list(ledger.iterdir())) == 3
+    assert ledger_summary(hours=24 * 7)['calls'] == 2
+
+    monkeypatch.setattr(retention, '_last_pruned', {})
+    record_llm_call('small', 'gpt-3.5-turbo', 1.0, {'prompt_tokens': 10, 'completion_tokens': 10})
+
+    assert len(list(ledger.iterdir())) == 2
+    assert ledger_summary()['calls'] == 3
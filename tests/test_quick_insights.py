@@ -0,0 +1,67 @@
+from src.quick_insights import quick_insights, quick_columns
+
+
+def review(text, quality=4, difficulty=3, timestamp='2024-03-01'):
+    return {'text': text, 'quality_rating': quality, 'difficulty_rating': difficulty, 'timestamp': timestamp}
+
+
+def test_empty_input():
+    insights = quick_insights([])
+
+    assert insights['number_of_reviews'] == 0
+    assert insights['keywords'] == []
+    assert insights['themes'] == []
+    assert insights['quotes'] == []
+    assert insights['trend'] == {'by_year': [], 'direction': None}
+    assert insights['quality_distribution'] == {str(r): 0 for r in range(1, 6)}
+    assert insights['summary'] == "Based on 0 reviews, students rate quality n/a and difficulty n/a."
+
+
+def test_placeholder_only_reviews_keep_their_ratings():
+    reviews = [review('No Comments', quality=q, difficulty=2) for q in (3, 4, 5)] + [review('N/A', quality=4, difficulty=2)]
+
+    insights = quick_insights(reviews)
+
+    assert insights['number_of_reviews'] == 4
+    assert insights['keywords'] == []
+    assert insights['themes'] == []
+    assert insights['quotes'] == []
+    assert insights['quality_distribution'] == {'1': 0, '2': 0, '3': 1, '4': 2, '5': 1}
+    assert insights['summary'] == "Based on 4 reviews, students rate quality 4.0/5 and difficulty 2.0/5."
+
+
+def test_placeholders_are_not_keywords_or_quotes():
+    texts = [
+        "Great lectures and the exams were fair if you did the homework every week.",
+        "Tough grader, but the lectures explain every concept clearly and the exams are fair.",
+        "Homework is heavy but the lectures make the exams manageable for everyone in the class.",
+    ]
+    reviews = [review(text) for text in texts] + [review('No Comments', quality=1) for _ in range(10)]
+
+    insights = quick_insights(reviews)
+
+    terms = [k['term'] for k in insights['keywords']]
+    assert 'comments' not in ' '.join(terms)
+    assert 'lectures' in terms
+    assert all(q['text'] in texts for q in insights['quotes'])
+    # Theme shares count only reviews with a comment
+    lectures = next(t for t in insights['themes'] if t['theme'] == 'lectures')
+    assert lectures['share'] == 1.0
+    assert insights['number_of_reviews'] == 13
+
+
+def test_trend_compares_recent_years_with_earlier_ones():
+    reviews = [review('Fine.', quality=2, timestamp=f'2018-0{m}-01') for m in range(1, 4)]
+    reviews += [review('Fine.', quality=5, timestamp=f'2024-0{m}-01') for m in range(1, 4)]
+
+    trend = quick_insights(reviews)['trend']
+
+    assert trend['direction'] == 'improving'
+    assert [y['year'] for y in trend['by_year']] == [2018, 2024]
+
+
+def test_quick_columns():
+    columns = quick_columns([review("Great lectures, fair exams and very helpful in office hours every week.")])
+
+    assert columns['analysis'].startswith("Based on 1 review,")
+    assert set(columns) == {'analysis', 'keywords', 'quality_trend'}
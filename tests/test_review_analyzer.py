@@ -0,0 +1,143 @@
+import time
+from collections import OrderedDict
+from unittest import mock
+
+import pytest
+import requests
+
+from src.model_router import routing_signature
+from src.review_analyzer import ReviewScraper, PROMPT_VERSION
+
+ROUTES = [
+    {'name': 'skip', 'max_reviews': 2, 'model': None},
+    {'name': 'standard', 'model': 'gpt-3.5-turbo', 'max_tokens': 300},
+]
+
+
+def review(text, quality=4):
+    return {'text': text, 'quality_rating': quality, 'difficulty_rating': 3, 'timestamp': '2024-03-01'}
+
+
+def test_skipped_route_is_reported(monkeypatch):
+    monkeypatch.setattr('src.model_router.ROUTES', ROUTES)
+    scraper = ReviewScraper(use_llm=False)
+
+    analysis, route = scraper.analyze_reviews_routed([review("Clear lectures and fair exams.")] * 2)
+
+    assert route['name'] == 'skip' and route['model'] is None
+    assert analysis.startswith("Based on 2 reviews,")
+
+
+def test_llm_route_is_reported(monkeypatch):
+    monkeypatch.setattr('src.model_router.ROUTES', ROUTES)
+    scraper = ReviewScraper(use_llm=False)
+
+    analysis, route = scraper.analyze_reviews_routed([review(f"Clear lectures, fair exam number {n}.") for n in range(3)])
+
+    assert route['model'] == 'gpt-3.5-turbo'
+    assert analysis == "Analysis unavailable: no LLM configured."
+
+
+def test_no_usable_comments_has_no_route():
+    scraper = ReviewScraper(use_llm=False)
+
+    analysis, route = scraper.analyze_reviews_routed([review("No Comments")] * 5)
+
+    assert route is None
+    assert analysis == "No reviews available for analysis."
+
+
+HEAD = {'num_ratings': 2, 'latest_review_id': 'r1', 'professor_name': 'Ada Lovelace'}
+
+
+def ratings_page(ids, has_next):
+    edges = [
+        {'cursor': rid, 'node': {'id': rid, 'comment': f"Clear lectures and fair exams ({rid}).", 'date': '2024-03-01',
+                                 'class': 'CS101', 'helpfulRating': 4, 'clarityRating': 4, 'difficultyRating': 3}}
+        for rid in ids
+    ]
+    return {'data': {'node': {'firstName': 'Ada', 'lastName': 'Lovelace', 'ratings': {
+        'edges': edges, 'pageInfo': {'hasNextPage': has_next, 'endCursor': ids[-1] if has_next else None}}}}}
+
+
+@pytest.fixture
+def analysis_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr('src.analysis_store.ANALYSIS_DIR', str(tmp_path))
+    monkeypatch.setattr('src.model_router.ROUTES', ROUTES)
+    monkeypatch.setattr('src.review_analyzer.archive_reviews', lambda *args: None)
+    monkeypatch.setattr('src.review_analyzer.get_course_index', mock.Mock())
+    monkeypatch.setattr(ReviewScraper, '_recent_reviews', OrderedDict())
+    return tmp_path
+
+
+def test_failed_fetch_is_not_stored(analysis_dir, monkeypatch):
+    post = mock.Mock(side_effect=requests.HTTPError("429 Too Many Requests"))
+    monkeypatch.setattr('src.review_analyzer.post_graphql', post)
+    scraper = ReviewScraper(use_llm=False)
+
+    first = scraper.analyze_professor('9001', head=HEAD)
+    second = scraper.analyze_professor('9001', head=HEAD)
+
+    assert first['fingerprint'] is None and not first['cached']
+    assert first['result']['status'] == 'error'
+    assert not second['cached']
+    assert post.call_count == 2
+    assert list(analysis_dir.iterdir()) == []
+
+
+def test_partial_fetch_is_served_but_not_stored(analysis_dir, monkeypatch):
+    pages = [ratings_page(['r1'], has_next=True), requests.HTTPError("403 Forbidden")]
+    monkeypatch.setattr('src.review_analyzer.post_graphql', mock.Mock(side_effect=pages))
+    scraper = ReviewScraper(use_llm=False)
+
+    analyzed = scraper.analyze_professor('9002', head=HEAD)
+
+    assert analyzed['fingerprint'] is None
+    assert analyzed['result']['status'] == 'success'
+    assert analyzed['result']['number_of_reviews'] == 1
+    assert list(analysis_dir.iterdir()) == []
+
+
+def test_complete_fetch_is_stored(analysis_dir, monkeypatch):
+    post = mock.Mock(return_value=ratings_page(['r1', 'r2'], has_next=False))
+    monkeypatch.setattr('src.review_analyzer.post_graphql', post)
+    scraper = ReviewScraper(use_llm=False)
+
+    first = scraper.analyze_professor('9003', head=HEAD)
+    second = scraper.analyze_professor('9003', head=HEAD)
+
+    assert first['fingerprint'] is not None and not first['cached']
+    assert second == {**first, 'cached': True}
+    assert post.call_count == 1
+
+
+def stored_base(review_ids, **extra):
+    record = {
+        'result': {'status': 'success', 'analysis': 'Previous summary.'},
+        'review_ids': review_ids,
+        'prompt_version': PROMPT_VERSION,
+        'routing_signature': routing_signature(),
+        'delta_updates': 0,
+        'rebuilt_at': time.time(),
+        'complete_fetch': True,
+    }
+    record.update(extra)
+    return record
+
+
+def test_delta_base_takes_only_new_reviews():
+    reviews = [review(f"Review {n}.") | {'id': f"r{n}"} for n in range(10)]
+
+    previous, new_reviews = ReviewScraper(use_llm=False)._delta_base(stored_base([f"r{n}" for n in range(8)]), reviews)
+
+    assert previous == 'Previous summary.'
+    assert [r['id'] for r in new_reviews] == ['r8', 'r9']
+
+
+def test_delta_base_rejects_a_base_from_a_partial_fetch():
+    reviews = [review(f"Review {n}.") | {'id': f"r{n}"} for n in range(10)]
+    scraper = ReviewScraper(use_llm=False)
+
+    assert scraper._delta_base(stored_base([f"r{n}" for n in range(8)], complete_fetch=None), reviews) is None
+    # Reviews that disappeared from the stored set also force a rebuild
+    assert scraper._delta_base(stored_base(['r0', 'gone']), reviews) is None
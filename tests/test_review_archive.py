@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from src import review_archive
+from src.review_archive import archive_reviews, query_reviews, rebuild_snapshot
+
+
+def review(review_id, course, timestamp, quality, difficulty=3, helpful=None, text='Fine.'):
+    return {'id': review_id, 'class_name': course, 'timestamp': timestamp, 'quality_rating': quality,
+            'difficulty_rating': difficulty, 'helpful_rating': helpful, 'text': text}
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(review_archive, 'ARCHIVE_DIR', str(tmp_path))
+    monkeypatch.setattr(review_archive, 'TEACHERS_DIR', str(tmp_path / 'teachers'))
+    monkeypatch.setattr(review_archive, 'SNAPSHOT_PATH', str(tmp_path / 'reviews.arrow'))
+    monkeypatch.setattr(review_archive, '_snapshot', None)
+    archive_reviews(1, 'Ada Lovelace', [
+        review('a1', 'CS-UY 1114', '2021-09-01', 5, difficulty=4),
+        review('a2', 'CS1114', '2023-02-01', 4, difficulty=2),
+        review('a3', 'MA-UY 1024', '2023-03-01', 3),
+    ])
+    archive_reviews(2, 'Alan Turing', [
+        review('b1', 'CS 1114', '2022-05-01', 2, difficulty=5),
+        review('b2', 'CS2124', '2023-04-01', 3, difficulty=4),
+    ])
+    rebuild_snapshot()
+    return tmp_path
+
+
+def test_overall(archive):
+    [row] = query_reviews()
+    assert row['reviews'] == 5
+    assert row['clarity'] == pytest.approx(3.4)
+    assert row['helpful'] is None
+
+
+def test_course_matches_every_spelling(archive):
+    [row] = query_reviews(course='CS-UY 1114')
+    assert row['reviews'] == 3
+    assert row['difficulty'] == pytest.approx(11 / 3, abs=1e-3)
+
+
+def test_department_grouped_by_teacher(archive):
+    rows = query_reviews(department='CS-UY', group_by='teacher')
+    assert [(r['teacher'], r['professor_name'], r['reviews']) for r in rows] == [
+        ('1', 'Ada Lovelace', 2),
+        ('2', 'Alan Turing', 2),
+    ]
+
+
+def test_date_range_and_year_groups(archive):
+    rows = query_reviews(since='2022-01-01', until='2023-03-01', group_by='year', order_by='clarity', descending=False)
+    assert [(r['year'], r['reviews']) for r in rows] == [(2022, 1), (2023, 2)]
+
+
+def test_teacher_filter_min_reviews_and_limit(archive):
+    rows = query_reviews(teacher=['1', 2], group_by='course', min_reviews=2)
+    assert [(r['course'], r['reviews']) for r in rows] == [('CS1114', 2)]
+    assert len(query_reviews(group_by='course', limit=2)) == 2
+
+
+def test_rearchiving_replaces_a_teacher(archive):
+    archive_reviews(2, 'Alan Turing', [review('b3', 'CS2124', '2024-01-01', 5)])
+    rebuild_snapshot()
+    rows = query_reviews(teacher=2, group_by='teacher')
+    assert [(r['reviews'], r['clarity']) for r in rows] == [(1, 5.0)]
+
+
+def test_invalid_arguments(archive):
+    with pytest.raises(ValueError):
+        query_reviews(group_by='school')
+    with pytest.raises(ValueError):
+        query_reviews(order_by='name')
+    with pytest.raises(ValueError):
+        query_reviews(since='last year')
@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from src.review_selector import (
+    select_reviews, reduce_reviews, minhash_signature, normalize_text, estimate_tokens,
+    REVIEW_OVERHEAD_TOKENS,
+)
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+WORDS = ('lectures exams homework grading office hours labs projects quizzes textbook attendance curve slides '
+         'midterm final essay reading discussion feedback deadline workload tough easy fair clear boring funny '
+         'helpful strict organized late early recorded online notes partial credit group presentation').split()
+
+
+def review(text, timestamp='2024-06-01', quality=4):
+    return {'text': text, 'timestamp': timestamp, 'quality_rating': quality, 'difficulty_rating': 3}
+
+
+def distinct_review(n, timestamp='2024-06-01'):
+    """A review sharing no more than chance wording with the others"""
+    rng = np.random.RandomState(n)
+    return review(' '.join(rng.choice(WORDS, size=25)), timestamp)
+
+
+def test_signature_is_deterministic():
+    text = normalize_text("The exams were fair and the lectures were clear and well organized.")
+    assert np.array_equal(minhash_signature(text), minhash_signature(text))
+
+
+def test_near_duplicates_collapse_to_the_first():
+    base = ("Professor Smith explains every concept with worked examples, posts detailed notes after "
+            "each lecture, answers emails within a day and grades the weekly problem sets fairly.")
+    reviews = [
+        review(base, '2023-01-01'),
+        review(base + " Recommend", '2024-01-01'),
+        review(base.upper().replace(',', ''), '2024-02-01'),
+        review("Avoid this section, the midterm had nothing to do with the homework at all."),
+    ]
+
+    selected, usable = reduce_reviews(reviews, token_budget=0, now=NOW)
+
+    assert usable == 2
+    assert [r['timestamp'] for r in selected] == ['2023-01-01', '2024-06-01']
+
+
+def test_placeholders_are_not_usable():
+    selected, usable = reduce_reviews([review('No Comments'), review('N/A'), review('')], now=NOW)
+    assert (selected, usable) == ([], 0)
+
+
+def test_selection_fits_the_budget():
+    reviews = [distinct_review(n) for n in range(40)]
+    budget = 300
+
+    selected, usable = reduce_reviews(reviews, token_budget=budget, now=NOW)
+
+    assert usable == 40
+    assert 0 < len(selected) < usable
+    assert sum(estimate_tokens(r['text']) + REVIEW_OVERHEAD_TOKENS for r in selected) <= budget
+
+
+def test_zero_budget_keeps_every_usable_review():
+    reviews = [distinct_review(n) for n in range(40)]
+    assert len(select_reviews(reviews, token_budget=0, now=NOW)) == 40
+
+
+def test_selection_is_stable_and_in_original_order():
+    reviews = [distinct_review(n, timestamp=f"20{10 + n % 15}-03-01") for n in range(40)]
+
+    first = select_reviews(reviews, token_budget=400, now=NOW)
+    second = select_reviews([dict(r) for r in reviews], token_budget=400, now=NOW)
+
+    assert first == second
+    positions = [reviews.index(next(r for r in reviews if r['text'] == s['text'])) for s in first]
+    assert positions == sorted(positions)
+
+
+def test_budget_prefers_recent_reviews():
+    reviews = [distinct_review(0, '2012-01-01'), distinct_review(1, '2024-12-01')]
+    # Room for either review, not both
+    cost = max(estimate_tokens(r['text']) for r in reviews) + REVIEW_OVERHEAD_TOKENS
+
+    [selected] = select_reviews(reviews, token_budget=cost, now=NOW)
+
+    assert selected['timestamp'] == '2024-12-01'
+
+
+def test_long_reviews_are_truncated():
+    [selected] = select_reviews([review("word " * 1000)], token_budget=0, now=NOW)
+    assert len(selected['text']) <= 1002
+    assert selected['text'].endswith(' …')
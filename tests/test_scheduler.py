@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+
+import pytest
+
+from src import scheduler
+from src.deadline import Deadline, DeadlineExceeded
+from src.scheduler import UpstreamGate, priority, current_priority, upstream_slot, INTERACTIVE, BATCH
+
+
+@pytest.fixture(autouse=True)
+def long_batch_wait(monkeypatch):
+    monkeypatch.setattr(scheduler, 'MAX_BATCH_WAIT', 30)
+
+
+@pytest.fixture
+def beacon(tmp_path, monkeypatch):
+    path = tmp_path / 'interactive.beacon'
+    monkeypatch.setattr(scheduler, 'BEACON_PATH', str(path))
+    monkeypatch.setattr(scheduler, '_last_beacon_touch', 0.0)
+    monkeypatch.setattr(scheduler, 'BATCH_BACKOFF_SECONDS', 0.02)
+    monkeypatch.setattr(scheduler, '_gates', {'rmp': UpstreamGate('rmp', 4)})
+    return path
+
+
+def start_acquire(gate, level, acquired, deadline=None):
+    """Acquire in a thread; the thread appends level to acquired once it holds a slot"""
+    def run():
+        gate.acquire(level, deadline)
+        acquired.append(level)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=2.0):
+    give_up = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > give_up:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+def test_batch_never_takes_reserved_slots():
+    gate = UpstreamGate('test', 3, reserved=1)
+    gate.acquire(BATCH)
+    gate.acquire(BATCH)
+    acquired = []
+
+    blocked = start_acquire(gate, BATCH, acquired)
+    time.sleep(0.05)
+    assert acquired == []
+
+    gate.acquire(INTERACTIVE)  # the reserved slot is still free
+    gate.release(INTERACTIVE)
+    gate.release(BATCH)
+    blocked.join(1)
+    assert acquired == [BATCH]
+
+
+def test_free_slot_goes_to_interactive_first():
+    gate = UpstreamGate('test', 1, reserved=0)
+    gate.acquire(BATCH)
+    acquired = []
+
+    batch = start_acquire(gate, BATCH, acquired)
+    wait_for(lambda: len(gate._waiting) == 1)
+    interactive = start_acquire(gate, INTERACTIVE, acquired)
+    wait_for(lambda: len(gate._waiting) == 2)
+
+    gate.release(BATCH)
+    interactive.join(1)
+    assert acquired == [INTERACTIVE]
+    gate.release(INTERACTIVE)
+    batch.join(1)
+    assert acquired == [INTERACTIVE, BATCH]
+
+
+def test_starved_batch_waiter_is_promoted(monkeypatch):
+    monkeypatch.setattr(scheduler, 'MAX_BATCH_WAIT', 0.1)
+    gate = UpstreamGate('test', 2, reserved=1)
+    gate.acquire(BATCH)
+
+    started = time.monotonic()
+    gate.acquire(BATCH)
+
+    assert time.monotonic() - started >= 0.1
+    assert gate._in_use == 2
+
+
+def test_deadline_ends_the_wait_and_leaves_the_queue():
+    gate = UpstreamGate('test', 1, reserved=0)
+    gate.acquire(INTERACTIVE)
+
+    with pytest.raises(DeadlineExceeded):
+        gate.acquire(INTERACTIVE, Deadline(0.05))
+
+    assert gate._waiting == []
+    gate.release(INTERACTIVE)
+    gate.acquire(BATCH, Deadline(1))
+
+
+def test_priority_blocks_nest(monkeypatch):
+    monkeypatch.setattr(scheduler, '_default_priority', BATCH)
+    assert current_priority() == BATCH
+    with priority(INTERACTIVE):
+        assert current_priority() == INTERACTIVE
+        with priority(BATCH):
+            assert current_priority() == BATCH
+        assert current_priority() == INTERACTIVE
+    assert current_priority() == BATCH
+
+
+def test_priority_is_per_thread():
+    seen = []
+    with priority(BATCH):
+        thread = threading.Thread(target=lambda: seen.append(current_priority()))
+        thread.start()
+        thread.join()
+    assert seen == [INTERACTIVE]
+
+
+def test_interactive_calls_touch_the_beacon(beacon):
+    assert not scheduler.interactive_active()
+    with priority(INTERACTIVE), upstream_slot('rmp'):
+        pass
+    assert beacon.exists()
+    assert scheduler.interactive_active()
+
+
+def test_batch_backs_off_while_the_beacon_is_fresh(beacon, monkeypatch):
+    monkeypatch.setattr(scheduler, 'MAX_BATCH_WAIT', 0.2)
+    beacon.touch()
+
+    started = time.monotonic()
+    with priority(BATCH), upstream_slot('rmp'):
+        waited = time.monotonic() - started
+
+    # Gives way, but only up to MAX_BATCH_WAIT
+    assert 0.2 <= waited < 1.0
+
+
+def test_batch_does_not_wait_on_a_stale_beacon(beacon):
+    beacon.touch()
+    stale = time.time() - scheduler.BEACON_ACTIVE_SECONDS - 1
+    os.utime(beacon, (stale, stale))
+
+    started = time.monotonic()
+    with priority(BATCH), upstream_slot('rmp'):
+        assert time.monotonic() - started < 0.1
+
+
+def test_batch_backoff_respects_the_deadline(beacon):
+    beacon.touch()
+    with pytest.raises(DeadlineExceeded):
+        with priority(BATCH), upstream_slot('rmp', Deadline(0.05)):
+            pass
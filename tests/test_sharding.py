@@ -0,0 +1,65 @@
+import json
+
+import pandas as pd
+import pytest
+
+from src.sharding import parse_shard, shard_of, shard_basename, merge_shards
+
+URL = "https://www.ratemyprofessors.com/professor/{}"
+
+
+def write_shard(output_dir, index, count, rows):
+    path = output_dir / f"{shard_basename(index, count)}.json"
+    path.write_text(json.dumps(rows), encoding='utf-8')
+
+
+def test_parse_shard():
+    assert parse_shard(" 2 / 3 ") == (2, 3)
+    for text in ("0/3", "4/3", "1/0", "x", None):
+        with pytest.raises(ValueError):
+            parse_shard(text)
+
+
+def test_shard_of_ignores_url_spelling():
+    assert shard_of(URL.format(123), 4) == shard_of(URL.format(123) + "?tid=123", 4)
+    assert all(1 <= shard_of(URL.format(n), 4) <= 4 for n in range(50))
+
+
+def test_merge_follows_professors_csv_order(tmp_path):
+    # Two different professors with the same name in the same course
+    pd.DataFrame([
+        {'professor_name': 'Jane Doe', 'course_code': 'CS101', 'url': URL.format(2)},
+        {'professor_name': 'Al Smith', 'course_code': 'CS102', 'url': URL.format(3)},
+        {'professor_name': 'Jane Doe', 'course_code': 'CS101', 'url': URL.format(1)},
+    ]).to_csv(tmp_path / 'professors.csv', index=False)
+    write_shard(tmp_path, 1, 2, [
+        {'professor_name': 'Jane Doe', 'course_code': 'CS101', 'url': URL.format(1), 'analysis': 'one'},
+        {'professor_name': 'Al Smith', 'course_code': 'CS102', 'url': URL.format(3), 'analysis': 'three'},
+    ])
+    write_shard(tmp_path, 2, 2, [
+        {'professor_name': 'Jane Doe', 'course_code': 'CS101', 'url': URL.format(2), 'analysis': 'two'},
+    ])
+
+    merged = merge_shards(str(tmp_path), 2)
+
+    assert [r['analysis'] for r in merged] == ['two', 'three', 'one']
+    assert json.loads((tmp_path / 'professor_analyses.json').read_text(encoding='utf-8')) == merged
+    assert list(pd.read_csv(tmp_path / 'professor_analyses.csv')['analysis']) == ['two', 'three', 'one']
+
+
+def test_merge_without_professors_csv_sorts_by_course_and_name(tmp_path):
+    write_shard(tmp_path, 1, 1, [
+        {'professor_name': 'Bo', 'course_code': 'CS2', 'url': URL.format(1)},
+        {'professor_name': 'Al', 'course_code': 'CS2', 'url': URL.format(2)},
+        {'professor_name': 'Cy', 'course_code': 'CS1', 'url': URL.format(3)},
+    ])
+
+    merged = merge_shards(str(tmp_path), 1)
+
+    assert [r['professor_name'] for r in merged] == ['Cy', 'Al', 'Bo']
+
+
+def test_merge_reports_missing_shards(tmp_path):
+    write_shard(tmp_path, 1, 3, [])
+    with pytest.raises(FileNotFoundError, match=r"shard-2-of-3.*shard-3-of-3"):
+        merge_shards(str(tmp_path), 3)